@@ -99,6 +99,7 @@ MIDDLEWARE = [
     "simple_history.middleware.HistoryRequestMiddleware",
     "core.middleware.LocaleMiddleware",
     "core.middleware.RTLMiddleware",
+    "core.middleware.ActiveCycleMiddleware",
 ]
 
 # ===================================================================
@@ -435,8 +436,29 @@ CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
 CELERY_TASK_ROUTES = {
     'core.tasks.send_activation_email_task': {'queue': 'email'},
     'core.tasks.generate_report_task': {'queue': 'reports'},
+    'core.tasks.fit_anomaly_models': {'queue': 'reports'},
+    'core.tasks.build_cycle_statistics_snapshot': {'queue': 'reports'},
 }
 
+# Statistik anomaliya modellərinin (joblib) saxlandığı qovluq
+ANOMALY_MODEL_DIR = os.getenv("ANOMALY_MODEL_DIR", str(BASE_DIR / 'ml_models'))
+# Proses yaddaşında saxlanılan anomaliya modellərinin maksimum sayı (LRU)
+ANOMALY_MODEL_MEMORY_CACHE_SIZE = int(os.getenv("ANOMALY_MODEL_MEMORY_CACHE_SIZE", "16"))
+# Anomaliya detektorlarının paralel icrası üçün worker sayı (1 = ardıcıl)
+ANOMALY_DETECTION_WORKERS = int(os.getenv("ANOMALY_DETECTION_WORKERS", "1"))
+# Təşkilat risk snapshot-unun köhnəlmiş sayıldığı müddət (saniyə)
+AI_RISK_SNAPSHOT_MAX_AGE = int(os.getenv("AI_RISK_SNAPSHOT_MAX_AGE", str(60 * 60 * 24)))
+# Aktiv dövrün ümumi keşdə saxlanma müddəti (saniyə); dəyişiklikdə siqnal ilə silinir
+ACTIVE_CYCLE_CACHE_TIMEOUT = int(os.getenv("ACTIVE_CYCLE_CACHE_TIMEOUT", "300"))
+# Təşkilati vahidlər üzrə xal toplamalarının keş müddəti (saniyə)
+UNIT_SCORE_ROLLUP_CACHE_TIMEOUT = int(os.getenv("UNIT_SCORE_ROLLUP_CACHE_TIMEOUT", "600"))
+# Dövr üzrə şirkət/şöbə benchmark ortalamalarının keş müddəti (saniyə); yeni cavabda siqnal ilə silinir
+CYCLE_BENCHMARK_CACHE_TIMEOUT = int(os.getenv("CYCLE_BENCHMARK_CACHE_TIMEOUT", "3600"))
+# Bağlı dövrlər üçün kateqoriya statistikası LRU keşinin ölçüsü (prosesdaxili)
+CATEGORY_AGGREGATE_CACHE_SIZE = int(os.getenv("CATEGORY_AGGREGATE_CACHE_SIZE", "256"))
+# Hazır hesabat fayllarının eyni parametrli sorğular üçün yenidən istifadə müddəti (saniyə)
+REPORT_ARTIFACT_TTL = int(os.getenv("REPORT_ARTIFACT_TTL", "3600"))
+
 # Celery logging
 CELERY_WORKER_HIJACK_ROOT_LOGGER = False
 CELERY_WORKER_LOG_FORMAT = '[%(asctime)s: %(levelname)s/%(processName)s] %(message)s'
@@ -0,0 +1,62 @@
+# core/active_cycle.py
+
+import contextvars
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import QiymetlendirmeDovru
+
+ACTIVE_CYCLE_CACHE_KEY = 'active_cycle'
+
+# Sorğu daxilində aktiv dövrün yaddaşı; None - açıq sorğu əhatəsi yoxdur
+_request_scope = contextvars.ContextVar('active_cycle_scope', default=None)
+
+
+def get_active_cycle() -> Optional[QiymetlendirmeDovru]:
+    """
+    Aktiv qiymətləndirmə dövrünü qaytarır.
+    Əvvəlcə sorğu daxilindəki yaddaşa, sonra ümumi keşə baxır; hər ikisi boşdursa
+    verilənlər bazasından bir dəfə oxuyur. Keş dövr dəyişdikdə siqnal ilə silinir.
+    """
+    scope = _request_scope.get()
+    if scope is not None and 'cycle' in scope:
+        return scope['cycle']
+
+    cached = cache.get(ACTIVE_CYCLE_CACHE_KEY)
+    if cached is None:
+        # Aktiv dövr olmadıqda da nəticə keşlənir, ona görə dəyər tuple içində saxlanılır
+        cached = (QiymetlendirmeDovru.objects.filter(aktivdir=True).order_by('pk').first(),)
+        cache.set(
+            ACTIVE_CYCLE_CACHE_KEY, cached,
+            getattr(settings, 'ACTIVE_CYCLE_CACHE_TIMEOUT', 300)
+        )
+
+    if scope is not None:
+        scope['cycle'] = cached[0]
+    return cached[0]
+
+
+def get_active_cycle_id() -> Optional[int]:
+    """Aktiv dövrün ID-si (dövr yoxdursa None)"""
+    cycle = get_active_cycle()
+    return cycle.id if cycle else None
+
+
+def invalidate_active_cycle():
+    """Ümumi keşi və cari sorğunun yaddaşını təmizləyir"""
+    cache.delete(ACTIVE_CYCLE_CACHE_KEY)
+    scope = _request_scope.get()
+    if scope is not None:
+        scope.pop('cycle', None)
+
+
+def open_request_scope():
+    """Sorğu əhatəsini açır; ActiveCycleMiddleware tərəfindən çağırılır"""
+    return _request_scope.set({})
+
+
+def close_request_scope(token):
+    """Sorğu əhatəsini bağlayır"""
+    _request_scope.reset(token)
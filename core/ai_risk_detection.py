@@ -1,16 +1,22 @@
 # core/ai_risk_detection.py
 
-from django.db.models import Avg, Count, StdDev, Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, StdDev, Q, F
+from django.db.models.functions import TruncDay
 from django.utils import timezone
-from datetime import timedelta, date
+from datetime import datetime, timedelta, date, timezone as dt_timezone
 from typing import Dict, List, Tuple, Optional
 import statistics
 import logging
 
 from .models import (
-    Ishchi, Qiymetlendirme, Cavab, QiymetlendirmeDovru,
-    Notification, QuickFeedback, InkishafPlani
+    Ishchi, Qiymetlendirme, Cavab, QiymetlendirmeDovru, QiymetlendirmeXalXulasesi,
+    Notification, QuickFeedback, InkishafPlani, SualKateqoriyasi,
+    EmployeeRiskAnalysis, RiskReanalysisQueue
 )
+from .active_cycle import get_active_cycle
 
 logger = logging.getLogger('audit')
 
@@ -21,7 +27,10 @@ class AIRiskDetector:
     Proaktiv olaraq problemli işçi münasibətlərini və riskləri aşkarlayır.
     """
     
+    RISK_NOTIFICATION_KIND = "risk_alert"
+    
     def __init__(self):
+        self.digest_list_limit = 20  # Xülasə bildirişində göstərilən işçi sayı
         self.red_flag_threshold = 3  # Qırmızı bayraq üçün minimum risklər
         self.low_performance_threshold = 3.0  # 10 üzərindən aşağı performans
         self.high_variance_threshold = 2.5  # Yüksək variant
@@ -31,57 +40,49 @@ class AIRiskDetector:
         Bir işçi üçün bütün risk analizlərini aparır.
         """
         if not cycle:
-            cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+            cycle = get_active_cycle()
             
         if not cycle:
             return {"error": "Aktiv qiymətləndirmə dövrü tapılmadı"}
         
-        risks = {
-            "employee_id": employee.id,
-            "employee_name": employee.get_full_name(),
-            "analysis_date": timezone.now(),
-            "cycle": cycle.ad,
-            "total_risk_score": 0,
-            "risk_level": "LOW",
-            "red_flags": [],
-            "detailed_analysis": {}
-        }
-        
         # Müxtəlif risk analizləri
-        performance_risk = self._analyze_performance_risk(employee, cycle)
-        consistency_risk = self._analyze_consistency_risk(employee, cycle)
-        peer_feedback_risk = self._analyze_peer_feedback_risk(employee, cycle)
-        behavioral_risk = self._analyze_behavioral_risk(employee)
-        
-        # Risk nəticələrini birləşdir
-        risks["detailed_analysis"] = {
-            "performance_risk": performance_risk,
-            "consistency_risk": consistency_risk,
-            "peer_feedback_risk": peer_feedback_risk,
-            "behavioral_risk": behavioral_risk
-        }
+        risks = self._build_risk_result(employee, cycle, {
+            "performance_risk": self._analyze_performance_risk(employee, cycle),
+            "consistency_risk": self._analyze_consistency_risk(employee, cycle),
+            "peer_feedback_risk": self._analyze_peer_feedback_risk(employee, cycle),
+            "behavioral_risk": self._analyze_behavioral_risk(employee)
+        })
         
-        # Ümumi risk hesabla
-        total_score = (
-            performance_risk.get("risk_score", 0) +
-            consistency_risk.get("risk_score", 0) +
-            peer_feedback_risk.get("risk_score", 0) +
-            behavioral_risk.get("risk_score", 0)
-        )
+        # Risk bildirişi yarat
+        if risks["risk_level"] in ["HIGH", "CRITICAL"]:
+            self._create_risk_notification(employee, risks, cycle)
         
-        risks["total_risk_score"] = total_score
-        risks["risk_level"] = self._calculate_risk_level(total_score)
+        return risks
+    
+    def _build_risk_result(self, employee: Ishchi, cycle: QiymetlendirmeDovru,
+                           detailed_analysis: Dict, analysis_date=None) -> Dict:
+        """
+        Alt analizlərin nəticələrini ümumi risk nəticəsinə birləşdirir.
+        """
+        # Ümumi risk hesabla
+        total_score = sum(analysis.get("risk_score", 0) for analysis in detailed_analysis.values())
         
         # Qırmızı bayraqlari topla
-        for analysis in risks["detailed_analysis"].values():
+        red_flags = []
+        for analysis in detailed_analysis.values():
             if analysis.get("red_flags"):
-                risks["red_flags"].extend(analysis["red_flags"])
+                red_flags.extend(analysis["red_flags"])
         
-        # Risk bildirişi yarat
-        if risks["risk_level"] in ["HIGH", "CRITICAL"]:
-            self._create_risk_notification(employee, risks)
-        
-        return risks
+        return {
+            "employee_id": employee.id,
+            "employee_name": employee.get_full_name(),
+            "analysis_date": analysis_date or timezone.now(),
+            "cycle": cycle.ad,
+            "total_risk_score": total_score,
+            "risk_level": self._calculate_risk_level(total_score),
+            "red_flags": red_flags,
+            "detailed_analysis": detailed_analysis
+        }
     
     def _analyze_performance_risk(self, employee: Ishchi, cycle: QiymetlendirmeDovru) -> Dict:
         """
@@ -90,25 +91,33 @@ class AIRiskDetector:
         evaluations = Qiymetlendirme.objects.filter(
             qiymetlendirilen=employee,
             dovr=cycle,
-            status='COMPLETED'
+            status=Qiymetlendirme.Status.TAMAMLANDI
         )
         
-        if not evaluations.exists():
+        # Qiymətləndirmə ortalamaları xal xülasəsinin ümumi sətirlərindən oxunur
+        total_scores = [
+            xal_cemi / cavab_sayi
+            for xal_cemi, cavab_sayi in QiymetlendirmeXalXulasesi.objects.filter(
+                qiymetlendirme__in=evaluations,
+                kateqoriya__isnull=True,
+                cavab_sayi__gt=0,
+                xal_cemi__gt=0
+            ).order_by('qiymetlendirme').values_list('xal_cemi', 'cavab_sayi')
+        ]
+        
+        return self._score_performance_risk(evaluations.count(), total_scores)
+    
+    def _score_performance_risk(self, evaluation_count: int, total_scores: List[float]) -> Dict:
+        """
+        Qiymətləndirmə sayı və qiymətləndirmə ortalamalarından performans riskini hesablayır.
+        """
+        if not evaluation_count:
             return {
                 "risk_score": 1,
                 "analysis": "Qiymətləndirmə məlumatı tapılmadı",
                 "red_flags": ["NO_EVALUATION_DATA"]
             }
         
-        # Ortalama bal hesabla
-        total_scores = []
-        for evaluation in evaluations:
-            cavablar = evaluation.cavablar.all()
-            if cavablar:
-                avg_score = cavablar.aggregate(avg=Avg('xal'))['avg']
-                if avg_score:
-                    total_scores.append(avg_score)
-        
         if not total_scores:
             return {
                 "risk_score": 2,
@@ -126,14 +135,14 @@ class AIRiskDetector:
             red_flags.append("LOW_PERFORMANCE")
         
         # Çox az qiymətləndirici
-        if evaluations.count() < 2:
+        if evaluation_count < 2:
             risk_score += 2
             red_flags.append("INSUFFICIENT_EVALUATORS")
         
         return {
             "risk_score": risk_score,
             "average_performance": round(average_performance, 2),
-            "evaluation_count": evaluations.count(),
+            "evaluation_count": evaluation_count,
             "analysis": f"Ortalama performans: {average_performance:.2f}/10",
             "red_flags": red_flags
         }
@@ -145,15 +154,12 @@ class AIRiskDetector:
         evaluations = Qiymetlendirme.objects.filter(
             qiymetlendirilen=employee,
             dovr=cycle,
-            status='COMPLETED'
+            status=Qiymetlendirme.Status.TAMAMLANDI
         )
         
-        if evaluations.count() < 2:
-            return {
-                "risk_score": 0,
-                "analysis": "Uyğunsuzluq analizi üçün kifayət qədər məlumat yox",
-                "red_flags": []
-            }
+        evaluation_count = evaluations.count()
+        if evaluation_count < 2:
+            return self._score_consistency_risk(evaluation_count, {})
         
         # Hər kateqoriya üçün balları topla
         category_scores = {}
@@ -164,6 +170,19 @@ class AIRiskDetector:
                     category_scores[category] = []
                 category_scores[category].append(cavab.xal)
         
+        return self._score_consistency_risk(evaluation_count, category_scores)
+    
+    def _score_consistency_risk(self, evaluation_count: int, category_scores: Dict[str, List[int]]) -> Dict:
+        """
+        Kateqoriya üzrə bal siyahılarından uyğunsuzluq riskini hesablayır.
+        """
+        if evaluation_count < 2:
+            return {
+                "risk_score": 0,
+                "analysis": "Uyğunsuzluq analizi üçün kifayət qədər məlumat yox",
+                "red_flags": []
+            }
+        
         red_flags = []
         risk_score = 0
         high_variance_categories = []
@@ -189,6 +208,15 @@ class AIRiskDetector:
             "red_flags": red_flags
         }
     
+    def _negative_feedback_filter(self) -> Q:
+        """Neqativ feedback (rating < 3 və ya müəyyən keyword-lər)"""
+        return (
+            Q(rating__lt=3) |
+            Q(message__icontains="problem") |
+            Q(message__icontains="zəif") |
+            Q(message__icontains="pis")
+        )
+    
     def _analyze_peer_feedback_risk(self, employee: Ishchi, cycle: QiymetlendirmeDovru) -> Dict:
         """
         Həmkarlardan gələn rəy analizi.
@@ -200,20 +228,22 @@ class AIRiskDetector:
             created_at__gte=thirty_days_ago
         )
         
+        total_feedback = quick_feedback.count()
+        negative_feedback = 0
+        if total_feedback > 0:
+            negative_feedback = quick_feedback.filter(self._negative_feedback_filter()).count()
+        
+        return self._score_peer_feedback_risk(total_feedback, negative_feedback)
+    
+    def _score_peer_feedback_risk(self, total_feedback: int, negative_feedback: int) -> Dict:
+        """
+        Rəy sayı və neqativ rəy sayından həmkar rəyi riskini hesablayır.
+        """
         red_flags = []
         risk_score = 0
         
         # Neqativ rəy nisbəti
-        total_feedback = quick_feedback.count()
         if total_feedback > 0:
-            # Neqativ feedback (rating < 3 və ya müəyyən keyword-lər)
-            negative_feedback = quick_feedback.filter(
-                Q(rating__lt=3) |
-                Q(message__icontains="problem") |
-                Q(message__icontains="zəif") |
-                Q(message__icontains="pis")
-            ).count()
-            
             negative_ratio = negative_feedback / total_feedback
             
             if negative_ratio > 0.6:  # 60%-dən çox neqativ
@@ -239,34 +269,41 @@ class AIRiskDetector:
         """
         Davranış əsaslı risk analizi.
         """
+        # İnkişaf planı aktivliyi
+        active_plans = InkishafPlani.objects.filter(
+            ishchi=employee,
+            status=InkishafPlani.Status.AKTIV
+        ).count()
+        
+        return self._score_behavioral_risk(employee, active_plans)
+    
+    def _score_behavioral_risk(self, employee: Ishchi, active_plans: int) -> Dict:
+        """
+        Login aktivliyi, aktiv inkişaf planları və təşkilati vahiddən davranış riskini hesablayır.
+        """
         red_flags = []
         risk_score = 0
         
         # Son login aktivliyi
+        days_since_login = None
         if employee.last_login:
             days_since_login = (timezone.now().date() - employee.last_login.date()).days
             if days_since_login > 14:
                 risk_score += 2
                 red_flags.append("LONG_ABSENCE")
         
-        # İnkişaf planı aktivliyi
-        active_plans = InkishafPlani.objects.filter(
-            ishchi=employee,
-            status=InkishafPlani.Status.AKTIV
-        ).count()
-        
         if active_plans == 0:
             risk_score += 1
             red_flags.append("NO_DEVELOPMENT_PLAN")
         
         # Təşkilati uyğunsuzluq
-        if not employee.organization_unit:
+        if not employee.organization_unit_id:
             risk_score += 1
             red_flags.append("NO_ORGANIZATIONAL_UNIT")
         
         return {
             "risk_score": risk_score,
-            "days_since_login": (timezone.now().date() - employee.last_login.date()).days if employee.last_login else None,
+            "days_since_login": days_since_login,
             "active_development_plans": active_plans,
             "analysis": f"Davranış risk səviyyəsi: {risk_score}",
             "red_flags": red_flags
@@ -285,15 +322,86 @@ class AIRiskDetector:
         else:
             return "LOW"
     
-    def _create_risk_notification(self, employee: Ishchi, risk_data: Dict):
+    def _create_risk_notification(self, employee: Ishchi, risk_data: Dict,
+                                  cycle: QiymetlendirmeDovru = None):
         """
         Yüksək risk üçün bildiriş yarat.
         """
-        # HR və rəhbərlərə bildiriş göndər
-        hr_users = Ishchi.objects.filter(rol__in=['ADMIN', 'SUPERADMIN'])
+        return self._send_risk_notifications(cycle, [(employee, risk_data)])
+    
+    def _send_risk_notifications(self, cycle: QiymetlendirmeDovru,
+                                 flagged: List[Tuple[Ishchi, Dict]]) -> int:
+        """
+        Yüksək riskli işçilər üçün HR bildirişlərini toplu yaradır.
+        Hər alıcıya bir xülasə bildirişi göndərilir; eyni dövr üçün alıcının hələ açıq
+        (oxunmamış, arxivlənməmiş) bildirişində olan işçilər təkrar göndərilmir.
+        """
+        if not flagged:
+            return 0
+        
+        cycle_id = cycle.id if cycle else None
+        hr_users = list(Ishchi.objects.filter(rol__in=['ADMIN', 'SUPERADMIN']).only('id'))
+        
+        # Alıcı üzrə artıq açıq bildirişlərdə olan işçilər
+        already_notified = {hr_user.id: set() for hr_user in hr_users}
+        open_alerts = Notification.objects.filter(
+            recipient_id__in=already_notified.keys(),
+            is_read=False,
+            is_archived=False,
+            metadata__kind=self.RISK_NOTIFICATION_KIND
+        ).values_list('recipient_id', 'metadata')
+        for recipient_id, metadata in open_alerts:
+            if metadata.get('cycle_id') == cycle_id:
+                already_notified[recipient_id].update(metadata.get('employee_ids', []))
+        
+        notifications = []
+        for hr_user in hr_users:
+            pending = [
+                (employee, risk_data) for employee, risk_data in flagged
+                if employee.id not in already_notified[hr_user.id]
+            ]
+            if pending:
+                notifications.append(self._build_risk_notification(hr_user, cycle_id, pending))
+        
+        if notifications:
+            with transaction.atomic():
+                Notification.objects.bulk_create(notifications, batch_size=500)
         
-        title = f"⚠️ Yüksək Risk: {employee.get_full_name()}"
-        message = f"""
+        # Audit log
+        for employee, risk_data in flagged:
+            logger.info(
+                "AI Risk Detection Alert",
+                extra={
+                    "user": "AI_SYSTEM",
+                    "action_type": "RISK_DETECTED",
+                    "object_type": "EMPLOYEE_RISK",
+                    "object_id": employee.id,
+                    "details": {
+                        "employee": employee.get_full_name(),
+                        "risk_level": risk_data['risk_level'],
+                        "risk_score": risk_data['total_risk_score'],
+                        "red_flags": risk_data['red_flags']
+                    }
+                }
+            )
+        
+        return len(notifications)
+    
+    def _build_risk_notification(self, recipient: Ishchi, cycle_id: Optional[int],
+                                 pending: List[Tuple[Ishchi, Dict]]) -> Notification:
+        """
+        Bir alıcı üçün risk bildirişi obyektini hazırlayır (yadda saxlamadan).
+        """
+        metadata = {
+            "kind": self.RISK_NOTIFICATION_KIND,
+            "cycle_id": cycle_id,
+            "employee_ids": [employee.id for employee, _ in pending]
+        }
+        
+        if len(pending) == 1:
+            employee, risk_data = pending[0]
+            title = f"⚠️ Yüksək Risk: {employee.get_full_name()}"
+            message = f"""
         İşçi: {employee.get_full_name()}
         Risk Səviyyəsi: {risk_data['risk_level']}
         Risk Xalı: {risk_data['total_risk_score']}
@@ -303,51 +411,76 @@ class AIRiskDetector:
         
         Təcili diqqət tələb olunur.
         """
-        
-        for hr_user in hr_users:
-            Notification.objects.create(
-                recipient=hr_user,
-                title=title,
-                message=message,
-                notification_type=Notification.NotificationType.WARNING,
-                priority=Notification.Priority.HIGH,
-                action_text="Detallara bax",
-                action_url=f"/core/employees/{employee.id}/risk-analysis/"
-            )
-        
-        # Audit log
-        logger.info(
-            "AI Risk Detection Alert",
-            extra={
-                "user": "AI_SYSTEM",
-                "action_type": "RISK_DETECTED",
-                "object_type": "EMPLOYEE_RISK",
-                "object_id": employee.id,
-                "details": {
-                    "employee": employee.get_full_name(),
-                    "risk_level": risk_data['risk_level'],
-                    "risk_score": risk_data['total_risk_score'],
-                    "red_flags": risk_data['red_flags']
-                }
-            }
+            action_url = f"/core/employees/{employee.id}/risk-analysis/"
+        else:
+            ordered = sorted(pending, key=lambda item: item[1]['total_risk_score'], reverse=True)
+            lines = [
+                f"• {employee.get_full_name()} - {risk_data['risk_level']} ({risk_data['total_risk_score']} xal)"
+                for employee, risk_data in ordered[:self.digest_list_limit]
+            ]
+            if len(ordered) > self.digest_list_limit:
+                lines.append(f"... və {len(ordered) - self.digest_list_limit} nəfər daha")
+            
+            title = f"⚠️ Yüksək Risk: {len(pending)} işçi"
+            message = "Yüksək riskli işçilər:\n" + "\n".join(lines) + "\n\nTəcili diqqət tələb olunur."
+            action_url = "/core/ai-risk/"
+        
+        return Notification(
+            recipient=recipient,
+            title=title,
+            message=message,
+            notification_type=Notification.NotificationType.WARNING,
+            priority=Notification.Priority.HIGH,
+            action_text="Detallara bax",
+            action_url=action_url,
+            metadata=metadata
         )
     
-    def bulk_analyze_all_employees(self, cycle: QiymetlendirmeDovru = None) -> List[Dict]:
+    def bulk_analyze_all_employees(self, cycle: QiymetlendirmeDovru = None,
+                                   employee_ids: List[int] = None) -> List[Dict]:
         """
         Bütün aktiv işçilər üçün risk analizi.
+        Bütün məlumat mənbələri dövr üçün bir neçə qruplaşdırılmış sorğu ilə yüklənir
+        və risk balları yaddaşda hesablanır. employee_ids verildikdə yalnız həmin işçilər analiz edilir.
         """
         if not cycle:
-            cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+            cycle = get_active_cycle()
         
         if not cycle:
             return []
         
-        employees = Ishchi.objects.filter(is_active=True, rol='ISHCHI')
+        employee_qs = Ishchi.objects.filter(is_active=True, rol='ISHCHI')
+        if employee_ids is not None:
+            employee_qs = employee_qs.filter(id__in=employee_ids)
+        employees = list(
+            employee_qs.only('id', 'first_name', 'last_name', 'last_login', 'organization_unit_id')
+        )
+        data = self._load_bulk_risk_data(cycle, employee_qs.values('id'))
+        analysis_date = timezone.now()
         results = []
+        flagged = []
         
         for employee in employees:
             try:
-                risk_data = self.analyze_employee_risks(employee, cycle)
+                evaluation_count = data['evaluation_counts'].get(employee.id, 0)
+                total_feedback, negative_feedback = data['feedback_counts'].get(employee.id, (0, 0))
+                
+                risk_data = self._build_risk_result(employee, cycle, {
+                    "performance_risk": self._score_performance_risk(
+                        evaluation_count, data['evaluation_scores'].get(employee.id, [])
+                    ),
+                    "consistency_risk": self._score_consistency_risk(
+                        evaluation_count, data['category_scores'].get(employee.id, {})
+                    ),
+                    "peer_feedback_risk": self._score_peer_feedback_risk(total_feedback, negative_feedback),
+                    "behavioral_risk": self._score_behavioral_risk(
+                        employee, data['active_plans'].get(employee.id, 0)
+                    )
+                }, analysis_date)
+                
+                if risk_data["risk_level"] in ["HIGH", "CRITICAL"]:
+                    flagged.append((employee, risk_data))
+                
                 results.append(risk_data)
             except Exception as e:
                 logger.error(
@@ -355,17 +488,249 @@ class AIRiskDetector:
                     extra={"error": str(e)}
                 )
         
+        # Bütün yüksək risklər üçün bildirişlər bir tranzaksiyada yazılır
+        self._send_risk_notifications(cycle, flagged)
+        
         # Nəticələri risk səviyyəsinə görə sırala
         results.sort(key=lambda x: x.get('total_risk_score', 0), reverse=True)
         
         return results
     
-    def get_organization_risk_summary(self) -> Dict:
+    def _load_bulk_risk_data(self, cycle: QiymetlendirmeDovru, employee_ids) -> Dict:
         """
-        Təşkilat üçün ümumi risk xülasəsi.
+        Risk analizinin dörd məlumat mənbəyini bütün işçilər üçün qruplaşdırılmış sorğularla yükləyir.
+        employee_ids ID siyahısı və ya values('id') alt sorğusu ola bilər.
+        """
+        completed = Qiymetlendirme.objects.filter(
+            dovr=cycle,
+            status=Qiymetlendirme.Status.TAMAMLANDI,
+            qiymetlendirilen_id__in=employee_ids
+        )
+        
+        evaluation_counts = dict(
+            completed.values('qiymetlendirilen')
+            .annotate(count=Count('id'))
+            .values_list('qiymetlendirilen', 'count')
+        )
+        
+        # Hər qiymətləndirmənin ortalama balı - xal xülasəsinin ümumi sətirlərindən
+        evaluation_scores = {}
+        for employee_id, xal_cemi, cavab_sayi in (
+            QiymetlendirmeXalXulasesi.objects.filter(
+                qiymetlendirme__in=completed,
+                kateqoriya__isnull=True,
+                cavab_sayi__gt=0,
+                xal_cemi__gt=0
+            )
+            .order_by('qiymetlendirme')
+            .values_list('qiymetlendirme__qiymetlendirilen', 'xal_cemi', 'cavab_sayi')
+        ):
+            evaluation_scores.setdefault(employee_id, []).append(xal_cemi / cavab_sayi)
+        answers = Cavab.objects.filter(qiymetlendirme__in=completed)
+        
+        # Uyğunsuzluq analizi üçün kateqoriya üzrə xam ballar (yalnız 2+ qiymətləndirməsi olanlar)
+        category_names = {}
+        category_scores = {}
+        consistency_ids = [emp_id for emp_id, count in evaluation_counts.items() if count >= 2]
+        if consistency_ids:
+            rows = list(
+                answers.filter(qiymetlendirme__qiymetlendirilen_id__in=consistency_ids)
+                .order_by('qiymetlendirme', 'id')
+                .values_list('qiymetlendirme__qiymetlendirilen', 'sual__kateqoriya', 'xal')
+            )
+            category_ids = {category_id for _, category_id, _ in rows if category_id}
+            category_names = {
+                category.id: category.ad
+                for category in SualKateqoriyasi.objects.filter(id__in=category_ids)
+            }
+            for employee_id, category_id, xal in rows:
+                category = category_names.get(category_id, "Ümumi") if category_id else "Ümumi"
+                category_scores.setdefault(employee_id, {}).setdefault(category, []).append(xal)
+        
+        # Son 30 günün sürətli rəyləri
+        thirty_days_ago = timezone.now() - timedelta(days=30)
+        feedback_counts = {
+            employee_id: (total, negative)
+            for employee_id, total, negative in QuickFeedback.objects.filter(
+                to_user_id__in=employee_ids,
+                created_at__gte=thirty_days_ago
+            ).values('to_user').annotate(
+                total=Count('id'),
+                negative=Count('id', filter=self._negative_feedback_filter())
+            ).values_list('to_user', 'total', 'negative')
+        }
+        
+        active_plans = dict(
+            InkishafPlani.objects.filter(
+                ishchi_id__in=employee_ids,
+                status=InkishafPlani.Status.AKTIV
+            ).values('ishchi').annotate(count=Count('id')).values_list('ishchi', 'count')
+        )
+        
+        return {
+            'evaluation_counts': evaluation_counts,
+            'evaluation_scores': evaluation_scores,
+            'category_scores': category_scores,
+            'feedback_counts': feedback_counts,
+            'active_plans': active_plans,
+        }
+    
+    def run_risk_snapshot(self, cycle: QiymetlendirmeDovru = None) -> Dict:
+        """
+        Bütün işçilər üçün risk analizini bir dəfə icra edir, nəticələri EmployeeRiskAnalysis-ə
+        yazır və təşkilat xülasəsini keşləyir.
+        """
+        if not cycle:
+            cycle = get_active_cycle()
+        
+        if not cycle:
+            return {"results": [], "summary": None}
+        
+        results = self.bulk_analyze_all_employees(cycle)
+        analysis_date = results[0]['analysis_date'] if results else timezone.now()
+        self._persist_risk_results(cycle, results)
+        
+        summary = self._build_organization_summary(cycle, results, analysis_date)
+        self._cache_summary(cycle, summary)
+        
+        return {"results": results, "summary": self._with_freshness(summary)}
+    
+    def run_incremental_risk_snapshot(self, cycle: QiymetlendirmeDovru = None) -> Dict:
+        """
+        Yalnız məlumatı dəyişmiş (RiskReanalysisQueue) və ya vaxt pəncərəsindən çıxan
+        işçiləri yenidən hesablayır, EmployeeRiskAnalysis sətirlərini yerində yeniləyir.
+        Dövr üçün hələ snapshot yoxdursa tam analiz aparılır.
         """
-        all_risks = self.bulk_analyze_all_employees()
+        if not cycle:
+            cycle = get_active_cycle()
+        
+        if not cycle:
+            return {"results": [], "summary": None}
+        
+        if not EmployeeRiskAnalysis.objects.filter(cycle=cycle).exists():
+            RiskReanalysisQueue.objects.all().delete()
+            return self.run_risk_snapshot(cycle)
+        
+        # Növbəni götür: sətirlər analizdən əvvəl silinir ki, bu vaxt gələn yeni işarələr itməsin
+        with transaction.atomic():
+            queued_ids = list(RiskReanalysisQueue.objects.values_list('employee_id', flat=True))
+            RiskReanalysisQueue.objects.filter(employee_id__in=queued_ids).delete()
+        
+        employee_ids = set(queued_ids) | self._time_sensitive_employee_ids(cycle)
+        employee_ids |= set(
+            Ishchi.objects.filter(is_active=True, rol='ISHCHI').exclude(
+                risk_analyses__cycle=cycle
+            ).values_list('id', flat=True)
+        )
+        
+        if not employee_ids:
+            return {"results": [], "summary": self.get_organization_risk_summary(cycle)}
+        
+        try:
+            results = self.bulk_analyze_all_employees(cycle, employee_ids=list(employee_ids))
+            self._persist_risk_results(cycle, results)
+        except Exception:
+            RiskReanalysisQueue.mark(*queued_ids)
+            raise
         
+        logger.info(f"AI risk inkremental analizi: {len(results)} işçi yenidən hesablandı")
+        
+        cache.delete(self._summary_cache_key(cycle.id))
+        summary = self._load_persisted_summary(cycle)
+        return {"results": results, "summary": self._with_freshness(summary) if summary else None}
+    
+    def _time_sensitive_employee_ids(self, cycle: QiymetlendirmeDovru) -> set:
+        """
+        Yeni məlumat olmadan da riski dəyişə bilən işçilər: son analizdən bəri
+        login müddəti həddi keçənlər və ya 30 günlük rəy pəncərəsindən rəy çıxanlar.
+        """
+        now = timezone.now()
+        
+        # _score_behavioral_risk günləri UTC tarixi ilə sayır, ona görə hədd gün başlanğıcıdır
+        absence_threshold = datetime.combine(
+            now.date() - timedelta(days=14), datetime.min.time(), tzinfo=dt_timezone.utc
+        )
+        absence_crossed = EmployeeRiskAnalysis.objects.filter(
+            cycle=cycle,
+            employee__last_login__lt=absence_threshold,
+            employee__last_login__gte=TruncDay('updated_at', tzinfo=dt_timezone.utc) - timedelta(days=14)
+        ).values_list('employee_id', flat=True)
+        
+        feedback_expired = EmployeeRiskAnalysis.objects.filter(
+            cycle=cycle,
+            employee__received_quick_feedbacks__created_at__lt=now - timedelta(days=30),
+            employee__received_quick_feedbacks__created_at__gte=F('updated_at') - timedelta(days=30)
+        ).values_list('employee_id', flat=True)
+        
+        return set(absence_crossed) | set(feedback_expired)
+    
+    def _persist_risk_results(self, cycle: QiymetlendirmeDovru, results: List[Dict]):
+        """
+        Risk nəticələrini bir toplu upsert ilə EmployeeRiskAnalysis cədvəlinə yazır.
+        HR tərəfindən daxil edilən sahələrə toxunulmur.
+        """
+        analyses = [
+            EmployeeRiskAnalysis(
+                employee_id=risk['employee_id'],
+                cycle=cycle,
+                total_risk_score=risk['total_risk_score'],
+                risk_level=risk['risk_level'],
+                performance_risk_score=risk['detailed_analysis']['performance_risk']['risk_score'],
+                consistency_risk_score=risk['detailed_analysis']['consistency_risk']['risk_score'],
+                peer_feedback_risk_score=risk['detailed_analysis']['peer_feedback_risk']['risk_score'],
+                behavioral_risk_score=risk['detailed_analysis']['behavioral_risk']['risk_score'],
+                detailed_analysis=risk['detailed_analysis'],
+            )
+            for risk in results
+        ]
+        
+        with transaction.atomic():
+            EmployeeRiskAnalysis.objects.bulk_create(
+                analyses,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['employee', 'cycle'],
+                update_fields=[
+                    'total_risk_score', 'risk_level', 'performance_risk_score',
+                    'consistency_risk_score', 'peer_feedback_risk_score',
+                    'behavioral_risk_score', 'detailed_analysis', 'analyzed_at', 'updated_at'
+                ]
+            )
+    
+    def _summary_cache_key(self, cycle_id: int) -> str:
+        return f"ai_risk_summary:{cycle_id}"
+    
+    def _persisted_stamp(self, cycle: QiymetlendirmeDovru) -> Tuple:
+        """Dövrün saxlanılmış snapshot-unun versiyası: son yenilənmə vaxtı və sətir sayı"""
+        stamp = EmployeeRiskAnalysis.objects.filter(cycle=cycle).aggregate(
+            updated_at=Max('updated_at'), count=Count('pk')
+        )
+        return stamp['updated_at'], stamp['count']
+    
+    def _cache_summary(self, cycle: QiymetlendirmeDovru, summary: Dict):
+        """
+        Xülasəni saxlanılmış snapshot-un versiyası ilə birlikdə keşləyir.
+        LocMem keşi prosesə aiddir: snapshot Celery worker-də yazılır, ona görə
+        veb proseslər keşi versiya ilə yoxlayır və keş müddəti məhduddur.
+        """
+        cache.set(
+            self._summary_cache_key(cycle.id),
+            {'stamp': self._persisted_stamp(cycle), 'summary': summary},
+            getattr(settings, 'AI_RISK_SNAPSHOT_MAX_AGE', 60 * 60 * 24)
+        )
+    
+    def _get_cached_summary(self, cycle: QiymetlendirmeDovru) -> Optional[Dict]:
+        """Keşlənmiş xülasə yalnız verilənlər bazasındakı snapshot dəyişməyibsə qaytarılır"""
+        cached = cache.get(self._summary_cache_key(cycle.id))
+        if cached and cached['stamp'] == self._persisted_stamp(cycle):
+            return cached['summary']
+        return None
+    
+    def _build_organization_summary(self, cycle: QiymetlendirmeDovru, all_risks: List[Dict],
+                                    analysis_date) -> Dict:
+        """
+        Risk nəticələrindən təşkilat xülasəsini qurur.
+        """
         risk_levels = {"CRITICAL": 0, "HIGH": 0, "MEDIUM": 0, "LOW": 0}
         red_flag_counts = {}
         
@@ -376,9 +741,78 @@ class AIRiskDetector:
                 red_flag_counts[flag] = red_flag_counts.get(flag, 0) + 1
         
         return {
+            "cycle_id": cycle.id,
             "total_employees_analyzed": len(all_risks),
             "risk_distribution": risk_levels,
             "top_red_flags": sorted(red_flag_counts.items(), key=lambda x: x[1], reverse=True)[:5],
-            "analysis_date": timezone.now(),
+            "analysis_date": analysis_date,
             "critical_employees": [r for r in all_risks if r.get('risk_level') == 'CRITICAL']
-        }
\ No newline at end of file
+        }
+    
+    def _with_freshness(self, summary: Dict) -> Dict:
+        """
+        Xülasəyə snapshot-un yaşı və köhnəlmə bayrağını əlavə edir.
+        """
+        max_age = getattr(settings, 'AI_RISK_SNAPSHOT_MAX_AGE', 60 * 60 * 24)
+        age = (timezone.now() - summary['analysis_date']).total_seconds()
+        return {
+            **summary,
+            "snapshot_age_seconds": int(age),
+            "is_stale": age > max_age
+        }
+    
+    def _load_persisted_summary(self, cycle: QiymetlendirmeDovru) -> Optional[Dict]:
+        """
+        Keş boş olduqda xülasəni saxlanılmış EmployeeRiskAnalysis sətirlərindən bərpa edir.
+        """
+        analyses = EmployeeRiskAnalysis.objects.filter(
+            cycle=cycle, employee__is_active=True, employee__rol='ISHCHI'
+        ).select_related('employee').only(
+            'employee__first_name', 'employee__last_name', 'total_risk_score',
+            'risk_level', 'detailed_analysis', 'analyzed_at', 'updated_at'
+        )
+        
+        all_risks = []
+        for analysis in analyses:
+            all_risks.append({
+                "employee_id": analysis.employee_id,
+                "employee_name": analysis.employee.get_full_name(),
+                "analysis_date": analysis.updated_at,
+                "cycle": cycle.ad,
+                "total_risk_score": analysis.total_risk_score,
+                "risk_level": analysis.risk_level,
+                "red_flags": [
+                    flag
+                    for detail in analysis.detailed_analysis.values()
+                    for flag in (detail.get("red_flags") or [])
+                ],
+                "detailed_analysis": analysis.detailed_analysis
+            })
+        
+        if not all_risks:
+            return None
+        
+        analysis_date = min(risk['analysis_date'] for risk in all_risks)
+        summary = self._build_organization_summary(cycle, all_risks, analysis_date)
+        self._cache_summary(cycle, summary)
+        return summary
+    
+    def get_organization_risk_summary(self, cycle: QiymetlendirmeDovru = None,
+                                      refresh: bool = False) -> Dict:
+        """
+        Təşkilat üçün ümumi risk xülasəsi.
+        Son risk snapshot-undan oxunur; snapshot yoxdursa və ya refresh=True olduqda
+        analiz yenidən icra edilir.
+        """
+        if not cycle:
+            cycle = get_active_cycle()
+        
+        if not cycle:
+            return {"error": "Aktiv qiymətləndirmə dövrü tapılmadı"}
+        
+        if not refresh:
+            summary = self._get_cached_summary(cycle) or self._load_persisted_summary(cycle)
+            if summary:
+                return self._with_freshness(summary)
+        
+        return self.run_risk_snapshot(cycle)["summary"]
@@ -213,7 +213,7 @@ def run_ai_risk_analysis_api(request):
         anomaly_detector = StatisticalAnomalyDetector()
         
         # Run bulk analysis for all employees
-        risk_results = detector.bulk_analyze_all_employees()
+        risk_results = detector.run_risk_snapshot()['results']
         
         # Run statistical anomaly detection
         anomaly_results = anomaly_detector.generate_anomaly_report()
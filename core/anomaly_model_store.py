@@ -0,0 +1,136 @@
+# core/anomaly_model_store.py
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+import sklearn
+from django.conf import settings
+from django.utils import timezone
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+logger = logging.getLogger('audit')
+
+
+class AnomalyModelStore:
+    """
+    Dövr üzrə öyrədilmiş StandardScaler + IsolationForest modellərinin disk anbarı.
+    Modellər joblib ilə sıxılmadan yazılır ki, oxunarkən massivlər mmap ilə yüklənsin.
+    Versiya dövr ID-si və xüsusiyyət sxeminin hash-i ilə müəyyən edilir.
+    Prosesdaxili keş ən son istifadə olunan ANOMALY_MODEL_MEMORY_CACHE_SIZE modellə məhdudlaşır.
+    """
+
+    _memory_cache: 'OrderedDict[str, Dict]' = OrderedDict()
+    _lock = threading.Lock()
+
+    def __init__(self, base_dir: str = None):
+        self.base_dir = str(base_dir or getattr(
+            settings, 'ANOMALY_MODEL_DIR', os.path.join(settings.BASE_DIR, 'ml_models')
+        ))
+
+    @staticmethod
+    def schema_hash(features: List[str], contamination: float) -> str:
+        """Xüsusiyyət siyahısı və model parametrlərindən sxem hash-i"""
+        payload = json.dumps({
+            'features': list(features),
+            'contamination': contamination,
+            'sklearn': sklearn.__version__,
+        }, sort_keys=True)
+        return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+    def model_path(self, kind: str, cycle_id: Optional[int], features: List[str],
+                   contamination: float) -> str:
+        schema = self.schema_hash(features, contamination)
+        return os.path.join(self.base_dir, f'{kind}_cycle{cycle_id or 0}_{schema}.joblib')
+
+    def fit(self, kind: str, cycle_id: Optional[int], X: np.ndarray, features: List[str],
+            contamination: float, n_jobs: Optional[int] = None) -> Dict:
+        """Modeli öyrədir, diskə yazır və yaddaş keşinə əlavə edir"""
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+
+        model = IsolationForest(contamination=contamination, random_state=42, n_jobs=n_jobs)
+        model.fit(X_scaled)
+
+        bundle = {
+            'scaler': scaler,
+            'model': model,
+            'features': list(features),
+            'contamination': contamination,
+            'cycle_id': cycle_id,
+            'schema': self.schema_hash(features, contamination),
+            'n_samples': int(X.shape[0]),
+            'fitted_at': timezone.now().isoformat(),
+        }
+
+        path = self.model_path(kind, cycle_id, features, contamination)
+        os.makedirs(self.base_dir, exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        joblib.dump(bundle, tmp_path, compress=0)
+        os.replace(tmp_path, path)
+
+        self._remember(path, os.path.getmtime(path), bundle)
+
+        logger.info(f"Anomaliya modeli yadda saxlanıldı: {os.path.basename(path)} ({bundle['n_samples']} nümunə)")
+        return bundle
+
+    def load(self, kind: str, cycle_id: Optional[int], features: List[str],
+             contamination: float) -> Optional[Dict]:
+        """Saxlanılmış modeli qaytarır; fayl dəyişməyibsə prosesdaxili keşdən istifadə edir"""
+        path = self.model_path(kind, cycle_id, features, contamination)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+
+        with self._lock:
+            cached = self._memory_cache.get(path)
+            if cached and cached['mtime'] == mtime:
+                self._memory_cache.move_to_end(path)
+                return cached['bundle']
+
+        try:
+            bundle = joblib.load(path, mmap_mode='r')
+        except Exception as e:
+            logger.error(f"Anomaliya modeli yüklənə bilmədi ({path}): {e}")
+            return None
+
+        self._remember(path, mtime, bundle)
+        return bundle
+
+    def _remember(self, path: str, mtime: float, bundle: Dict):
+        """Modeli yaddaş keşinə yazır; limit aşıldıqda ən köhnə istifadə olunanı çıxarır"""
+        max_size = getattr(settings, 'ANOMALY_MODEL_MEMORY_CACHE_SIZE', 16)
+        with self._lock:
+            self._memory_cache[path] = {'mtime': mtime, 'bundle': bundle}
+            self._memory_cache.move_to_end(path)
+            while len(self._memory_cache) > max_size:
+                self._memory_cache.popitem(last=False)
+
+    @staticmethod
+    def score(bundle: Dict, X: np.ndarray):
+        """decision_function balları və etiketləri (-1 anomaliya, 1 normal) qaytarır"""
+        X_scaled = bundle['scaler'].transform(X)
+        scores = bundle['model'].decision_function(X_scaled)
+        labels = np.where(scores < 0, -1, 1)
+        return labels, scores
+
+    def purge(self, keep_cycle_ids: List[int]) -> int:
+        """Göstərilməyən dövrlərə aid köhnə model fayllarını silir"""
+        if not os.path.isdir(self.base_dir):
+            return 0
+
+        keep = {f'_cycle{cycle_id or 0}_' for cycle_id in keep_cycle_ids}
+        removed = 0
+        for filename in os.listdir(self.base_dir):
+            if filename.endswith('.joblib') and not any(marker in filename for marker in keep):
+                os.remove(os.path.join(self.base_dir, filename))
+                removed += 1
+        return removed
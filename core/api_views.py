@@ -31,6 +31,7 @@ from .serializers import (
     DashboardStatsSerializer, AIRiskAnalysisSerializer, StatisticalAnomalySerializer
 )
 from .api_permissions import IsOwnerOrReadOnly, IsManagerOrAdmin
+from .active_cycle import get_active_cycle
 from .i18n_utils import translation_manager
 
 User = get_user_model()
@@ -656,7 +657,7 @@ class EmployeeRiskAnalysisViewSet(viewsets.ModelViewSet):
             if 'error' not in risk_data:
                 analysis, created = EmployeeRiskAnalysis.objects.update_or_create(
                     employee=employee,
-                    cycle=cycle or QiymetlendirmeDovru.objects.filter(aktivdir=True).first(),
+                    cycle=cycle or get_active_cycle(),
                     defaults={
                         'total_risk_score': risk_data['total_risk_score'],
                         'risk_level': risk_data['risk_level'],
@@ -672,7 +673,7 @@ class EmployeeRiskAnalysisViewSet(viewsets.ModelViewSet):
                 for flag_type in risk_data['red_flags']:
                     RiskFlag.objects.get_or_create(
                         employee=employee,
-                        cycle=cycle or QiymetlendirmeDovru.objects.filter(aktivdir=True).first(),
+                        cycle=cycle or get_active_cycle(),
                         flag_type=flag_type,
                         defaults={
                             'severity': RiskFlag.Severity.HIGH if risk_data['risk_level'] in ['HIGH', 'CRITICAL'] else RiskFlag.Severity.MEDIUM,
@@ -703,12 +704,13 @@ class EmployeeRiskAnalysisViewSet(viewsets.ModelViewSet):
                 return Response({'error': 'Dövr tapılmadı'}, status=404)
         
         detector = AIRiskDetector()
-        results = detector.bulk_analyze_all_employees(cycle)
+        snapshot = detector.run_risk_snapshot(cycle)
+        results = snapshot['results']
         
         return Response({
             'total_analyzed': len(results),
             'results': results[:10],  # İlk 10 nəticəni qaytar
-            'summary': detector.get_organization_risk_summary()
+            'summary': snapshot['summary']
         })
 
 
@@ -858,7 +860,7 @@ class AIRiskDetectionViewSet(viewsets.ViewSet):
         """Risk analizi dashboard məlumatları"""
         
         # Aktiv dövr
-        active_cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        active_cycle = get_active_cycle()
         if not active_cycle:
             return Response({'error': 'Aktiv dövr tapılmadı'}, status=404)
         
@@ -908,8 +910,21 @@ class AIRiskDetectionViewSet(viewsets.ViewSet):
         """Təşkilat üçün ümumi risk xülasəsi"""
         from .ai_risk_detection import AIRiskDetector
         
+        cycle = None
+        cycle_id = request.query_params.get('cycle_id')
+        if cycle_id:
+            try:
+                cycle = QiymetlendirmeDovru.objects.get(id=int(cycle_id))
+            except ValueError:
+                return Response({'error': 'cycle_id tam ədəd olmalıdır'}, status=400)
+            except QiymetlendirmeDovru.DoesNotExist:
+                return Response({'error': 'Dövr tapılmadı'}, status=404)
+        
+        # ?refresh=1 snapshot-u yenidən hesablayır
+        refresh = request.query_params.get('refresh') in ('1', 'true')
+        
         detector = AIRiskDetector()
-        summary = detector.get_organization_risk_summary()
+        summary = detector.get_organization_risk_summary(cycle, refresh=refresh)
         
         return Response(summary)
 
@@ -984,6 +999,37 @@ class StatisticalAnomalyViewSet(viewsets.ViewSet):
         
         return Response(results)
     
+    @action(detail=False, methods=['post'])
+    def employee_anomaly_score(self, request):
+        """Tək işçini saxlanılmış IsolationForest modeli ilə qiymətləndirir"""
+        from .statistical_anomaly_detection import StatisticalAnomalyDetector
+        
+        employee_id = request.data.get('employee_id')
+        if not employee_id:
+            return Response({'error': 'employee_id tələb olunur'}, status=400)
+        
+        try:
+            employee = Ishchi.objects.get(id=employee_id)
+        except (Ishchi.DoesNotExist, ValueError, TypeError):
+            return Response({'error': 'İşçi tapılmadı'}, status=404)
+        
+        cycle_id = request.data.get('cycle_id')
+        cycle = None
+        if cycle_id:
+            try:
+                cycle = QiymetlendirmeDovru.objects.get(id=int(cycle_id))
+            except (ValueError, TypeError):
+                return Response({'error': 'cycle_id tam ədəd olmalıdır'}, status=400)
+            except QiymetlendirmeDovru.DoesNotExist:
+                return Response({'error': 'Dövr tapılmadı'}, status=404)
+        
+        detector = StatisticalAnomalyDetector()
+        result = detector.score_employee_performance(employee, cycle)
+        
+        if 'error' in result:
+            return Response(result, status=404)
+        return Response(result)
+    
     @action(detail=False, methods=['post'])
     def generate_full_report(self, request):
         """Tam anomaliy hesabatı yaradır"""
@@ -1007,7 +1053,7 @@ class StatisticalAnomalyViewSet(viewsets.ViewSet):
         """Anomaliy statistikaları"""
         
         # Aktiv dövr
-        active_cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        active_cycle = get_active_cycle()
         if not active_cycle:
             return Response({'error': 'Aktiv dövr tapılmadı'}, status=404)
         
@@ -1186,7 +1232,7 @@ class StrategicHRPlanningViewSet(viewsets.ViewSet):
         high_potential = planner.identify_high_potential_employees()
         
         # Aktiv dövr üçün risk analizi
-        active_cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        active_cycle = get_active_cycle()
         risk_metrics = {}
         if active_cycle:
             risk_metrics = {
@@ -1242,7 +1288,7 @@ class StrategicHRPlanningViewSet(viewsets.ViewSet):
             return Response({'error': 'İcazə yoxdur'}, status=403)
         
         planner = StrategicHRPlanner()
-        cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        cycle = get_active_cycle()
         
         if not cycle:
             return Response({'error': 'Aktiv dövr tapılmadı'}, status=404)
@@ -0,0 +1,209 @@
+# core/cycle_statistics.py
+
+import math
+from functools import lru_cache
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, Q, Sum
+
+from .models import Cavab, DovrStatistikaSnapshotu, Qiymetlendirme, QiymetlendirmeDovru
+
+
+def snapshot_totals(cycle_ids: Iterable[int], unit=None, by_category: bool = False,
+                    exclude_self_review: bool = True) -> Dict:
+    """
+    Snapshot cədvəlindən dövr (və istəyə görə kateqoriya) üzrə cəmlər.
+    Açar dövr ID-si və ya (dövr ID-si, kateqoriya ID-si) cütüdür; dəyər
+    count, sum, sum_sq və avg sahələri olan lüğətdir.
+    unit verilərsə yalnız həmin vahidin (alt vahidlər xaric) sətirləri götürülür.
+    """
+    cycle_ids = list(cycle_ids)
+    if not cycle_ids:
+        return {}
+
+    rows = DovrStatistikaSnapshotu.objects.filter(dovr_id__in=cycle_ids)
+    if unit is not None:
+        rows = rows.filter(organization_unit=unit)
+    if exclude_self_review:
+        rows = rows.exclude(qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW)
+
+    group_fields = ['dovr_id', 'kateqoriya_id'] if by_category else ['dovr_id']
+    totals = {}
+    for row in rows.values(*group_fields).annotate(
+        count=Sum('cavab_sayi'),
+        total=Sum('xal_cemi'),
+        total_sq=Sum('xal_kvadrat_cemi'),
+    ).order_by():
+        if not row['count']:
+            continue
+        key = (row['dovr_id'], row['kateqoriya_id']) if by_category else row['dovr_id']
+        totals[key] = {
+            'count': row['count'],
+            'sum': row['total'],
+            'sum_sq': row['total_sq'],
+            'avg': row['total'] / row['count'],
+        }
+    return totals
+
+
+def invalidate_cycle_benchmarks(cycle_ids: Optional[Iterable[int]] = None, include_snapshotted: bool = True):
+    """
+    Dövrlərin keşlənmiş benchmark ortalamalarını bir UPDATE ilə etibarsız edir.
+    Versiya dövr sətrində artırılır ki, bütün veb və Celery prosesləri onu görsün.
+    cycle_ids verilmədikdə bütün dövrlərin keşi etibarsız olur. include_snapshotted=False
+    olduqda snapshot-dan oxunan bağlı dövrlər (canlı məlumatdan asılı olmayanlar) buraxılır.
+    """
+    cycles = QiymetlendirmeDovru.objects.all()
+    if cycle_ids is not None:
+        cycles = cycles.filter(pk__in=cycle_ids)
+    if not include_snapshotted:
+        cycles = cycles.filter(Q(aktivdir=True) | Q(statistika_snapshot_tarixi__isnull=True))
+    # update() siqnalları işə salmır
+    cycles.update(benchmark_versiyasi=F('benchmark_versiyasi') + 1)
+
+
+def _compute_cycle_benchmarks(cycle: QiymetlendirmeDovru) -> Dict:
+    """Dövrün şirkət və vahid ortalamaları (self-review xaric) bir qruplaşdırılmış sorğu ilə"""
+    if cycle.statistika_snapshot_hazirdir:
+        rows = DovrStatistikaSnapshotu.objects.filter(dovr=cycle).exclude(
+            qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
+        ).values('organization_unit_id').annotate(
+            count=Sum('cavab_sayi'), total=Sum('xal_cemi')
+        ).values_list('organization_unit_id', 'count', 'total')
+    else:
+        rows = Cavab.objects.filter(
+            qiymetlendirme__dovr=cycle,
+            qiymetlendirme__status=Qiymetlendirme.Status.TAMAMLANDI
+        ).exclude(
+            qiymetlendirme__qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
+        ).values('qiymetlendirme__qiymetlendirilen__organization_unit').annotate(
+            count=Count('id'), total=Sum('xal')
+        ).values_list('qiymetlendirme__qiymetlendirilen__organization_unit', 'count', 'total')
+
+    company_count = company_total = 0
+    unit_averages = {}
+    for unit_id, count, total in rows.order_by():
+        if not count:
+            continue
+        company_count += count
+        company_total += total
+        if unit_id is not None:
+            unit_averages[unit_id] = total / count
+
+    return {
+        'company_average': company_total / company_count if company_count else None,
+        'unit_averages': unit_averages,
+    }
+
+
+def get_cycle_benchmarks(cycles: Iterable[QiymetlendirmeDovru]) -> Dict[int, Dict]:
+    """
+    Dövr ID-si üzrə şirkət ortalaması və vahid ortalamaları.
+    Dəyərlər bütün istifadəçilər üçün ortaq keşdə dövrün benchmark_versiyasi ilə
+    saxlanılır və dövrə yeni cavab yazıldıqda etibarsız olur; keşdə olmayan dövrlər
+    bir dəfə hesablanıb yazılır.
+    """
+    cycles = list(cycles)
+    if not cycles:
+        return {}
+
+    # Ötürülən obyektlər (məs. keşlənmiş aktiv dövr) köhnə ola bilər; versiya bazadan oxunur
+    versions = dict(QiymetlendirmeDovru.objects.filter(
+        pk__in=[cycle.id for cycle in cycles]
+    ).values_list('id', 'benchmark_versiyasi'))
+    data_keys = {
+        cycle.id: f'cycle_benchmark:{cycle.id}:{versions.get(cycle.id, 0)}'
+        for cycle in cycles
+    }
+    cached = cache.get_many(list(data_keys.values()))
+
+    benchmarks = {}
+    missing = {}
+    for cycle in cycles:
+        key = data_keys[cycle.id]
+        if key in cached:
+            benchmarks[cycle.id] = cached[key]
+        else:
+            benchmarks[cycle.id] = missing[key] = _compute_cycle_benchmarks(cycle)
+
+    if missing:
+        cache.set_many(missing, getattr(settings, 'CYCLE_BENCHMARK_CACHE_TIMEOUT', 3600))
+    return benchmarks
+
+
+def _category_stats(name, count, total, total_sq) -> Dict:
+    mean = total / count
+    return {
+        'name': name,
+        'count': count,
+        'sum': total,
+        'sum_sq': total_sq,
+        'avg': mean,
+        'stddev': math.sqrt(max(total_sq / count - mean * mean, 0)),
+    }
+
+
+def merge_category_stats(stats_list: Iterable[Dict]) -> Optional[Dict]:
+    """Eyni kateqoriyanın bir neçə qrup statistikasını birləşdirir; boş siyahı üçün None"""
+    stats_list = list(stats_list)
+    if not stats_list:
+        return None
+    return _category_stats(
+        stats_list[0]['name'],
+        sum(stats['count'] for stats in stats_list),
+        sum(stats['sum'] for stats in stats_list),
+        sum(stats['sum_sq'] for stats in stats_list),
+    )
+
+
+def _query_category_aggregates(filters, exclude, group_by) -> Dict:
+    group_fields = ['sual__kateqoriya', 'sual__kateqoriya__ad']
+    if group_by:
+        group_fields.append(group_by)
+
+    answers = Cavab.objects.filter(**dict(filters))
+    if exclude:
+        answers = answers.exclude(**dict(exclude))
+
+    aggregates = {}
+    for row in answers.values(*group_fields).annotate(
+        count=Count('id'),
+        total=Sum('xal'),
+        total_sq=Sum(F('xal') * F('xal')),
+    ).order_by():
+        key = (row['sual__kateqoriya'], row[group_by]) if group_by else row['sual__kateqoriya']
+        aggregates[key] = _category_stats(
+            row['sual__kateqoriya__ad'], row['count'], row['total'] or 0, row['total_sq'] or 0
+        )
+    return aggregates
+
+
+@lru_cache(maxsize=getattr(settings, 'CATEGORY_AGGREGATE_CACHE_SIZE', 256))
+def _cached_category_aggregates(cycle_id, snapshot_stamp, filters, exclude, group_by):
+    # cycle_id və snapshot_stamp yalnız keş açarının bir hissəsidir
+    return _query_category_aggregates(filters, exclude, group_by)
+
+
+def category_aggregates(filters: Dict, exclude: Optional[Dict] = None,
+                        cycle: Optional[QiymetlendirmeDovru] = None,
+                        group_by: Optional[str] = None) -> Dict:
+    """
+    Cavab filtri üzrə bütün kateqoriyaların statistikası bir
+    values('sual__kateqoriya').annotate(...) sorğusu ilə.
+    Açar kateqoriya ID-si (kateqoriyasız suallar üçün None), group_by verilərsə
+    (kateqoriya ID-si, group_by dəyəri) cütüdür; dəyər name, count, sum, sum_sq,
+    avg və stddev sahələri olan lüğətdir.
+    filters və exclude dəyərləri hashlana bilən sadə tiplər (ID, sətir) olmalıdır.
+    cycle filtrin aid olduğu dövrdür: bağlanmış və snapshot-u yazılmış dövrlər üçün
+    nəticə prosesdaxili LRU keşində saxlanılır, ona görə qaytarılan lüğət dəyişdirilməməlidir.
+    """
+    filters = tuple(sorted(filters.items()))
+    exclude = tuple(sorted((exclude or {}).items()))
+
+    if cycle is not None and cycle.statistika_snapshot_hazirdir:
+        return _cached_category_aggregates(
+            cycle.id, cycle.statistika_snapshot_tarixi, filters, exclude, group_by
+        )
+    return _query_category_aggregates(filters, exclude, group_by)
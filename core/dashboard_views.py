@@ -19,6 +19,7 @@ from .models import (
     OrganizationUnit, QiymetlendirmeDovru, Notification
 )
 from .permissions import permission_required
+from .score_rollup import get_unit_score_rollup
 # utils import dashboard_views.py-də lazım olmayacaq, çünki funksiya orada təyin edilib
 
 
@@ -279,10 +280,11 @@ def _get_goal_progress_data(user):
 
 def _get_department_comparison_data():
     """Şöbələr müqayisə məlumatlarını hazırlayır"""
-    departments = OrganizationUnit.objects.annotate(
-        avg_performance=Avg('ishchiler__verilen_qiymetler__cavablar__xal'),
-        employee_count=Count('ishchiler', filter=Q(ishchiler__is_active=True))
-    ).filter(employee_count__gt=0)
+    # Vahidin öz işçilərinin bütün dövrlər üzrə ortalaması (keşlənmiş toplamalardan)
+    departments = [
+        unit for unit in get_unit_score_rollup().values()
+        if unit['active_employee_count'] > 0
+    ]
     
     chart_data = {
         'labels': [],
@@ -294,9 +296,9 @@ def _get_department_comparison_data():
     }
     
     for dept in departments:
-        chart_data['labels'].append(dept.name)
+        chart_data['labels'].append(dept['name'])
         chart_data['datasets'][0]['data'].append(
-            round(dept.avg_performance or 0, 1)
+            round(dept['own_avg'] or 0, 1)
         )
     
     return chart_data
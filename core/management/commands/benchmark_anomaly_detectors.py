@@ -0,0 +1,205 @@
+# core/management/commands/benchmark_anomaly_detectors.py
+
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from core.statistical_anomaly_detection import StatisticalAnomalyDetector
+
+
+def _iterrows_statistical_outliers(df):
+    """Əvvəlki iterrows əsaslı IQR implementasiyası (müqayisə üçün)"""
+    outliers = []
+    for column in ['avg_score', 'std_score', 'score_variance']:
+        Q1 = df[column].quantile(0.25)
+        Q3 = df[column].quantile(0.75)
+        IQR = Q3 - Q1
+        lower_bound = Q1 - 1.5 * IQR
+        upper_bound = Q3 + 1.5 * IQR
+        column_outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)]
+        for _, row in column_outliers.iterrows():
+            outliers.append({
+                'employee_id': row['employee_id'],
+                'employee_name': row['employee_name'],
+                'anomaly_type': f'{column}_outlier',
+                'value': row[column],
+                'method': 'IQR',
+                'bounds': {'lower': lower_bound, 'upper': upper_bound}
+            })
+    return outliers
+
+
+def _iloc_z_score_anomalies(df, threshold):
+    """Əvvəlki df.iloc əsaslı z-score implementasiyası (müqayisə üçün)"""
+    from scipy import stats
+
+    anomalies = []
+    for column in ['avg_score', 'std_score']:
+        z_scores = np.abs(stats.zscore(df[column].fillna(df[column].mean())))
+        for i, z_score in enumerate(z_scores):
+            if z_score > threshold:
+                anomalies.append({
+                    'employee_id': df.iloc[i]['employee_id'],
+                    'employee_name': df.iloc[i]['employee_name'],
+                    'anomaly_type': f'{column}_zscore',
+                    'z_score': float(z_score),
+                    'value': df.iloc[i][column],
+                    'method': 'Z-Score',
+                    'threshold': threshold
+                })
+    return anomalies
+
+
+def _iterrows_login_anomalies(df):
+    """Əvvəlki iterrows əsaslı login implementasiyası (müqayisə üçün)"""
+    anomalies = []
+    mean_days = df['days_since_login'].mean()
+    std_days = df['days_since_login'].std()
+    for _, row in df.iterrows():
+        days = row['days_since_login']
+        if days > mean_days + 2 * std_days:
+            anomalies.append({
+                'employee_id': row['employee_id'],
+                'employee_name': row['employee_name'],
+                'anomaly_type': 'long_absence',
+                'days_since_login': days,
+                'method': 'Statistical Threshold',
+                'threshold': mean_days + 2 * std_days
+            })
+    return anomalies
+
+
+def _iterrows_feedback_anomalies(df):
+    """Əvvəlki iterrows əsaslı feedback implementasiyası (müqayisə üçün)"""
+    anomalies = []
+    low_activity_threshold = df['feedback_activity_score'].quantile(0.1)
+    for _, row in df[df['feedback_activity_score'] <= low_activity_threshold].iterrows():
+        anomalies.append({
+            'employee_id': row['employee_id'],
+            'employee_name': row['employee_name'],
+            'anomaly_type': 'low_feedback_activity',
+            'activity_score': row['feedback_activity_score'],
+            'method': 'Percentile Analysis',
+            'threshold': low_activity_threshold
+        })
+    for _, row in df[df['negative_feedback_ratio'] > 0.6].iterrows():
+        anomalies.append({
+            'employee_id': row['employee_id'],
+            'employee_name': row['employee_name'],
+            'anomaly_type': 'high_negative_feedback',
+            'negative_ratio': row['negative_feedback_ratio'],
+            'method': 'Threshold Analysis',
+            'threshold': 0.6
+        })
+    return anomalies
+
+
+class Command(BaseCommand):
+    help = 'Anomaliya detektorlarının vektorlaşdırılmış və iterrows versiyalarını sintetik məlumatla müqayisə edir'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            nargs='+',
+            default=[10000, 100000],
+            help='Sınaqdan keçiriləcək sətir sayları'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Hər ölçmə üçün təkrar sayı (ən yaxşı nəticə götürülür)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Sintetik məlumat üçün təsadüfi ədəd generatorunun toxumu'
+        )
+
+    def handle(self, *args, **options):
+        detector = StatisticalAnomalyDetector()
+        rng = np.random.default_rng(options['seed'])
+
+        for rows in options['rows']:
+            performance_df, behavioral_df = self._build_frames(rng, rows)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{rows} sətir'))
+
+            cases = [
+                ('IQR outliers', performance_df,
+                 _iterrows_statistical_outliers, detector._detect_statistical_outliers),
+                ('Z-score', performance_df,
+                 lambda df: _iloc_z_score_anomalies(df, detector.std_threshold),
+                 detector._detect_z_score_anomalies),
+                ('Login', behavioral_df,
+                 _iterrows_login_anomalies, detector._detect_login_anomalies),
+                ('Feedback', behavioral_df,
+                 _iterrows_feedback_anomalies, detector._detect_feedback_anomalies),
+            ]
+
+            for name, df, legacy, vectorized in cases:
+                legacy_time, legacy_result = self._measure(legacy, df, options['repeat'])
+                records_time, records_result = self._measure(vectorized, df, options['repeat'])
+                columnar_time, _ = self._measure(
+                    lambda frame: vectorized(frame, columnar=True), df, options['repeat']
+                )
+
+                if len(legacy_result) != len(records_result):
+                    self.stdout.write(self.style.ERROR(
+                        f'  {name}: nəticə sayı uyğun gəlmir ({len(legacy_result)} != {len(records_result)})'
+                    ))
+                    continue
+
+                self.stdout.write(
+                    f'  {name:<14} anomaliya={len(records_result):>6}  '
+                    f'iterrows={legacy_time * 1000:9.1f}ms  '
+                    f'records={records_time * 1000:8.1f}ms  '
+                    f'columnar={columnar_time * 1000:8.1f}ms  '
+                    f'sürətlənmə={legacy_time / max(records_time, 1e-9):6.1f}x'
+                )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark tamamlandı'))
+
+    def _build_frames(self, rng, rows):
+        """Real paylanmaya yaxın sintetik performans və davranış cədvəlləri"""
+        employee_ids = np.arange(1, rows + 1)
+        employee_names = [f'İşçi {i}' for i in employee_ids]
+
+        std_score = np.abs(rng.normal(1.0, 0.6, rows))
+        performance_df = pd.DataFrame({
+            'employee_id': employee_ids,
+            'employee_name': employee_names,
+            'avg_score': np.clip(rng.normal(7.0, 1.2, rows), 1, 10),
+            'std_score': std_score,
+            'evaluation_count': rng.integers(1, 8, rows),
+            'score_variance': std_score ** 2,
+        })
+
+        sent = rng.poisson(4, rows)
+        received = rng.poisson(4, rows)
+        negative = rng.binomial(received, 0.2)
+        behavioral_df = pd.DataFrame({
+            'employee_id': employee_ids,
+            'employee_name': employee_names,
+            'sent_feedback': sent,
+            'received_feedback': received,
+            'days_since_login': rng.exponential(5, rows).astype(int),
+            'negative_feedback_ratio': negative / np.maximum(received, 1),
+            'feedback_activity_score': sent + received,
+        })
+
+        return performance_df, behavioral_df
+
+    def _measure(self, func, df, repeat):
+        """Funksiyanı bir neçə dəfə icra edib ən qısa müddəti qaytarır"""
+        best = None
+        result = None
+        for _ in range(max(repeat, 1)):
+            started = time.perf_counter()
+            result = func(df)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, result
@@ -0,0 +1,31 @@
+# core/management/commands/rebuild_cycle_statistics.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import DovrStatistikaSnapshotu, QiymetlendirmeDovru
+
+
+class Command(BaseCommand):
+    help = 'Bağlanmış dövrlər üçün statistika snapshot-larını mövcud cavablardan yenidən qurur'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dovr',
+            type=int,
+            help='Yalnız göstərilən dövrün (ID) snapshot-unu yenilə'
+        )
+
+    def handle(self, *args, **options):
+        dovrler = QiymetlendirmeDovru.objects.filter(aktivdir=False).order_by('id')
+        if options['dovr']:
+            dovrler = dovrler.filter(id=options['dovr'])
+
+        count = 0
+        for dovr in dovrler:
+            rows = DovrStatistikaSnapshotu.yenile(dovr)
+            self.stdout.write(f'  {dovr.ad}: {rows} sətir')
+            count += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} dövr üçün statistika snapshot-u yeniləndi')
+        )
@@ -0,0 +1,40 @@
+# core/management/commands/rebuild_position_levels.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import Ishchi
+
+
+class Command(BaseCommand):
+    help = 'İşçilərin normallaşdırılmış vəzifə səviyyəsini vəzifə adından yenidən hesablayır'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Bir dəfəyə yenilənən işçi sayı'
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        changed = []
+        count = 0
+
+        for ishchi in Ishchi.objects.only('id', 'vezife', 'vezife_seviyyesi').iterator(chunk_size=chunk_size):
+            seviyye = Ishchi.vezife_seviyyesini_mueyyen_et(ishchi.vezife)
+            if ishchi.vezife_seviyyesi != seviyye:
+                ishchi.vezife_seviyyesi = seviyye
+                changed.append(ishchi)
+            if len(changed) >= chunk_size:
+                Ishchi.objects.bulk_update(changed, ['vezife_seviyyesi'])
+                count += len(changed)
+                changed = []
+
+        if changed:
+            Ishchi.objects.bulk_update(changed, ['vezife_seviyyesi'])
+            count += len(changed)
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} işçinin vəzifə səviyyəsi yeniləndi')
+        )
@@ -0,0 +1,40 @@
+# core/management/commands/rebuild_score_summaries.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import Qiymetlendirme, QiymetlendirmeXalXulasesi
+
+
+class Command(BaseCommand):
+    help = 'Qiymətləndirmə xal xülasələrini mövcud cavablardan yenidən qurur'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dovr',
+            type=int,
+            help='Yalnız göstərilən dövrün (ID) qiymətləndirmələrini yenilə'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=500,
+            help='Verilənlər bazasından bir dəfəyə oxunan qiymətləndirmə sayı'
+        )
+
+    def handle(self, *args, **options):
+        qiymetlendirmeler = Qiymetlendirme.objects.filter(cavablar__isnull=False).distinct()
+        if options['dovr']:
+            qiymetlendirmeler = qiymetlendirmeler.filter(dovr_id=options['dovr'])
+
+        ids = qiymetlendirmeler.values_list('id', flat=True).order_by('id')
+
+        count = 0
+        for qiymetlendirme_id in ids.iterator(chunk_size=options['chunk_size']):
+            QiymetlendirmeXalXulasesi.yenile(qiymetlendirme_id)
+            count += 1
+            if count % 1000 == 0:
+                self.stdout.write(f'  {count} qiymətləndirmə emal edildi...')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} qiymətləndirmə üçün xal xülasəsi yeniləndi')
+        )
@@ -0,0 +1,15 @@
+# core/management/commands/rebuild_unit_paths.py
+
+from django.core.management.base import BaseCommand
+
+from core.models import OrganizationUnit
+
+
+class Command(BaseCommand):
+    help = 'Təşkilati vahidlərin ierarxiya yolunu (path, depth) parent əlaqələrindən yenidən qurur'
+
+    def handle(self, *args, **options):
+        count = OrganizationUnit.rebuild_paths()
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} təşkilati vahidin ierarxiya yolu yeniləndi')
+        )
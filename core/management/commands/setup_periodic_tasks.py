@@ -21,6 +21,9 @@ class Command(BaseCommand):
         # Bildiriş təmizləmə - həftəlik
         self.setup_notification_cleanup()
         
+        # Anomaliya modellərinin öyrədilməsi - gündəlik
+        self.setup_anomaly_model_fitting()
+        
         # AI Risk Detection - gündəlik
         self.setup_ai_risk_detection()
         
@@ -113,6 +116,33 @@ class Command(BaseCommand):
         else:
             self.stdout.write(f'✓ Bildiriş təmizləmə tapşırığı artıq mövcuddur')
 
+    def setup_anomaly_model_fitting(self):
+        """Anomaliya modellərinin gündəlik öyrədilməsi"""
+        # Crontab: Hər gün saat 07:30-da (AI Risk Detection-dan əvvəl)
+        schedule, created = CrontabSchedule.objects.get_or_create(
+            minute=30,
+            hour=7,
+            day_of_month='*',
+            month_of_year='*',
+            day_of_week='*'
+        )
+        
+        task, created = PeriodicTask.objects.get_or_create(
+            name='Anomaliya Modellərinin Öyrədilməsi',
+            defaults={
+                'crontab': schedule,
+                'task': 'core.tasks.fit_anomaly_models',
+                'args': json.dumps([]),
+                'kwargs': json.dumps({}),
+                'enabled': True
+            }
+        )
+        
+        if created:
+            self.stdout.write(f'✓ Anomaliya modeli öyrətmə tapşırığı quruldu')
+        else:
+            self.stdout.write(f'✓ Anomaliya modeli öyrətmə tapşırığı artıq mövcuddur')
+
     def setup_ai_risk_detection(self):
         """AI Risk Detection gündəlik analizi"""
         # Crontab: Hər gün saat 08:00-da
@@ -66,4 +66,21 @@ class RTLMiddleware(MiddlewareMixin):
                 'LANGUAGE_INFO': getattr(request, 'LOCALE_INFO', {}),
             })
         
-        return response
\ No newline at end of file
+        return response
+
+class ActiveCycleMiddleware:
+    """
+    Aktiv qiymətləndirmə dövrünü sorğu müddətində bir dəfə həll etmək üçün əhatə açır
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from core.active_cycle import open_request_scope, close_request_scope
+
+        token = open_request_scope()
+        try:
+            return self.get_response(request)
+        finally:
+            close_request_scope(token)
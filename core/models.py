@@ -1,5 +1,8 @@
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from simple_history.models import HistoricalRecords
 
 # AI Risk Detection Models will be added directly to avoid circular imports
@@ -21,6 +24,14 @@ class OrganizationUnit(models.Model):
         'self', on_delete=models.CASCADE, null=True, blank=True,
         related_name='children', verbose_name="Tabe Olduğu Qurum"
     )
+    # Materiallaşdırılmış yol: bütün üst vahidlərin ID-ləri, məs. "/1/5/" (kök üçün "/")
+    path = models.CharField(
+        max_length=255, default='/', editable=False, db_index=True,
+        verbose_name="İerarxiya Yolu"
+    )
+    depth = models.PositiveSmallIntegerField(
+        default=0, editable=False, verbose_name="Dərinlik"
+    )
 
     history = HistoricalRecords()
 
@@ -30,15 +41,100 @@ class OrganizationUnit(models.Model):
 
     def __str__(self):
         return self.name
+
+    def _validate_parent(self):
+        """Vahidin özünə və ya öz alt vahidinə tabe edilməsinin qarşısını alır"""
+        if self.pk and self.parent_id and f"/{self.pk}/" in f"{self.parent.path}{self.parent_id}/":
+            raise ValidationError({'parent': "Təşkilati vahid öz alt vahidinə tabe edilə bilməz"})
+
+    def clean(self):
+        super().clean()
+        self._validate_parent()
+
+    def save(self, *args, **kwargs):
+        # Dövrə path yenilənməsini sonsuz alt ağac yazısına çevirər; clean() çağırılmasa da yoxlanılır
+        self._validate_parent()
+        old_subtree_prefix = None
+        if self.pk:
+            old_path = type(self).objects.filter(pk=self.pk).values_list('path', flat=True).first()
+            if old_path is not None:
+                old_subtree_prefix = f"{old_path}{self.pk}/"
+
+        if self.parent_id:
+            self.path = f"{self.parent.path}{self.parent_id}/"
+        else:
+            self.path = '/'
+        self.depth = self.path.count('/') - 1
+
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'parent' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'path', 'depth'}
+        super().save(*args, **kwargs)
+
+        # Vahid köçürüldükdə bütün alt ağacın yolunu bir UPDATE ilə yenilə
+        new_subtree_prefix = self.subtree_prefix
+        if old_subtree_prefix and old_subtree_prefix != new_subtree_prefix:
+            type(self).objects.filter(path__startswith=old_subtree_prefix).update(
+                path=Concat(
+                    Value(new_subtree_prefix),
+                    Substr('path', len(old_subtree_prefix) + 1),
+                    output_field=models.CharField()
+                ),
+                depth=F('depth') + (new_subtree_prefix.count('/') - old_subtree_prefix.count('/'))
+            )
+
+    @property
+    def subtree_prefix(self):
+        """Alt vahidlərin path sahəsinin başladığı prefiks"""
+        return f"{self.path}{self.pk}/"
+
+    def get_descendants(self, include_self=False):
+        """Bütün səviyyələrdəki alt vahidlər"""
+        condition = Q(path__startswith=self.subtree_prefix)
+        if include_self:
+            condition |= Q(pk=self.pk)
+        return type(self).objects.filter(condition)
+
+    def get_ancestors(self, include_self=False):
+        """Kökdən başlayaraq bütün üst vahidlər"""
+        ids = [int(pk) for pk in self.path.strip('/').split('/') if pk]
+        if include_self:
+            ids.append(self.pk)
+        return type(self).objects.filter(pk__in=ids).order_by('depth')
+
+    def subtree_q(self, field='organization_unit'):
+        """
+        Bu vahid və bütün alt vahidlərinə aid obyektlər üçün Q filtri,
+        məs. Ishchi.objects.filter(unit.subtree_q('organization_unit'))
+        """
+        return Q(**{field: self}) | Q(**{f'{field}__path__startswith': self.subtree_prefix})
+
+    @classmethod
+    def rebuild_paths(cls):
+        """Bütün vahidlərin path və depth sahələrini parent əlaqələrindən yenidən qurur"""
+        units = {unit.pk: unit for unit in cls.objects.only('id', 'parent_id', 'path', 'depth')}
+        resolved = {}
+
+        def resolve(pk):
+            if pk not in resolved:
+                parent_id = units[pk].parent_id
+                resolved[pk] = '/' if parent_id is None else f"{resolve(parent_id)}{parent_id}/"
+            return resolved[pk]
+
+        changed = []
+        for pk, unit in units.items():
+            path = resolve(pk)
+            if unit.path != path or unit.depth != path.count('/') - 1:
+                unit.path, unit.depth = path, path.count('/') - 1
+                changed.append(unit)
+        cls.objects.bulk_update(changed, ['path', 'depth'], batch_size=500)
+        return len(changed)
     
     def get_full_path(self):
         """Tam hierarchik yolu göstərir"""
-        path = []
-        current = self
-        while current:
-            path.append(current.name)
-            current = current.parent
-        return " → ".join(reversed(path))
+        path = list(self.get_ancestors().values_list('name', flat=True))
+        path.append(self.name)
+        return " → ".join(path)
     
     def get_children_count(self):
         """Alt vahidlərin sayını göstərir"""
@@ -57,11 +153,27 @@ class Ishchi(AbstractUser):
         REHBER = 'REHBER', 'Rəhbər'
         ISHCHI = 'ISHCHI', 'İşçi'
 
+    class VezifeSeviyyesi(models.TextChoices):
+        SENIOR = 'senior', 'Yüksək'
+        MIDDLE = 'middle', 'Orta'
+        JUNIOR = 'junior', 'Başlanğıc'
+
+    # Vəzifə adındakı açar sözlərə görə səviyyə (prioritet sırası ilə)
+    VEZIFE_SEVIYYE_ACHAR_SOZLERI = {
+        VezifeSeviyyesi.SENIOR: ['Senior', 'Baş', 'Rəhbər', 'Direktor'],
+        VezifeSeviyyesi.MIDDLE: ['Mütəxəssis', 'Aparıcı', 'Koordinator'],
+        VezifeSeviyyesi.JUNIOR: ['Kiçik', 'Yardımçı', 'Stajçı'],
+    }
+
     # Override email field to make it unique
     email = models.EmailField('email address', unique=True)
     
     rol = models.CharField(max_length=10, choices=Rol.choices, default=Rol.ISHCHI, verbose_name="İstifadəçi Rolu")
     vezife = models.CharField(max_length=255, verbose_name="Vəzifəsi", blank=True)
+    vezife_seviyyesi = models.CharField(
+        max_length=10, choices=VezifeSeviyyesi.choices, blank=True, editable=False,
+        db_index=True, verbose_name="Vəzifə Səviyyəsi"
+    )
     organization_unit = models.ForeignKey(
         OrganizationUnit, on_delete=models.SET_NULL, null=True, blank=True,
         related_name="ishchiler", verbose_name="Təşkilati Vahid"
@@ -81,6 +193,22 @@ class Ishchi(AbstractUser):
     def __str__(self):
         return self.get_full_name() or self.username
 
+    def save(self, *args, **kwargs):
+        self.vezife_seviyyesi = self.vezife_seviyyesini_mueyyen_et(self.vezife)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'vezife' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'vezife_seviyyesi'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def vezife_seviyyesini_mueyyen_et(cls, vezife):
+        """Vəzifə adından normallaşdırılmış vəzifə səviyyəsini qaytarır"""
+        vezife = (vezife or '').casefold()
+        for seviyye, achar_sozler in cls.VEZIFE_SEVIYYE_ACHAR_SOZLERI.items():
+            if any(soz.casefold() in vezife for soz in achar_sozler):
+                return seviyye
+        return ''
+
 
 # --- Sual Hovuzu Modelləri ---
 class SualKateqoriyasi(models.Model):
@@ -133,10 +261,23 @@ class QiymetlendirmeDovru(models.Model):
         default=AnonymityLevel.MANAGER_ONLY,
         verbose_name="Anonimlik Səviyyəsi"
     )
+    statistika_snapshot_tarixi = models.DateTimeField(
+        null=True, blank=True, editable=False,
+        verbose_name="Statistika Snapshot Tarixi"
+    )
+    # Dövrün benchmark keşinin versiyası; keş prosesə aid olduğu üçün bazada saxlanılır
+    benchmark_versiyasi = models.PositiveIntegerField(
+        default=0, editable=False, verbose_name="Benchmark Versiyası"
+    )
 
     def __str__(self):
         return self.ad
 
+    @property
+    def statistika_snapshot_hazirdir(self):
+        """Bağlı dövr üçün statistika snapshot-u yazılıbsa True"""
+        return not self.aktivdir and self.statistika_snapshot_tarixi is not None
+
     def is_anonymous_for_user(self, user):
         """İstifadəçi üçün bu dövrün anonim olub olmadığını yoxlayır"""
         if self.anonymity_level == self.AnonymityLevel.OPEN:
@@ -193,6 +334,10 @@ class Qiymetlendirme(models.Model):
 
     def calculate_average_score(self):
         """Bu qiymətləndirmənin ortalama balını hesablayır"""
+        xulase = self.xal_xulaseleri.filter(kateqoriya__isnull=True).first()
+        if xulase is not None:
+            return xulase.ortalama
+
         cavablar = self.cavablar.all()
         if not cavablar.exists():
             return 0
@@ -227,6 +372,230 @@ class Cavab(models.Model):
     history = HistoricalRecords()
 
 
+class QiymetlendirmeXalXulasesi(models.Model):
+    """
+    Qiymətləndirmə üzrə xalların denormallaşdırılmış xülasəsi.
+    kateqoriya boş olan sətir qiymətləndirmənin ümumi xülasəsidir,
+    digər sətirlər isə hər kateqoriya üzrə xülasədir.
+    """
+    qiymetlendirme = models.ForeignKey(
+        Qiymetlendirme, on_delete=models.CASCADE,
+        related_name="xal_xulaseleri", verbose_name="Qiymətləndirmə"
+    )
+    kateqoriya = models.ForeignKey(
+        SualKateqoriyasi, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="xal_xulaseleri", verbose_name="Kateqoriya"
+    )
+    cavab_sayi = models.PositiveIntegerField(default=0, verbose_name="Cavab Sayı")
+    xal_cemi = models.PositiveIntegerField(default=0, verbose_name="Xalların Cəmi")
+    xal_kvadrat_cemi = models.PositiveIntegerField(default=0, verbose_name="Xal Kvadratlarının Cəmi")
+    min_xal = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Minimum Xal")
+    max_xal = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Maksimum Xal")
+    yenilenme_tarixi = models.DateTimeField(auto_now=True, verbose_name="Yenilənmə Tarixi")
+
+    class Meta:
+        verbose_name = "Qiymətləndirmə Xal Xülasəsi"
+        verbose_name_plural = "Qiymətləndirmə Xal Xülasələri"
+        unique_together = ("qiymetlendirme", "kateqoriya")
+        indexes = [
+            models.Index(fields=['qiymetlendirme', 'kateqoriya']),
+            models.Index(fields=['kateqoriya']),
+        ]
+
+    def __str__(self):
+        kateqoriya = self.kateqoriya.ad if self.kateqoriya else "Ümumi"
+        return f"{self.qiymetlendirme_id} - {kateqoriya}: {self.ortalama}"
+
+    @property
+    def ortalama(self):
+        """Ortalama xal"""
+        if not self.cavab_sayi:
+            return 0
+        return round(self.xal_cemi / self.cavab_sayi, 2)
+
+    @property
+    def dispersiya(self):
+        """Populyasiya dispersiyası (sum of squares əsasında)"""
+        if not self.cavab_sayi:
+            return 0
+        mean = self.xal_cemi / self.cavab_sayi
+        return max(self.xal_kvadrat_cemi / self.cavab_sayi - mean * mean, 0)
+
+    @classmethod
+    def yenile(cls, qiymetlendirme):
+        """
+        Qiymətləndirmənin xülasə sətirlərini cavablardan yenidən hesablayır.
+        Bir qruplaşdırılmış sorğu ilə bütün kateqoriyalar və ümumi sətir yazılır.
+        """
+        from django.db import transaction
+        from django.db.models import Count, Sum, Min, Max, F
+
+        qiymetlendirme_id = getattr(qiymetlendirme, 'pk', qiymetlendirme)
+        rows = list(
+            Cavab.objects.filter(qiymetlendirme_id=qiymetlendirme_id)
+            .values('sual__kateqoriya')
+            .annotate(
+                say=Count('id'),
+                cem=Sum('xal'),
+                kvadrat_cem=Sum(F('xal') * F('xal')),
+                minimum=Min('xal'),
+                maksimum=Max('xal'),
+            )
+        )
+
+        xulaseler = []
+        umumi = cls(qiymetlendirme_id=qiymetlendirme_id, kateqoriya=None)
+        for row in rows:
+            xulase = cls(
+                qiymetlendirme_id=qiymetlendirme_id,
+                kateqoriya_id=row['sual__kateqoriya'],
+                cavab_sayi=row['say'],
+                xal_cemi=row['cem'] or 0,
+                xal_kvadrat_cemi=row['kvadrat_cem'] or 0,
+                min_xal=row['minimum'],
+                max_xal=row['maksimum'],
+            )
+            umumi.cavab_sayi += xulase.cavab_sayi
+            umumi.xal_cemi += xulase.xal_cemi
+            umumi.xal_kvadrat_cemi += xulase.xal_kvadrat_cemi
+            umumi.min_xal = xulase.min_xal if umumi.min_xal is None else min(umumi.min_xal, xulase.min_xal)
+            umumi.max_xal = xulase.max_xal if umumi.max_xal is None else max(umumi.max_xal, xulase.max_xal)
+            # Kateqoriyasız sualların cavabları yalnız ümumi sətirdə saxlanılır
+            if xulase.kateqoriya_id is not None:
+                xulaseler.append(xulase)
+
+        if umumi.cavab_sayi:
+            xulaseler.append(umumi)
+
+        with transaction.atomic():
+            cls.objects.filter(qiymetlendirme_id=qiymetlendirme_id).delete()
+            cls.objects.bulk_create(xulaseler)
+
+        return umumi
+
+
+class DovrStatistikaSnapshotu(models.Model):
+    """
+    Bağlanmış dövrün xal statistikası: dövr × təşkilati vahid × kateqoriya × qiymətləndirmə
+    növü üzrə cavab sayı, xal cəmi və xal kvadratlarının cəmi. Yalnız tamamlanmış
+    qiymətləndirmələr nəzərə alınır. Dövr bağlandıqda Celery tapşırığı ilə yazılır.
+    """
+    dovr = models.ForeignKey(
+        QiymetlendirmeDovru, on_delete=models.CASCADE,
+        related_name="statistika_snapshotlari", verbose_name="Dövr"
+    )
+    organization_unit = models.ForeignKey(
+        OrganizationUnit, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="statistika_snapshotlari", verbose_name="Təşkilati Vahid"
+    )
+    kateqoriya = models.ForeignKey(
+        SualKateqoriyasi, on_delete=models.CASCADE, null=True, blank=True,
+        related_name="statistika_snapshotlari", verbose_name="Kateqoriya"
+    )
+    qiymetlendirme_novu = models.CharField(
+        max_length=20, choices=Qiymetlendirme.QiymetlendirmeNovu.choices,
+        verbose_name="Qiymətləndirmə Növü"
+    )
+    cavab_sayi = models.PositiveIntegerField(default=0, verbose_name="Cavab Sayı")
+    xal_cemi = models.PositiveBigIntegerField(default=0, verbose_name="Xalların Cəmi")
+    xal_kvadrat_cemi = models.PositiveBigIntegerField(default=0, verbose_name="Xal Kvadratlarının Cəmi")
+    yaradilma_tarixi = models.DateTimeField(auto_now_add=True, verbose_name="Yaradılma Tarixi")
+
+    class Meta:
+        verbose_name = "Dövr Statistika Snapshot-u"
+        verbose_name_plural = "Dövr Statistika Snapshot-ları"
+        indexes = [
+            models.Index(fields=['dovr', 'organization_unit']),
+            models.Index(fields=['dovr', 'kateqoriya']),
+        ]
+
+    def __str__(self):
+        kateqoriya = self.kateqoriya.ad if self.kateqoriya else "Kateqoriyasız"
+        return f"{self.dovr_id} / {self.organization_unit_id} / {kateqoriya} / {self.qiymetlendirme_novu}"
+
+    @classmethod
+    def yenile(cls, dovr):
+        """
+        Dövrün snapshot sətirlərini cavablardan bir qruplaşdırılmış sorğu ilə yenidən yazır
+        və dövrü snapshot tarixi ilə işarələyir. Yazılan sətirlərin sayını qaytarır.
+        """
+        from django.db import transaction
+        from django.db.models import Count, Sum
+        from django.utils import timezone
+
+        dovr_id = getattr(dovr, 'pk', dovr)
+        rows = (
+            Cavab.objects.filter(
+                qiymetlendirme__dovr_id=dovr_id,
+                qiymetlendirme__status=Qiymetlendirme.Status.TAMAMLANDI
+            )
+            .values(
+                'qiymetlendirme__qiymetlendirilen__organization_unit',
+                'sual__kateqoriya',
+                'qiymetlendirme__qiymetlendirme_novu',
+            )
+            .annotate(
+                say=Count('id'),
+                cem=Sum('xal'),
+                kvadrat_cem=Sum(F('xal') * F('xal')),
+            )
+            .order_by()
+        )
+
+        snapshotlar = [
+            cls(
+                dovr_id=dovr_id,
+                organization_unit_id=row['qiymetlendirme__qiymetlendirilen__organization_unit'],
+                kateqoriya_id=row['sual__kateqoriya'],
+                qiymetlendirme_novu=row['qiymetlendirme__qiymetlendirme_novu'],
+                cavab_sayi=row['say'],
+                xal_cemi=row['cem'] or 0,
+                xal_kvadrat_cemi=row['kvadrat_cem'] or 0,
+            )
+            for row in rows
+        ]
+
+        with transaction.atomic():
+            cls.objects.filter(dovr_id=dovr_id).delete()
+            cls.objects.bulk_create(snapshotlar)
+            # update() tarixçə və siqnalları işə salmır
+            QiymetlendirmeDovru.objects.filter(pk=dovr_id).update(
+                statistika_snapshot_tarixi=timezone.now(),
+                benchmark_versiyasi=F('benchmark_versiyasi') + 1
+            )
+
+        return len(snapshotlar)
+
+
+class KeshVersiyasi(models.Model):
+    """
+    Adlandırılmış keş qruplarının versiya sayğacı. Keş açarları bu versiyanı daxil edir;
+    sayğac verilənlər bazasında saxlandığı üçün bütün proseslər eyni dəyəri görür.
+    """
+    ad = models.CharField(max_length=100, unique=True, verbose_name="Ad")
+    versiya = models.PositiveBigIntegerField(default=0, verbose_name="Versiya")
+
+    class Meta:
+        verbose_name = "Keş Versiyası"
+        verbose_name_plural = "Keş Versiyaları"
+
+    def __str__(self):
+        return f"{self.ad}: {self.versiya}"
+
+    @classmethod
+    def cari(cls, ad):
+        """Keş qrupunun cari versiyası (sətir yoxdursa 0)"""
+        return cls.objects.filter(ad=ad).values_list('versiya', flat=True).first() or 0
+
+    @classmethod
+    def artir(cls, ad):
+        """Versiyanı bir UPDATE ilə artırır; sətir yoxdursa yaradır"""
+        if not cls.objects.filter(ad=ad).update(versiya=F('versiya') + 1):
+            sayghac, yaradildi = cls.objects.get_or_create(ad=ad, defaults={'versiya': 1})
+            if not yaradildi:
+                cls.objects.filter(pk=sayghac.pk).update(versiya=F('versiya') + 1)
+
+
 class InkishafPlani(models.Model):
     class Status(models.TextChoices):
         AKTIV = "AKTIV", "Aktiv"
@@ -1431,6 +1800,38 @@ class EmployeeRiskAnalysis(models.Model):
         )
 
 
+class RiskReanalysisQueue(models.Model):
+    """
+    Risk analizinə təsir edən məlumatı dəyişmiş işçilərin növbəsi.
+    Dövri risk tapşırığı yalnız bu işçiləri yenidən hesablayır.
+    """
+    
+    employee = models.OneToOneField(
+        Ishchi, on_delete=models.CASCADE,
+        related_name='risk_reanalysis_mark', verbose_name='İşçi'
+    )
+    marked_at = models.DateTimeField(
+        auto_now_add=True, verbose_name='İşarələnmə Tarixi'
+    )
+    
+    class Meta:
+        verbose_name = 'Risk Yenidən Analiz Növbəsi'
+        verbose_name_plural = 'Risk Yenidən Analiz Növbəsi'
+        indexes = [
+            models.Index(fields=['marked_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.employee_id} - {self.marked_at}"
+    
+    @classmethod
+    def mark(cls, *employee_ids):
+        """İşçiləri yenidən analiz üçün işarələyir (artıq növbədədirsə, dəyişmir)"""
+        rows = [cls(employee_id=employee_id) for employee_id in set(employee_ids) if employee_id]
+        if rows:
+            cls.objects.bulk_create(rows, ignore_conflicts=True)
+
+
 class PsychologicalRiskSurvey(models.Model):
     """
     Psixoloji risk sorğuları - WHO-5 və digər standart sorğular
@@ -2068,3 +2469,90 @@ class LearningPathProgram(models.Model):
     history = HistoricalRecords()
 
 
+
+
+class ReportJob(models.Model):
+    """
+    Asinxron hesabat tapşırığı. Fayl reports növbəsində yaradılır və MEDIA-da
+    məzmun hash-i ilə saxlanılır; eyni parametrli sorğular TTL müddətində
+    hazır faylı yenidən istifadə edir.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'PENDING', 'Növbədə'
+        RUNNING = 'RUNNING', 'İcra olunur'
+        COMPLETED = 'COMPLETED', 'Tamamlandı'
+        FAILED = 'FAILED', 'Uğursuz'
+
+    requested_by = models.ForeignKey(
+        Ishchi, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name="report_jobs", verbose_name="Sorğulayan"
+    )
+    report_type = models.CharField(max_length=50, verbose_name="Hesabat Növü")
+    output_format = models.CharField(max_length=10, verbose_name="Format")
+    filters = models.JSONField(default=dict, blank=True, verbose_name="Filtrlər")
+    params_hash = models.CharField(max_length=64, db_index=True, verbose_name="Parametr Hash-i")
+    status = models.CharField(
+        max_length=10, choices=Status.choices, default=Status.PENDING, verbose_name="Status"
+    )
+    file = models.FileField(upload_to="reports/", null=True, blank=True, verbose_name="Fayl")
+    content_hash = models.CharField(max_length=64, blank=True, verbose_name="Məzmun Hash-i")
+    error_message = models.TextField(blank=True, verbose_name="Xəta Mesajı")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Yaradılma Tarixi")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="Tamamlanma Tarixi")
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name="Etibarlılıq Müddəti")
+
+    class Meta:
+        verbose_name = "Hesabat Tapşırığı"
+        verbose_name_plural = "Hesabat Tapşırıqları"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['params_hash', 'status']),
+            models.Index(fields=['requested_by', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.report_type} ({self.output_format}) - {self.get_status_display()}"
+
+    @staticmethod
+    def build_params_hash(report_type, output_format, filters, viewer_rol=None):
+        """
+        Hesabat parametrlərinin hash-i. Anonimlik istifadəçinin roluna bağlı olduğu
+        üçün rol da hash-ə daxil edilir.
+        """
+        import hashlib
+        import json
+
+        payload = json.dumps({
+            'report_type': report_type,
+            'output_format': output_format,
+            'filters': filters,
+            'viewer_rol': viewer_rol,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @classmethod
+    def find_reusable(cls, params_hash, requested_by=None, completed_only=False):
+        """
+        Eyni parametrlərlə hələ etibarlı olan və ya icrada olan tapşırıq.
+        TTL-dən köhnə növbədəki tapşırıqlar (məs. işçi proses dayanıbsa) nəzərə alınmır.
+        requested_by verilərsə yalnız həmin istifadəçinin tapşırıqları axtarılır.
+        """
+        from datetime import timedelta
+        from django.conf import settings
+        from django.utils import timezone
+
+        now = timezone.now()
+        ttl = timedelta(seconds=getattr(settings, 'REPORT_ARTIFACT_TTL', 3600))
+        condition = Q(status=cls.Status.COMPLETED, expires_at__gt=now)
+        if not completed_only:
+            condition |= Q(status__in=[cls.Status.PENDING, cls.Status.RUNNING], created_at__gt=now - ttl)
+
+        jobs = cls.objects.filter(condition, params_hash=params_hash)
+        if requested_by is not None:
+            jobs = jobs.filter(requested_by=requested_by)
+        return jobs.order_by('-created_at').first()
+
+    @property
+    def is_ready(self):
+        return self.status == self.Status.COMPLETED and bool(self.file)
@@ -3,16 +3,18 @@
 Hesabat Mərkəzi Views
 """
 
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 from django.contrib import messages
 from datetime import datetime, timedelta
 import json
 
-from .reports import ReportManager, EmployeePerformanceReport, ReportGenerator
+from .models import ReportJob
+from .reports import ReportManager, EmployeePerformanceReport, ReportGenerator, ReportJobManager
 from .permissions import permission_required, has_permission
 from .tasks import generate_report_task
 from .notifications import NotificationManager
@@ -35,10 +37,16 @@ def report_center(request):
     from django.core.cache import cache
     recent_reports = cache.get(f'recent_reports_{request.user.id}', [])
     
+    # Asinxron hesabat tapşırıqları (status sorğulaması və yükləmə linkləri üçün)
+    report_jobs = list(ReportJob.objects.filter(requested_by=request.user)[:10])
+    for job in report_jobs:
+        job.title = available_reports.get(job.report_type, {}).get('name', job.report_type)
+    
     context = {
         'available_reports': user_reports,
         'filter_options': filter_options,
         'recent_reports': recent_reports,
+        'report_jobs': report_jobs,
         'title': 'Hesabat Mərkəzi'
     }
     
@@ -104,45 +112,31 @@ def generate_report(request, report_type):
         # Format
         output_format = request.POST.get('format', 'pdf')
         
-        # Hesabatı generasiya et
+        # Hesabatı reports növbəsində generasiya et
         try:
             if report_type == 'employee_performance':
-                report = EmployeePerformanceReport(filters)
-                report_data = report.get_data()
-                report_data['title'] = 'İşçi Performans Hesabatı'
-                
-                if output_format == 'pdf':
-                    buffer = ReportGenerator.generate_pdf(report_data, report_type)
-                    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
-                    response['Content-Disposition'] = f'attachment; filename="performans_hesabati_{timezone.now().strftime("%Y%m%d_%H%M")}.pdf"'
-                    
-                elif output_format == 'excel':
-                    buffer = ReportGenerator.generate_excel(report_data, report_type)
-                    response = HttpResponse(
-                        buffer.getvalue(),
-                        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-                    )
-                    response['Content-Disposition'] = f'attachment; filename="performans_hesabati_{timezone.now().strftime("%Y%m%d_%H%M")}.xlsx"'
-                    
-                elif output_format == 'csv':
-                    buffer = ReportGenerator.generate_csv(report_data, report_type)
-                    response = HttpResponse(buffer.getvalue(), content_type='text/csv')
-                    response['Content-Disposition'] = f'attachment; filename="performans_hesabati_{timezone.now().strftime("%Y%m%d_%H%M")}.csv"'
+                report_title = 'İşçi Performans Hesabatı'
+                job, reused = ReportJobManager.submit(request.user, report_type, output_format, filters)
                 
                 # Son hesabatları cache-ə əlavə et
                 from django.core.cache import cache
                 recent_reports = cache.get(f'recent_reports_{request.user.id}', [])
                 recent_reports.insert(0, {
                     'type': report_type,
-                    'title': report_data['title'],
+                    'title': report_title,
                     'generated_at': timezone.now(),
                     'format': output_format,
-                    'filters': filters
+                    'filters': filters,
+                    'job_id': job.id
                 })
                 recent_reports = recent_reports[:10]  # Son 10 hesabat
                 cache.set(f'recent_reports_{request.user.id}', recent_reports, 3600)
                 
-                return response
+                if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                    return JsonResponse(_report_job_payload(job, reused))
+                
+                messages.success(request, 'Hesabat hazırlanır. Hazır olduqda hesabat mərkəzindən yükləyə bilərsiniz.')
+                return redirect('report_center')
                 
         except Exception as e:
             messages.error(request, f'Hesabat generasiya edilərkən xəta baş verdi: {str(e)}')
@@ -157,6 +151,55 @@ def generate_report(request, report_type):
     return render(request, 'core/reports/generate_report.html', context)
 
 
+def _report_job_payload(job, reused=False):
+    """Hesabat tapşırığının sorğulama (polling) üçün JSON təsviri"""
+    return {
+        'job_id': job.id,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'reused': reused,
+        'status_url': reverse('report_job_status', args=[job.id]),
+        'download_url': reverse('report_job_download', args=[job.id]) if job.is_ready else None,
+        'expires_at': job.expires_at.isoformat() if job.expires_at else None,
+        'error': job.error_message or None
+    }
+
+
+def _get_user_report_job(request, job_id):
+    job = get_object_or_404(ReportJob, id=job_id)
+    if job.requested_by_id != request.user.id and not request.user.is_superuser:
+        raise Http404
+    return job
+
+
+@login_required
+@permission_required('view_organization_reports')
+def report_job_status(request, job_id):
+    """Hesabat tapşırığının statusu (AJAX polling)"""
+    job = _get_user_report_job(request, job_id)
+    return JsonResponse(_report_job_payload(job))
+
+
+@login_required
+@permission_required('view_organization_reports')
+def report_job_download(request, job_id):
+    """Hazır hesabat faylını yükləmə"""
+    job = _get_user_report_job(request, job_id)
+    if not job.is_ready:
+        raise Http404('Hesabat hələ hazır deyil')
+    
+    filename = (
+        f'performans_hesabati_{timezone.localtime(job.completed_at).strftime("%Y%m%d_%H%M")}'
+        f'.{ReportJobManager.EXTENSIONS[job.output_format]}'
+    )
+    response = FileResponse(
+        job.file.open('rb'),
+        content_type=ReportJobManager.CONTENT_TYPES[job.output_format]
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 @login_required
 @permission_required('view_organization_reports')
 def report_preview(request, report_type):
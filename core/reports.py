@@ -4,15 +4,26 @@ Q360 Hesabat Mərkəzi
 Dynamic filtrlər, multiple formatlar və smart caching ilə hesabat sistemi
 """
 
-from django.db.models import Count, Avg, Q, Max, Min
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count, Avg, Q, Max, Min, F, FloatField, OuterRef, Subquery, Value, ExpressionWrapper
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from django.core.cache import cache
 from django.template.loader import render_to_string
 from django.http import HttpResponse
 from datetime import datetime, timedelta
+import csv
+import hashlib
 import json
-from io import BytesIO
+import logging
+import tempfile
+from io import BytesIO, StringIO
+from itertools import islice
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, PatternFill, Alignment
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter, A4
@@ -23,9 +34,11 @@ from reportlab.lib.units import inch
 
 from .models import (
     Ishchi, Qiymetlendirme, InkishafPlani, Hedef, 
-    OrganizationUnit, QiymetlendirmeDovru, Notification
+    OrganizationUnit, QiymetlendirmeDovru, Notification, QiymetlendirmeXalXulasesi, ReportJob
 )
 
+logger = logging.getLogger('audit')
+
 class ReportManager:
     """Hesabat idarəetmə mərkəzi"""
     
@@ -92,6 +105,9 @@ class ReportManager:
 class EmployeePerformanceReport:
     """İşçi Performans Hesabatı"""
     
+    # Eksport zamanı verilənlər bazasından bir dəfəyə oxunan sətir sayı
+    EXPORT_CHUNK_SIZE = 2000
+    
     def __init__(self, filters=None):
         self.filters = filters or {}
         
@@ -108,28 +124,49 @@ class EmployeePerformanceReport:
     
     def _generate_data(self):
         """Məlumatları generasiya edir"""
-        # Base query
-        evaluations = Qiymetlendirme.objects.select_related(
-            'qiymetlendirilen', 'qiymetlendiren', 'dovr'
-        )
-        
-        # Filtrlər tətbiq et
-        evaluations = self._apply_filters(evaluations)
+        evaluations = self.get_queryset()
+        detailed_data = list(self.iter_detailed_rows(evaluations))
         
-        # Statistikalar hesabla
-        stats = self._calculate_statistics(evaluations)
-        
-        # Detallı məlumatlar
-        detailed_data = self._prepare_detailed_data(evaluations)
+        data = self.get_summary(evaluations, detailed_data)
+        data['detailed_data'] = detailed_data
+        return data
+    
+    def get_summary(self, evaluations=None, detailed_rows=None):
+        """
+        Statistikalar və ümumi say (detallı sətirlər olmadan).
+        Artıq oxunmuş detallı sətirlər verilərsə, top performerlər və şöbə
+        müqayisəsi onlardan hesablanır.
+        """
+        if evaluations is None:
+            evaluations = self.get_queryset()
+        stats = self._calculate_statistics(evaluations, detailed_rows)
         
         return {
             'stats': stats,
-            'detailed_data': detailed_data,
             'filters_applied': self.filters,
             'generated_at': timezone.now(),
-            'total_evaluations': evaluations.count()
+            'total_evaluations': stats['total_evaluations']
         }
     
+    def get_queryset(self):
+        """Filtrlənmiş qiymətləndirmələr; umumi_qiymet və tarix annotasiya kimi əlavə olunur"""
+        # Ümumi bal qiymətləndirmənin xal xülasəsindən 100 ballıq şkalaya çevrilir (xal 1-10)
+        overall_score = QiymetlendirmeXalXulasesi.objects.filter(
+            qiymetlendirme=OuterRef('pk'),
+            kateqoriya__isnull=True
+        ).annotate(
+            bal=ExpressionWrapper(F('xal_cemi') * 10.0 / F('cavab_sayi'), output_field=FloatField())
+        ).values('bal')[:1]
+        
+        evaluations = Qiymetlendirme.objects.select_related(
+            'qiymetlendirilen', 'qiymetlendiren', 'dovr'
+        ).annotate(
+            umumi_qiymet=Coalesce(Subquery(overall_score, output_field=FloatField()), Value(0.0)),
+            tarix=F('dovr__bashlama_tarixi')
+        )
+        
+        return self._apply_filters(evaluations)
+    
     def _apply_filters(self, queryset):
         """Filtrləri tətbiq edir"""
         if 'date_from' in self.filters and self.filters['date_from']:
@@ -151,72 +188,152 @@ class EmployeePerformanceReport:
             
         return queryset
     
-    def _calculate_statistics(self, evaluations):
-        """Statistikaları hesablayır"""
-        if not evaluations.exists():
+    def _calculate_statistics(self, evaluations, detailed_rows=None):
+        """
+        Statistikaları hesablayır.
+        Say, orta bal, unikal işçi sayı və performans paylanması bir şərti
+        aqreqasiya sorğusu ilə alınır. detailed_rows (bal üzrə azalan sıralı)
+        verilərsə, top performerlər və şöbə müqayisəsi əlavə sorğusuz onlardan qurulur.
+        """
+        totals = evaluations.aggregate(
+            total_evaluations=Count('pk'),
+            total_employees=Count('qiymetlendirilen', distinct=True),
+            average_score=Avg('umumi_qiymet'),
+            excellent=Count('pk', filter=Q(umumi_qiymet__gte=90)),
+            good=Count('pk', filter=Q(umumi_qiymet__gte=70, umumi_qiymet__lt=90)),
+            average=Count('pk', filter=Q(umumi_qiymet__gte=50, umumi_qiymet__lt=70)),
+            poor=Count('pk', filter=Q(umumi_qiymet__lt=50)),
+        )
+        
+        performance_dist = {
+            band: totals[band] for band in ('excellent', 'good', 'average', 'poor')
+        }
+        
+        if not totals['total_evaluations']:
             return {
+                'total_evaluations': 0,
                 'total_employees': 0,
                 'average_score': 0,
-                'performance_distribution': {},
+                'performance_distribution': performance_dist,
                 'top_performers': [],
-                'departments_comparison': {}
+                'departments_comparison': []
             }
         
-        # Ümumi statistikalar
-        avg_score = evaluations.aggregate(Avg('umumi_qiymet'))['umumi_qiymet__avg'] or 0
-        
-        # Performans paylanması
-        performance_dist = {
-            'excellent': evaluations.filter(umumi_qiymet__gte=90).count(),
-            'good': evaluations.filter(umumi_qiymet__gte=70, umumi_qiymet__lt=90).count(),
-            'average': evaluations.filter(umumi_qiymet__gte=50, umumi_qiymet__lt=70).count(),
-            'poor': evaluations.filter(umumi_qiymet__lt=50).count(),
-        }
-        
-        # Top performerlər
-        top_performers = evaluations.filter(
-            umumi_qiymet__gte=85
-        ).order_by('-umumi_qiymet')[:10]
-        
-        # Şöbələr müqayisəsi
-        dept_comparison = evaluations.values(
-            'qiymetlendirilen__organization_unit__name'
-        ).annotate(
-            avg_score=Avg('umumi_qiymet'),
-            employee_count=Count('qiymetlendirilen', distinct=True)
-        ).order_by('-avg_score')
+        if detailed_rows is None:
+            # Top performerlər
+            top_performers = list(islice(
+                self.iter_detailed_rows(evaluations.filter(umumi_qiymet__gte=85), chunk_size=10), 10
+            ))
+            
+            # Şöbələr müqayisəsi
+            dept_comparison = [
+                {
+                    'qiymetlendirilen__organization_unit__name': row['qiymetlendirilen__organization_unit__name'] or '',
+                    'avg_score': round(row['avg_score'], 2),
+                    'employee_count': row['employee_count'],
+                }
+                for row in evaluations.values(
+                    'qiymetlendirilen__organization_unit__name'
+                ).annotate(
+                    avg_score=Avg('umumi_qiymet'),
+                    employee_count=Count('qiymetlendirilen', distinct=True)
+                ).order_by('-avg_score')
+            ]
+        else:
+            top_performers = [row for row in detailed_rows[:10] if row['umumi_qiymet_raw'] >= 85]
+            dept_comparison = self._departments_comparison(detailed_rows)
         
         return {
-            'total_employees': evaluations.values('qiymetlendirilen').distinct().count(),
-            'average_score': round(avg_score, 2),
+            'total_evaluations': totals['total_evaluations'],
+            'total_employees': totals['total_employees'],
+            'average_score': round(totals['average_score'] or 0, 2),
             'performance_distribution': performance_dist,
-            'top_performers': list(top_performers),
-            'departments_comparison': list(dept_comparison)
+            'top_performers': top_performers,
+            'departments_comparison': dept_comparison
         }
     
-    def _prepare_detailed_data(self, evaluations):
-        """Detallı məlumatları hazırlayır"""
-        detailed_data = []
+    @staticmethod
+    def _departments_comparison(detailed_rows):
+        """Detallı sətirlərdən şöbə üzrə orta bal və unikal işçi sayı"""
+        departments = {}
+        for row in detailed_rows:
+            department = departments.setdefault(
+                row['qiymetlendirilen__organization_unit__name'],
+                {'total': 0, 'count': 0, 'employees': set()}
+            )
+            department['total'] += row['umumi_qiymet_raw']
+            department['count'] += 1
+            department['employees'].add(row['qiymetlendirilen_id'])
+        
+        return sorted((
+            {
+                'qiymetlendirilen__organization_unit__name': name,
+                'avg_score': round(department['total'] / department['count'], 2),
+                'employee_count': len(department['employees']),
+            }
+            for name, department in departments.items()
+        ), key=lambda item: item['avg_score'], reverse=True)
+    
+    def iter_detailed_rows(self, evaluations=None, chunk_size=None):
+        """
+        Detallı sətirləri bal üzrə SQL-də sıralanmış halda, verilənlər bazası
+        kursoru ilə hissə-hissə oxuyaraq qaytarır (generator).
+        """
+        if evaluations is None:
+            evaluations = self.get_queryset()
+        
+        current_user = self.filters.get('current_user')
+        roles = dict(Ishchi.Rol.choices)
+        anonymity = {}
+        
+        rows = evaluations.order_by('-umumi_qiymet', 'pk').values_list(
+            'qiymetlendirilen_id',
+            'qiymetlendirilen__first_name',
+            'qiymetlendirilen__last_name',
+            'qiymetlendirilen__organization_unit__name',
+            'qiymetlendirilen__rol',
+            'umumi_qiymet',
+            'tarix',
+            'qiymetlendiren__first_name',
+            'qiymetlendiren__last_name',
+            'dovr__anonymity_level'
+        )
         
-        for evaluation in evaluations.select_related('qiymetlendirilen', 'qiymetlendiren', 'dovr'):
+        for (employee_id, first_name, last_name, unit_name, rol, umumi_qiymet, tarix,
+             evaluator_first_name, evaluator_last_name, anonymity_level) in rows.iterator(
+                chunk_size=chunk_size or self.EXPORT_CHUNK_SIZE):
             # Anonimlik səviyyəsinə görə məlumatları filtrələ
-            is_anonymous = evaluation.dovr.is_anonymous_for_user(self.filters.get('current_user'))
+            if anonymity_level not in anonymity:
+                dovr = QiymetlendirmeDovru(anonymity_level=anonymity_level)
+                is_anonymous = (
+                    dovr.is_anonymous_for_user(current_user) if current_user is not None
+                    else anonymity_level != QiymetlendirmeDovru.AnonymityLevel.OPEN
+                )
+                anonymity[anonymity_level] = (is_anonymous, dovr.get_anonymity_level_display())
+            is_anonymous, anonymity_display = anonymity[anonymity_level]
             
-            data = {
-                'qiymetlendirilen__first_name': evaluation.qiymetlendirilen.first_name,
-                'qiymetlendirilen__last_name': evaluation.qiymetlendirilen.last_name,
-                'qiymetlendirilen__organization_unit__name': evaluation.qiymetlendirilen.organization_unit.name if evaluation.qiymetlendirilen.organization_unit else '',
-                'qiymetlendirilen__rol': evaluation.qiymetlendirilen.get_rol_display(),
-                'umumi_qiymet': getattr(evaluation, 'umumi_qiymet', 0),
-                'tarix': getattr(evaluation, 'tarix', evaluation.dovr.bashlama_tarixi),
-                'qiymetlendiren__first_name': "***" if is_anonymous else evaluation.qiymetlendiren.first_name,
-                'qiymetlendiren__last_name': "Anonim" if is_anonymous else evaluation.qiymetlendiren.last_name,
-                'anonymity_level': evaluation.dovr.get_anonymity_level_display(),
+            yield {
+                'qiymetlendirilen_id': employee_id,
+                'qiymetlendirilen__first_name': first_name,
+                'qiymetlendirilen__last_name': last_name,
+                'qiymetlendirilen__organization_unit__name': unit_name or '',
+                'qiymetlendirilen__rol': roles.get(rol, rol),
+                'umumi_qiymet': round(umumi_qiymet, 2),
+                # Yuvarlaqlaşdırılmamış bal: statistikalar SQL Avg ilə eyni nəticə versin
+                'umumi_qiymet_raw': umumi_qiymet,
+                'tarix': tarix,
+                'qiymetlendiren__first_name': "***" if is_anonymous else evaluator_first_name,
+                'qiymetlendiren__last_name': "Anonim" if is_anonymous else evaluator_last_name,
+                'anonymity_level': anonymity_display,
                 'is_anonymous': is_anonymous
             }
-            detailed_data.append(data)
-        
-        return sorted(detailed_data, key=lambda x: x['umumi_qiymet'], reverse=True)
+
+
+class _Echo:
+    """csv.writer üçün yazılanı elə həmin an qaytaran psevdo-bufer"""
+    
+    def write(self, value):
+        return value
 
 
 class ReportGenerator:
@@ -398,31 +515,238 @@ class ReportGenerator:
             adjusted_width = min(max_length + 2, 50)
             ws.column_dimensions[column_letter].width = adjusted_width
     
+    PERFORMANCE_HEADERS = ['Ad', 'Soyad', 'Şöbə', 'Rol', 'Performans Balı', 'Tarix', 'Qiymətləndirən']
+    
+    @staticmethod
+    def _performance_row(item):
+        """Detallı sətri CSV/Excel sütunlarına çevirir"""
+        return [
+            item['qiymetlendirilen__first_name'],
+            item['qiymetlendirilen__last_name'],
+            item['qiymetlendirilen__organization_unit__name'],
+            item['qiymetlendirilen__rol'],
+            item['umumi_qiymet'],
+            item['tarix'].strftime('%d.%m.%Y') if item['tarix'] else '',
+            f"{item['qiymetlendiren__first_name']} {item['qiymetlendiren__last_name']}"
+        ]
+    
     @staticmethod
     def generate_csv(report_data, report_type):
         """CSV hesabat generasiya edir"""
-        import csv
-        from io import StringIO
-        
         output = StringIO()
-        writer = csv.writer(output)
         
         if report_type == 'employee_performance':
-            # CSV başlıqları
-            writer.writerow(['Ad', 'Soyad', 'Şöbə', 'Rol', 'Performans Balı', 'Tarix', 'Qiymətləndirən'])
+            output.writelines(ReportGenerator.stream_performance_csv(report_data['detailed_data']))
+        
+        output.seek(0)
+        return output
+    
+    @staticmethod
+    def stream_performance_csv(rows):
+        """Performans sətirlərini CSV xətləri kimi bir-bir qaytarır (StreamingHttpResponse üçün)"""
+        writer = csv.writer(_Echo())
+        yield writer.writerow(ReportGenerator.PERFORMANCE_HEADERS)
+        for item in rows:
+            yield writer.writerow(ReportGenerator._performance_row(item))
+    
+    @staticmethod
+    def generate_performance_excel_file(summary, rows):
+        """
+        Performans hesabatını openpyxl write-only rejimində müvəqqəti fayla yazır.
+        Sətirlər yaddaşda saxlanılmadan birbaşa fayla axıdılır; fayl başa qaytarılmış halda qaytarılır.
+        """
+        workbook = openpyxl.Workbook(write_only=True)
+        ws = workbook.create_sheet("Performans Hesabatı")
+        
+        header_font = Font(bold=True, color="FFFFFF")
+        header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+        
+        def styled(value, font=None, fill=None):
+            cell = WriteOnlyCell(ws, value=value)
+            if font:
+                cell.font = font
+            if fill:
+                cell.fill = fill
+            return cell
+        
+        # Write-only rejimində sütun enləri sətirlərdən əvvəl təyin edilməlidir
+        for column_letter, width in zip('ABCDEFG', [20, 20, 30, 15, 16, 12, 30]):
+            ws.column_dimensions[column_letter].width = width
+        
+        ws.append([styled("Q360 Performans Hesabatı", Font(bold=True, size=16))])
+        ws.append([f"Generasiya tarixi: {summary['generated_at'].strftime('%d.%m.%Y %H:%M')}"])
+        ws.append([])
+        
+        # Statistikalar bölməsi
+        ws.append([styled("Ümumi Statistikalar", Font(bold=True, size=14))])
+        stats = summary['stats']
+        ws.append([styled('Metrика', header_font, header_fill), styled('Dəyər', header_font, header_fill)])
+        ws.append(['Cəmi İşçi Sayı', stats['total_employees']])
+        ws.append(['Orta Performans Balı', round(stats['average_score'], 2)])
+        ws.append(['Cəmi Qiymətləndirmə', summary['total_evaluations']])
+        ws.append([])
+        
+        # Detallı məlumatlar
+        if summary['total_evaluations']:
+            ws.append([styled("Detallı Məlumatlar", Font(bold=True, size=14))])
+            ws.append([styled(header, header_font, header_fill) for header in ReportGenerator.PERFORMANCE_HEADERS])
+            for item in rows:
+                ws.append(ReportGenerator._performance_row(item))
+        
+        output = tempfile.TemporaryFile()
+        workbook.save(output)
+        output.seek(0)
+        return output
+
+
+class ReportJobManager:
+    """Asinxron hesabat tapşırıqlarının yaradılması və icrası"""
+    
+    CONTENT_TYPES = {
+        'pdf': 'application/pdf',
+        'excel': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'csv': 'text/csv',
+    }
+    EXTENSIONS = {'pdf': 'pdf', 'excel': 'xlsx', 'csv': 'csv'}
+    
+    @staticmethod
+    def submit(user, report_type, output_format, filters, enqueue=True):
+        """
+        Hesabat tapşırığını yaradır və reports növbəsinə göndərir.
+        İstifadəçinin eyni parametrli etibarlı tapşırığı varsa, yenisi yaradılmır.
+        Eyni rollu başqa istifadəçinin hazır faylı varsa, istifadəçi üçün həmin
+        fayla istinad edən tamamlanmış tapşırıq yaradılır.
+        (tapşırıq, yenidən_istifadə_edildi) cütünü qaytarır.
+        """
+        filters = {
+            key: value.isoformat() if hasattr(value, 'isoformat') else value
+            for key, value in (filters or {}).items()
+        }
+        params_hash = ReportJob.build_params_hash(
+            report_type, output_format, filters, getattr(user, 'rol', None)
+        )
+        
+        existing = ReportJob.find_reusable(params_hash, requested_by=user)
+        if existing is not None:
+            return existing, True
+        
+        job = ReportJob(
+            requested_by=user,
+            report_type=report_type,
+            output_format=output_format,
+            filters=filters,
+            params_hash=params_hash
+        )
+        
+        shared = ReportJob.find_reusable(params_hash, completed_only=True)
+        if shared is not None:
+            ReportJobManager._copy_artifact(job, shared)
+            job.save()
+            return job, True
+        
+        job.save()
+        
+        if enqueue:
+            def send():
+                from .tasks import generate_report_task
+                try:
+                    generate_report_task.delay(job_id=job.id)
+                except Exception as e:
+                    # Broker əlçatan deyilsə hesabatı birbaşa yarat
+                    logger.warning(f"Hesabat növbəyə göndərilə bilmədi, birbaşa yaradılır: {e}")
+                    ReportJobManager.run(job)
             
-            # Məlumatlar
-            for item in report_data['detailed_data']:
-                writer.writerow([
-                    item['qiymetlendirilen__first_name'],
-                    item['qiymetlendirilen__last_name'],
-                    item['qiymetlendirilen__organization_unit__name'],
-                    item['qiymetlendirilen__rol'],
-                    item['umumi_qiymet'],
-                    item['tarix'].strftime('%d.%m.%Y') if item['tarix'] else '',
-                    f"{item['qiymetlendiren__first_name']} {item['qiymetlendiren__last_name']}"
-                ])
+            transaction.on_commit(send)
+        
+        return job, False
+    
+    @staticmethod
+    def run(job):
+        """Hesabat faylını yaradır və MEDIA-da məzmun hash-i ilə saxlayır"""
+        if job.is_ready:
+            return job
+        
+        # Növbədə gözləyərkən eyni parametrli fayl başqa tapşırıqla hazırlanmış ola bilər
+        shared = ReportJob.find_reusable(job.params_hash, completed_only=True)
+        if shared is not None and shared.pk != job.pk:
+            ReportJobManager._copy_artifact(job, shared)
+            job.save(update_fields=['file', 'content_hash', 'status', 'error_message', 'completed_at', 'expires_at'])
+            return job
+        
+        job.status = ReportJob.Status.RUNNING
+        job.save(update_fields=['status'])
+        
+        try:
+            filters = dict(job.filters, current_user=job.requested_by)
+            output = ReportJobManager._render(job.report_type, job.output_format, filters)
+            
+            with output:
+                digest = hashlib.sha256()
+                for chunk in iter(lambda: output.read(64 * 1024), b''):
+                    digest.update(chunk)
+                content_hash = digest.hexdigest()
+                output.seek(0)
+                
+                # Eyni məzmunlu fayl artıq saxlanılıbsa yenidən yazılmır
+                name = f"reports/{content_hash[:2]}/{content_hash}.{ReportJobManager.EXTENSIONS[job.output_format]}"
+                if not default_storage.exists(name):
+                    name = default_storage.save(name, File(output))
+            
+            now = timezone.now()
+            job.file.name = name
+            job.content_hash = content_hash
+            job.status = ReportJob.Status.COMPLETED
+            job.error_message = ''
+            job.completed_at = now
+            job.expires_at = now + timedelta(seconds=getattr(settings, 'REPORT_ARTIFACT_TTL', 3600))
+            job.save(update_fields=[
+                'file', 'content_hash', 'status', 'error_message', 'completed_at', 'expires_at'
+            ])
+            logger.info(f"Hesabat faylı yaradıldı: {job.report_type} ({job.output_format}) -> {name}")
+            
+        except Exception as e:
+            job.status = ReportJob.Status.FAILED
+            job.error_message = str(e)
+            job.completed_at = timezone.now()
+            job.save(update_fields=['status', 'error_message', 'completed_at'])
+            logger.error(f"Hesabat tapşırığı {job.id} uğursuz oldu: {e}")
+            raise
+        
+        return job
+    
+    @staticmethod
+    def _copy_artifact(job, source):
+        """Tamamlanmış tapşırığın faylını (məzmun hash-i ilə) başqa tapşırığa bağlayır"""
+        job.file.name = source.file.name
+        job.content_hash = source.content_hash
+        job.status = ReportJob.Status.COMPLETED
+        job.error_message = ''
+        job.completed_at = timezone.now()
+        job.expires_at = source.expires_at
+    
+    @staticmethod
+    def _render(report_type, output_format, filters):
+        """Hesabatı oxunmağa hazır binar fayl obyekti kimi qaytarır"""
+        if report_type != 'employee_performance':
+            raise ValueError(f"Dəstəklənməyən hesabat növü: {report_type}")
+        if output_format not in ReportJobManager.EXTENSIONS:
+            raise ValueError(f"Dəstəklənməyən format: {output_format}")
+        
+        report = EmployeePerformanceReport(filters)
+        
+        if output_format == 'pdf':
+            report_data = report.get_data()
+            report_data['title'] = 'İşçi Performans Hesabatı'
+            return ReportGenerator.generate_pdf(report_data, report_type)
+        
+        if output_format == 'excel':
+            return ReportGenerator.generate_performance_excel_file(
+                report.get_summary(), report.iter_detailed_rows()
+            )
         
+        output = tempfile.TemporaryFile()
+        for line in ReportGenerator.stream_performance_csv(report.iter_detailed_rows()):
+            output.write(line.encode('utf-8'))
         output.seek(0)
         return output
 
@@ -0,0 +1,117 @@
+# core/score_rollup.py
+
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from .models import Cavab, Ishchi, KeshVersiyasi, OrganizationUnit, QiymetlendirmeDovru
+
+ROLLUP_VERSION_NAME = 'unit_score_rollup'
+
+
+def get_rollup_generation() -> int:
+    """
+    Vahid xal məlumatlarının cari nəsli. Cavab, struktur və ya işçi vahidi dəyişdikdə
+    artır; vahid üzrə xal keşləri bu dəyəri açara daxil edərək etibarsız olur.
+    Nəsil verilənlər bazasında saxlanılır ki, prosesə məxsus keşdə də bütün
+    worker-lər eyni anda etibarsızlaşmanı görsün.
+    """
+    return KeshVersiyasi.cari(ROLLUP_VERSION_NAME)
+
+
+def _cache_key(cycle: Optional[QiymetlendirmeDovru]) -> str:
+    return f"unit_score_rollup:{cycle.id if cycle else 'all'}:{get_rollup_generation()}"
+
+
+def invalidate_unit_score_rollup():
+    """Bütün dövrlər üçün keşlənmiş xal toplamalarını etibarsız edir"""
+    KeshVersiyasi.artir(ROLLUP_VERSION_NAME)
+
+
+def _children_first(rollup: Dict[int, Dict]) -> List[Dict]:
+    """Vahidləri elə sıralayır ki, hər vahid öz üst vahidindən əvvəl gəlsin"""
+    pending_children = {unit_id: 0 for unit_id in rollup}
+    for unit in rollup.values():
+        if unit['parent_id'] in pending_children:
+            pending_children[unit['parent_id']] += 1
+
+    ordered = [unit for unit_id, unit in rollup.items() if not pending_children[unit_id]]
+    for unit in ordered:
+        parent_id = unit['parent_id']
+        if parent_id in pending_children:
+            pending_children[parent_id] -= 1
+            if not pending_children[parent_id]:
+                ordered.append(rollup[parent_id])
+    return ordered
+
+
+def get_unit_score_rollup(cycle: Optional[QiymetlendirmeDovru] = None) -> Dict[int, Dict]:
+    """
+    Təşkilati vahidlər üzrə xal toplamaları.
+    Cavablar bir qruplaşdırılmış sorğu ilə vahid üzrə cəmlənir, sonra ağac boyunca
+    yaddaşda yuxarı ötürülür. Hər vahid üçün həm özünə aid (own_*), həm də bütün alt
+    vahidləri daxil olmaqla (sum, count, avg) dəyərlər qaytarılır.
+    cycle None olduqda bütün dövrlər nəzərə alınır. Nəticə dövr üzrə keşlənir.
+    """
+    key = _cache_key(cycle)
+    rollup = cache.get(key)
+    if rollup is not None:
+        return rollup
+
+    rollup = {}
+    for unit_id, name, unit_type, parent_id, depth in OrganizationUnit.objects.order_by('pk').values_list(
+        'id', 'name', 'type', 'parent_id', 'depth'
+    ):
+        rollup[unit_id] = {
+            'id': unit_id,
+            'name': name,
+            'type': unit_type,
+            'parent_id': parent_id,
+            'depth': depth,
+            'own_sum': 0,
+            'own_count': 0,
+            'own_avg': None,
+            'sum': 0,
+            'count': 0,
+            'avg': None,
+            'active_employee_count': 0,
+        }
+
+    answers = Cavab.objects.filter(qiymetlendirme__qiymetlendirilen__organization_unit__isnull=False)
+    if cycle:
+        answers = answers.filter(qiymetlendirme__dovr=cycle)
+    for unit_id, total, count in answers.values(
+        'qiymetlendirme__qiymetlendirilen__organization_unit'
+    ).annotate(total=Sum('xal'), count=Count('id')).values_list(
+        'qiymetlendirme__qiymetlendirilen__organization_unit', 'total', 'count'
+    ).order_by():
+        rollup[unit_id]['own_sum'] = total or 0
+        rollup[unit_id]['own_count'] = count
+
+    for unit_id, count in Ishchi.objects.filter(
+        is_active=True, organization_unit__isnull=False
+    ).values('organization_unit').annotate(count=Count('id')).values_list(
+        'organization_unit', 'count'
+    ).order_by():
+        rollup[unit_id]['active_employee_count'] = count
+
+    # Cəmləri parent_id topologiyası üzrə (alt vahidlər üst vahidlərdən əvvəl) yuxarı ötür;
+    # saxlanılmış depth sahəsi rebuild_unit_paths icra edilməyibsə düzgün olmaya bilər
+    for unit in _children_first(rollup):
+        unit['sum'] += unit['own_sum']
+        unit['count'] += unit['own_count']
+        parent = rollup.get(unit['parent_id'])
+        if parent is not None:
+            parent['sum'] += unit['sum']
+            parent['count'] += unit['count']
+
+    for unit in rollup.values():
+        if unit['own_count']:
+            unit['own_avg'] = unit['own_sum'] / unit['own_count']
+        if unit['count']:
+            unit['avg'] = unit['sum'] / unit['count']
+
+    cache.set(key, rollup, getattr(settings, 'UNIT_SCORE_ROLLUP_CACHE_TIMEOUT', 600))
+    return rollup
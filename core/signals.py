@@ -2,7 +2,8 @@
 
 from django.conf import settings
 from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.urls import reverse
 from django.utils.encoding import force_bytes
@@ -10,9 +11,16 @@ from django.utils.http import urlsafe_base64_encode
 from django.utils.translation import gettext_lazy as _
 from django.contrib.sites.models import Site
 
-from .models import Ishchi, Qiymetlendirme, Feedback
+from .models import (
+    Ishchi, Qiymetlendirme, Feedback, Cavab, QuickFeedback, InkishafPlani,
+    PsychologicalRiskResponse, RiskReanalysisQueue, QiymetlendirmeDovru,
+    OrganizationUnit, DovrStatistikaSnapshotu, QiymetlendirmeXalXulasesi
+)
+from .active_cycle import invalidate_active_cycle
+from .score_rollup import invalidate_unit_score_rollup
+from .cycle_statistics import invalidate_cycle_benchmarks
 from .tokens import account_activation_token
-from .tasks import send_activation_email_task
+from .tasks import send_activation_email_task, build_cycle_statistics_snapshot
 from .notifications import (
     notify_new_employee_joined, 
     notify_feedback_received,
@@ -20,6 +28,34 @@ from .notifications import (
 )
 
 
+def _defer_per_transaction(name, key, handler):
+    """
+    Açarı cari tranzaksiyanın `name` adlı toplusuna əlavə edir; commit-dən sonra
+    handler(açarlar) hər toplu üçün bir dəfə çağırılır. Tranzaksiya xaricində
+    handler dərhal tək açarla işə düşür.
+    """
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        handler({key})
+        return
+
+    batches = connection.__dict__.setdefault('_q360_deferred_batches', {})
+    batch = batches.get(name)
+    # Geri alınmış və ya artıq icra edilmiş toplu yenidən istifadə edilmir
+    if batch is None or not any(entry[1] is batch['flush'] for entry in connection.run_on_commit):
+        batch = {'keys': set()}
+
+        def flush(batch=batch):
+            if batches.get(name) is batch:
+                del batches[name]
+            handler(batch['keys'])
+
+        batch['flush'] = flush
+        batches[name] = batch
+        transaction.on_commit(flush)
+    batch['keys'].add(key)
+
+
 @receiver(post_save, sender=Qiymetlendirme)
 def send_notification_on_new_assignment(sender, instance, created, **kwargs):
     """
@@ -153,3 +189,220 @@ def notify_evaluation_assignment(sender, instance, created, **kwargs):
             evaluator=instance.qiymetlendiren,
             due_date=instance.dovr.bitme_tarixi if instance.dovr else None
         )
+
+
+# === RİSK ANALİZİ ÜÇÜN DƏYİŞİKLİK İZLƏMƏ ===
+
+def _mark_risk_dirty(keys):
+    """Toplanmış işçi və qiymətləndirmə açarlarını bir dəfəyə risk növbəsinə yaz"""
+    employee_ids = {pk for kind, pk in keys if kind == 'employee'}
+    evaluation_ids = {pk for kind, pk in keys if kind == 'evaluation'}
+    if evaluation_ids:
+        employee_ids.update(
+            Qiymetlendirme.objects.filter(pk__in=evaluation_ids).values_list('qiymetlendirilen_id', flat=True)
+        )
+    # Kaskad silinmədə işçinin özü də silinmiş ola bilər
+    RiskReanalysisQueue.mark(*Ishchi.objects.filter(pk__in=employee_ids).values_list('pk', flat=True))
+
+
+def _queue_risk_employee(employee_id):
+    _defer_per_transaction('risk_reanalysis', ('employee', employee_id), _mark_risk_dirty)
+
+
+@receiver([post_save, post_delete], sender=Cavab)
+def mark_risk_dirty_on_answer(sender, instance, **kwargs):
+    """Cavab dəyişdikdə qiymətləndirilən işçini risk növbəsinə əlavə et"""
+    qiymetlendirme = instance._state.fields_cache.get('qiymetlendirme')
+    if qiymetlendirme is not None:
+        _queue_risk_employee(qiymetlendirme.qiymetlendirilen_id)
+    else:
+        # İşçi commit-dən sonra bütün toplu üçün bir sorğu ilə tapılır
+        _defer_per_transaction('risk_reanalysis', ('evaluation', instance.qiymetlendirme_id), _mark_risk_dirty)
+
+
+@receiver([post_save, post_delete], sender=Qiymetlendirme)
+def mark_risk_dirty_on_evaluation(sender, instance, **kwargs):
+    """Qiymətləndirmə dəyişdikdə qiymətləndirilən işçini risk növbəsinə əlavə et"""
+    _queue_risk_employee(instance.qiymetlendirilen_id)
+
+
+@receiver([post_save, post_delete], sender=QuickFeedback)
+def mark_risk_dirty_on_quick_feedback(sender, instance, **kwargs):
+    """Sürətli rəy alan işçini risk növbəsinə əlavə et"""
+    _queue_risk_employee(instance.to_user_id)
+
+
+@receiver([post_save, post_delete], sender=InkishafPlani)
+def mark_risk_dirty_on_development_plan(sender, instance, **kwargs):
+    """İnkişaf planı dəyişdikdə işçini risk növbəsinə əlavə et"""
+    _queue_risk_employee(instance.ishchi_id)
+
+
+@receiver([post_save, post_delete], sender=PsychologicalRiskResponse)
+def mark_risk_dirty_on_psych_response(sender, instance, **kwargs):
+    """Psixoloji sorğu cavabı verildikdə və ya silindikdə işçini risk növbəsinə əlavə et"""
+    _queue_risk_employee(instance.employee_id)
+
+
+@receiver([post_save, post_delete], sender=QiymetlendirmeDovru)
+def invalidate_active_cycle_cache(sender, instance, **kwargs):
+    """Dövr dəyişdikdə aktiv dövr keşini sil"""
+    invalidate_active_cycle()
+    # Tranzaksiya bitənədək paralel sorğular köhnə dəyəri yenidən keşləyə bilər
+    transaction.on_commit(invalidate_active_cycle)
+
+
+# === STRUKTUR YOLLARI ===
+
+@receiver(post_migrate)
+def backfill_unit_paths(sender, **kwargs):
+    """Miqrasiyadan sonra path/depth sahələri boş və ya köhnə qalan vahidlərin yolunu bərpa et"""
+    if sender.name == 'core':
+        OrganizationUnit.rebuild_paths()
+
+
+# === XAL XÜLASƏSİ ===
+
+def _rebuild_score_summaries(qiymetlendirme_ids):
+    """Toplanmış qiymətləndirmələrin xal xülasəsini hər biri üçün bir dəfə yenidən qur"""
+    # Qiymətləndirmə kaskad silinmədə artıq mövcud olmaya bilər
+    existing = Qiymetlendirme.objects.filter(pk__in=qiymetlendirme_ids).values_list('pk', flat=True)
+    for qiymetlendirme_id in existing:
+        QiymetlendirmeXalXulasesi.yenile(qiymetlendirme_id)
+
+
+@receiver([post_save, post_delete], sender=Cavab)
+def rebuild_score_summary_on_answer(sender, instance, **kwargs):
+    """Cavab yazıldıqda və ya silindikdə qiymətləndirmənin xal xülasəsini commit-dən sonra yenidən qur"""
+    _defer_per_transaction('score_summary', instance.qiymetlendirme_id, _rebuild_score_summaries)
+
+
+# === DÖVR STATİSTİKA SNAPSHOT-U ===
+
+@receiver(pre_save, sender=QiymetlendirmeDovru)
+def track_cycle_closing(sender, instance, **kwargs):
+    """Dövrün aktivdir sahəsinin dəyişib-dəyişmədiyini yadda saxla"""
+    previous = None
+    if instance.pk:
+        current = sender.objects.filter(pk=instance.pk).values_list('aktivdir', 'benchmark_versiyasi').first()
+        if current is not None:
+            previous, instance.benchmark_versiyasi = current
+    instance._aktivdir_deyisdi = previous is not None and previous != instance.aktivdir
+    if instance._aktivdir_deyisdi:
+        # Köhnə snapshot yenisi yazılanadək istifadə edilməməlidir
+        instance.statistika_snapshot_tarixi = None
+
+
+@receiver(post_save, sender=QiymetlendirmeDovru)
+def build_snapshot_on_cycle_close(sender, instance, created, **kwargs):
+    """Dövr bağlandıqda statistika snapshot-unu arxa planda yaz"""
+    if created or instance.aktivdir or not getattr(instance, '_aktivdir_deyisdi', False):
+        return
+
+    def enqueue():
+        try:
+            build_cycle_statistics_snapshot.delay(instance.pk)
+        except Exception:
+            # Broker əlçatan deyilsə snapshot-u birbaşa yaz
+            DovrStatistikaSnapshotu.yenile(instance.pk)
+
+    transaction.on_commit(enqueue)
+
+
+def _queue_score_rollup_invalidation():
+    """
+    Vahid xal keşinin nəslini commit-dən sonra tranzaksiyada bir dəfə artır;
+    sayğac sətri yazan tranzaksiyalar boyunca kilidlənmir.
+    """
+    _defer_per_transaction('score_rollup', None, lambda keys: invalidate_unit_score_rollup())
+
+
+@receiver([post_save, post_delete], sender=Cavab)
+@receiver([post_save, post_delete], sender=OrganizationUnit)
+def invalidate_score_rollup(sender, instance, **kwargs):
+    """Cavab və ya struktur dəyişdikdə vahid xal keşlərini sil"""
+    _queue_score_rollup_invalidation()
+
+
+@receiver(pre_save, sender=Qiymetlendirme)
+def track_evaluation_status(sender, instance, update_fields=None, **kwargs):
+    """Qiymətləndirmənin statusunun dəyişib-dəyişmədiyini yadda saxla"""
+    previous = None
+    if instance.pk and (update_fields is None or 'status' in update_fields):
+        previous = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    instance._status_deyisdi = previous is not None and previous != instance.status
+
+
+@receiver(post_save, sender=Qiymetlendirme)
+def invalidate_score_rollup_on_status(sender, instance, **kwargs):
+    """Yalnız status dəyişdikdə (məs. tamamlandıqda) vahid xal keşlərini sil"""
+    if getattr(instance, '_status_deyisdi', False):
+        _queue_score_rollup_invalidation()
+
+
+def _invalidate_benchmarks(keys):
+    """Toplanmış dövr və qiymətləndirmə açarlarının dövrlərinin benchmark versiyasını bir dəfə artır"""
+    cycle_ids = {pk for kind, pk in keys if kind == 'cycle'}
+    evaluation_ids = {pk for kind, pk in keys if kind == 'evaluation'}
+    if evaluation_ids:
+        cycle_ids.update(
+            Qiymetlendirme.objects.filter(pk__in=evaluation_ids).values_list('dovr_id', flat=True)
+        )
+    if cycle_ids:
+        invalidate_cycle_benchmarks(cycle_ids)
+
+
+def _queue_benchmark_invalidation(cycle_id):
+    _defer_per_transaction('cycle_benchmarks', ('cycle', cycle_id), _invalidate_benchmarks)
+
+
+@receiver([post_save, post_delete], sender=Cavab)
+def invalidate_benchmarks_on_answer(sender, instance, **kwargs):
+    """Cavab dəyişdikdə həmin dövrün benchmark keşini commit-dən sonra sil"""
+    qiymetlendirme = instance._state.fields_cache.get('qiymetlendirme')
+    if qiymetlendirme is not None:
+        _queue_benchmark_invalidation(qiymetlendirme.dovr_id)
+    else:
+        # Dövr commit-dən sonra bütün toplu üçün bir sorğu ilə tapılır
+        _defer_per_transaction('cycle_benchmarks', ('evaluation', instance.qiymetlendirme_id), _invalidate_benchmarks)
+
+
+@receiver([post_save, post_delete], sender=Qiymetlendirme)
+def invalidate_benchmarks_on_evaluation(sender, instance, **kwargs):
+    """Qiymətləndirmə statusu dəyişə bilər; həmin dövrün benchmark keşini sil"""
+    _queue_benchmark_invalidation(instance.dovr_id)
+
+
+@receiver(post_save, sender=QiymetlendirmeDovru)
+def invalidate_benchmarks_on_cycle(sender, instance, created, **kwargs):
+    """Dövr bağlananda və ya açılanda benchmark mənbəyi dəyişir"""
+    if not created:
+        _queue_benchmark_invalidation(instance.pk)
+
+
+@receiver(pre_save, sender=Ishchi)
+def track_employee_unit_change(sender, instance, update_fields=None, **kwargs):
+    """İşçinin vahidinin və ya aktivliyinin dəyişib-dəyişmədiyini yadda saxla"""
+    previous = None
+    # Məs. girişdə last_login yazılanda əlavə sorğu edilmir
+    if instance.pk and (update_fields is None or {'organization_unit', 'is_active'} & set(update_fields)):
+        previous = sender.objects.filter(pk=instance.pk).values_list('organization_unit_id', 'is_active').first()
+    instance._vahid_deyisdi = previous is not None and previous != (instance.organization_unit_id, instance.is_active)
+
+
+def _invalidate_live_benchmarks(keys):
+    # Snapshot-dan oxunan bağlı dövrlər işçinin cari vahidindən asılı deyil
+    invalidate_cycle_benchmarks(include_snapshotted=False)
+
+
+@receiver(post_save, sender=Ishchi)
+def invalidate_score_rollup_on_employee(sender, instance, created, **kwargs):
+    """İşçinin vahidi və ya aktivliyi dəyişdikdə toplamaların keşini sil"""
+    if created:
+        # Yeni işçinin cavabı yoxdur, yalnız aktiv işçi sayı dəyişə bilər
+        if instance.is_active and instance.organization_unit_id:
+            _queue_score_rollup_invalidation()
+    elif getattr(instance, '_vahid_deyisdi', False):
+        _queue_score_rollup_invalidation()
+        # Açıq dövrlərin şöbə ortalamaları işçinin cari vahidinə görə hesablanır
+        _defer_per_transaction('live_cycle_benchmarks', None, _invalidate_live_benchmarks)
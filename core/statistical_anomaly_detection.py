@@ -10,16 +10,46 @@ from django.db.models import Avg, StdDev, Count, Q
 from django.utils import timezone
 from datetime import timedelta, date
 from typing import Dict, List, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import logging
+import multiprocessing
 import statistics
+import threading
+
+from django.conf import settings
 
 from .models import (
-    Ishchi, Qiymetlendirme, Cavab, QiymetlendirmeDovru,
+    Ishchi, Qiymetlendirme, QiymetlendirmeDovru, QiymetlendirmeXalXulasesi,
     QuickFeedback, RiskFlag, EmployeeRiskAnalysis
 )
+from .anomaly_model_store import AnomalyModelStore
+from .active_cycle import get_active_cycle, get_active_cycle_id
 
 logger = logging.getLogger('audit')
 
+# Detektorlar üçün proses/thread hovuzları sorğular arasında təkrar istifadə edilir
+_detector_executors = {}
+_detector_executors_lock = threading.Lock()
+
+
+def _get_detector_executor(executor_class, workers: int):
+    """Verilmiş tip və ölçüdə paylaşılan hovuzu qaytarır, yoxdursa yaradır"""
+    key = (executor_class, workers)
+    with _detector_executors_lock:
+        executor = _detector_executors.get(key)
+        if executor is None:
+            executor = _detector_executors[key] = executor_class(max_workers=workers)
+        return executor
+
+
+def _discard_detector_executor(executor_class, workers: int):
+    """Sınmış hovuzu siyahıdan çıxarır ki, növbəti çağırış yenisini yaratsın"""
+    with _detector_executors_lock:
+        executor = _detector_executors.pop((executor_class, workers), None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
 
 class StatisticalAnomalyDetector:
     """
@@ -28,22 +58,102 @@ class StatisticalAnomalyDetector:
     işçilərin davranışında anomaliyaları aşkarlayır.
     """
     
-    def __init__(self):
+    PERFORMANCE_FEATURES = ['avg_score', 'std_score', 'evaluation_count', 'score_variance']
+    BEHAVIORAL_FEATURES = ['sent_feedback', 'received_feedback', 'days_since_login', 'negative_feedback_ratio']
+    BEHAVIORAL_CONTAMINATION = 0.15
+    
+    def __init__(self, use_model_store: bool = True, n_jobs: int = None):
         self.contamination = 0.1  # Anomaliy nisbəti (10%)
         self.std_threshold = 2.5  # Standard deviation threshold
         self.min_data_points = 5  # Minimum məlumat nöqtəsi
-        
-    def detect_performance_anomalies(self, cycle: QiymetlendirmeDovru = None) -> Dict:
+        self.use_model_store = use_model_store  # Saxlanılmış IsolationForest modellərindən istifadə
+        self.model_store = AnomalyModelStore()
+        # Paralel işləyən detektor sayı; 1 olduqda ardıcıl icra edilir
+        n_jobs = int(n_jobs or getattr(settings, 'ANOMALY_DETECTION_WORKERS', 1))
+        self.n_jobs = multiprocessing.cpu_count() if n_jobs < 0 else max(1, n_jobs)
+        
+    def detect_performance_anomalies(self, cycle: QiymetlendirmeDovru = None, bulk: bool = True,
+                                     columnar: bool = False) -> Dict:
         """
-        Performans anomaliyalarını aşkarlayır
+        Performans anomaliyalarını aşkarlayır.
+        bulk=True olduqda bütün məlumatlar bir qruplaşdırılmış sorğu ilə yüklənir,
+        columnar=True olduqda metod nəticələri kompakt sütun formasında qaytarılır.
         """
         if not cycle:
-            cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+            cycle = get_active_cycle()
         
         if not cycle:
             return {"error": "Aktiv dövr tapılmadı"}
         
         # Bütün işçilərin performans məlumatlarını toplayır
+        if bulk:
+            performance_data = self._collect_performance_data_bulk(cycle)
+        else:
+            performance_data = self._collect_performance_data(cycle)
+        
+        if len(performance_data) < self.min_data_points:
+            return {"error": "Kifayətsiz məlumat"}
+        
+        # DataFrame yaradır
+        df = pd.DataFrame(performance_data)
+        
+        # Anomaliy aşkarlama metodları
+        anomalies = self._run_detectors({
+            'statistical_outliers': (self._detect_statistical_outliers, (df, columnar)),
+            'isolation_forest': (self._detect_isolation_forest_anomalies, (df, cycle.id)),
+            'z_score_anomalies': (self._detect_z_score_anomalies, (df, columnar)),
+            'performance_clusters': (self._detect_performance_clusters, (df,))
+        }, estimator_detectors=('isolation_forest', 'performance_clusters'))
+        
+        # Kombine edilmiş anomaliy nəticəsi
+        combined_anomalies = self._combine_anomaly_results(anomalies, df)
+        
+        return {
+            'cycle': cycle.ad,
+            'total_employees': len(performance_data),
+            'anomalies_detected': len(combined_anomalies),
+            'detection_methods': anomalies,
+            'combined_results': combined_anomalies,
+            'analysis_date': timezone.now()
+        }
+    
+    def _run_detectors(self, detectors: Dict[str, Tuple], estimator_detectors: Tuple[str, ...] = ()) -> Dict:
+        """
+        Bir-birindən asılı olmayan detektorları icra edir.
+        n_jobs > 1 olduqda onlar paylaşılan proses hovuzunda paralel işləyir; Celery worker kimi
+        daemon proseslərdə uşaq proses yaratmaq mümkün olmadığından thread hovuzu seçilir.
+        estimator_detectors adlarındakı detektorlara sklearn üçün n_jobs arqument kimi ötürülür.
+        """
+        def run_sequential():
+            return {
+                name: func(*args, **({'n_jobs': self.n_jobs} if name in estimator_detectors else {}))
+                for name, (func, args) in detectors.items()
+            }
+        
+        if self.n_jobs <= 1 or len(detectors) < 2:
+            return run_sequential()
+        
+        workers = min(self.n_jobs, len(detectors))
+        executor_class = (
+            ThreadPoolExecutor if multiprocessing.current_process().daemon else ProcessPoolExecutor
+        )
+        # Nüvələr paralel detektorlar arasında bölünür
+        estimator_kwargs = {'n_jobs': max(1, self.n_jobs // workers)}
+        
+        try:
+            executor = _get_detector_executor(executor_class, workers)
+            futures = {
+                name: executor.submit(func, *args, **(estimator_kwargs if name in estimator_detectors else {}))
+                for name, (func, args) in detectors.items()
+            }
+            return {name: future.result() for name, future in futures.items()}
+        except (BrokenProcessPool, OSError) as e:
+            logger.error(f"Paralel anomaliya aşkarlama uğursuz oldu, ardıcıl icraya keçilir: {e}")
+            _discard_detector_executor(executor_class, workers)
+            return run_sequential()
+    
+    def _collect_performance_data(self, cycle: QiymetlendirmeDovru) -> List[Dict]:
+        """Hər işçi üçün ayrıca sorğu ilə performans məlumatlarını toplayır"""
         performance_data = []
         employees = Ishchi.objects.filter(is_active=True, rol='ISHCHI')
         
@@ -51,7 +161,7 @@ class StatisticalAnomalyDetector:
             evaluations = Qiymetlendirme.objects.filter(
                 qiymetlendirilen=employee,
                 dovr=cycle,
-                status='COMPLETED'
+                status=Qiymetlendirme.Status.TAMAMLANDI
             )
             
             if evaluations.exists():
@@ -76,39 +186,102 @@ class StatisticalAnomalyDetector:
                         'score_variance': np.var(scores) if len(scores) > 1 else 0
                     })
         
-        if len(performance_data) < self.min_data_points:
-            return {"error": "Kifayətsiz məlumat"}
+        return performance_data
+    
+    def _collect_performance_data_bulk(self, cycle: QiymetlendirmeDovru,
+                                       employee_ids: List[int] = None) -> List[Dict]:
+        """
+        Dövr üzrə bütün (işçi, qiymətləndirmə, ortalama bal) cütlərini bir sorğu ilə
+        yükləyir və işçi statistikalarını NumPy qrup reduksiyaları ilə hesablayır.
+        """
+        # Qiymətləndirmə ortalamaları xal xülasəsinin ümumi sətirlərindən oxunur
+        summaries = QiymetlendirmeXalXulasesi.objects.filter(
+            qiymetlendirme__dovr=cycle,
+            qiymetlendirme__status=Qiymetlendirme.Status.TAMAMLANDI,
+            qiymetlendirme__qiymetlendirilen__is_active=True,
+            qiymetlendirme__qiymetlendirilen__rol='ISHCHI',
+            kateqoriya__isnull=True,
+            cavab_sayi__gt=0,
+            xal_cemi__gt=0
+        )
+        if employee_ids is not None:
+            summaries = summaries.filter(qiymetlendirme__qiymetlendirilen_id__in=employee_ids)
         
-        # DataFrame yaradır
-        df = pd.DataFrame(performance_data)
+        rows = summaries.values_list('qiymetlendirme__qiymetlendirilen_id', 'xal_cemi', 'cavab_sayi')
         
-        # Anomaliy aşkarlama metodları
-        anomalies = {
-            'statistical_outliers': self._detect_statistical_outliers(df),
-            'isolation_forest': self._detect_isolation_forest_anomalies(df),
-            'z_score_anomalies': self._detect_z_score_anomalies(df),
-            'performance_clusters': self._detect_performance_clusters(df)
-        }
+        data = np.array(list(rows), dtype=float).reshape(-1, 3)
+        if not len(data):
+            return []
         
-        # Kombine edilmiş anomaliy nəticəsi
-        combined_anomalies = self._combine_anomaly_results(anomalies, df)
+        employee_ids, inverse = np.unique(data[:, 0].astype(np.int64), return_inverse=True)
+        scores = data[:, 1] / data[:, 2]
         
-        return {
-            'cycle': cycle.ad,
-            'total_employees': len(performance_data),
-            'anomalies_detected': len(combined_anomalies),
-            'detection_methods': anomalies,
-            'combined_results': combined_anomalies,
-            'analysis_date': timezone.now()
+        counts = np.bincount(inverse)
+        means = np.bincount(inverse, weights=scores) / counts
+        variances = np.bincount(inverse, weights=scores ** 2) / counts - means ** 2
+        variances = np.where(counts > 1, np.clip(variances, 0, None), 0.0)
+        stds = np.sqrt(variances)
+        
+        names = {
+            emp_id: f"{first_name} {last_name}".strip()
+            for emp_id, first_name, last_name in Ishchi.objects.filter(
+                id__in=employee_ids.tolist()
+            ).values_list('id', 'first_name', 'last_name')
         }
+        
+        return [
+            {
+                'employee_id': int(emp_id),
+                'employee_name': names.get(int(emp_id), ''),
+                'avg_score': float(mean),
+                'std_score': float(std),
+                'evaluation_count': int(count),
+                'score_variance': float(variance)
+            }
+            for emp_id, mean, std, count, variance in zip(
+                employee_ids, means, stds, counts, variances
+            )
+        ]
     
-    def detect_behavioral_anomalies(self, days_back: int = 30) -> Dict:
+    def detect_behavioral_anomalies(self, days_back: int = 30, bulk: bool = True,
+                                    columnar: bool = False) -> Dict:
         """
         Davranış anomaliyalarını aşkarlayır (feedback patterns, login frequency, etc.)
+        bulk=True olduqda xüsusiyyət matrisi sabit sayda sorğu ilə qurulur.
         """
         end_date = timezone.now()
         start_date = end_date - timedelta(days=days_back)
         
+        if bulk:
+            behavioral_data = self._collect_behavioral_data_bulk(start_date, end_date)
+        else:
+            behavioral_data = self._collect_behavioral_data(start_date, end_date)
+        
+        df = pd.DataFrame(behavioral_data)
+        
+        if len(df) < self.min_data_points:
+            return {"error": "Kifayətsiz davranış məlumatı"}
+        
+        # Davranış anomaliyalarını aşkarlayır
+        behavioral_anomalies = self._run_detectors({
+            'login_anomalies': (self._detect_login_anomalies, (df, columnar)),
+            'feedback_anomalies': (self._detect_feedback_anomalies, (df, columnar)),
+            'isolation_behavioral': (self._detect_behavioral_isolation_forest, (df, self._active_cycle_id()))
+        }, estimator_detectors=('isolation_behavioral',))
+        
+        combined_behavioral = self._combine_behavioral_results(behavioral_anomalies, df)
+        
+        return {
+            'period': f"Son {days_back} gün",
+            'total_employees': len(df),
+            'behavioral_anomalies': len(combined_behavioral),
+            'detection_methods': behavioral_anomalies,
+            'combined_results': combined_behavioral,
+            'analysis_date': timezone.now()
+        }
+    
+    def _collect_behavioral_data(self, start_date, end_date) -> List[Dict]:
+        """Hər işçi üçün ayrıca sorğularla davranış məlumatlarını toplayır"""
         behavioral_data = []
         employees = Ishchi.objects.filter(is_active=True, rol='ISHCHI')
         
@@ -148,29 +321,75 @@ class StatisticalAnomalyDetector:
                 'feedback_activity_score': sent_feedback + received_feedback
             })
         
-        if len(behavioral_data) < self.min_data_points:
-            return {"error": "Kifayətsiz davranış məlumatı"}
+        return behavioral_data
+    
+    def _collect_behavioral_data_bulk(self, start_date, end_date) -> Dict[str, np.ndarray]:
+        """
+        Davranış xüsusiyyətlərini işçi sayından asılı olmayaraq üç sorğu ilə
+        NumPy sütunları şəklində hazırlayır.
+        """
+        employees = list(
+            Ishchi.objects.filter(is_active=True, rol='ISHCHI')
+            .order_by('id')
+            .values_list('id', 'first_name', 'last_name', 'last_login')
+        )
+        if not employees:
+            return {}
         
-        df = pd.DataFrame(behavioral_data)
+        employee_ids = np.array([row[0] for row in employees], dtype=np.int64)
         
-        # Davranış anomaliyalarını aşkarlayır
-        behavioral_anomalies = {
-            'login_anomalies': self._detect_login_anomalies(df),
-            'feedback_anomalies': self._detect_feedback_anomalies(df),
-            'isolation_behavioral': self._detect_behavioral_isolation_forest(df)
-        }
+        period_feedback = QuickFeedback.objects.filter(created_at__range=[start_date, end_date])
+        sent_rows = (
+            period_feedback.values('from_user')
+            .annotate(sent=Count('id'))
+            .values_list('from_user', 'sent')
+        )
+        received_rows = (
+            period_feedback.values('to_user')
+            .annotate(
+                received=Count('id'),
+                negative=Count('id', filter=Q(rating__lt=3))
+            )
+            .values_list('to_user', 'received', 'negative')
+        )
         
-        combined_behavioral = self._combine_behavioral_results(behavioral_anomalies, df)
+        sent_feedback = self._align_counts(employee_ids, sent_rows, 1)[0]
+        received_feedback, negative_feedback = self._align_counts(employee_ids, received_rows, 2)
+        
+        today = timezone.now().date()
+        last_login_days = np.array(
+            [row[3].date() if row[3] else today for row in employees],
+            dtype='datetime64[D]'
+        )
+        days_since_login = (np.datetime64(today, 'D') - last_login_days).astype(np.int64)
         
         return {
-            'period': f"Son {days_back} gün",
-            'total_employees': len(behavioral_data),
-            'behavioral_anomalies': len(combined_behavioral),
-            'detection_methods': behavioral_anomalies,
-            'combined_results': combined_behavioral,
-            'analysis_date': timezone.now()
+            'employee_id': employee_ids,
+            'employee_name': np.array(
+                [f"{row[1]} {row[2]}".strip() for row in employees], dtype=object
+            ),
+            'sent_feedback': sent_feedback,
+            'received_feedback': received_feedback,
+            'days_since_login': days_since_login,
+            'negative_feedback_ratio': negative_feedback / np.maximum(received_feedback, 1),
+            'feedback_activity_score': sent_feedback + received_feedback
         }
     
+    @staticmethod
+    def _align_counts(employee_ids: np.ndarray, rows, width: int) -> List[np.ndarray]:
+        """Qruplaşdırılmış say nəticələrini sıralanmış işçi ID massivinə uyğunlaşdırır"""
+        columns = [np.zeros(len(employee_ids), dtype=np.int64) for _ in range(width)]
+        data = np.array([row for row in rows if row[0] is not None], dtype=np.int64).reshape(-1, width + 1)
+        if not len(data):
+            return columns
+        
+        positions = np.searchsorted(employee_ids, data[:, 0])
+        positions = np.clip(positions, 0, len(employee_ids) - 1)
+        matched = employee_ids[positions] == data[:, 0]
+        for i, column in enumerate(columns):
+            column[positions[matched]] = data[matched, i + 1]
+        return columns
+    
     def detect_temporal_anomalies(self, employee: Ishchi, months_back: int = 6) -> Dict:
         """
         Müəyyən işçinin zaman ərzində performans dəyişikliklərini analiz edir
@@ -190,7 +409,7 @@ class StatisticalAnomalyDetector:
             evaluations = Qiymetlendirme.objects.filter(
                 qiymetlendirilen=employee,
                 dovr=cycle,
-                status='COMPLETED'
+                status=Qiymetlendirme.Status.TAMAMLANDI
             )
             if evaluations.exists():
                 scores = []
@@ -229,9 +448,9 @@ class StatisticalAnomalyDetector:
             'temporal_data': temporal_data
         }
     
-    def _detect_statistical_outliers(self, df: pd.DataFrame) -> List[Dict]:
+    def _detect_statistical_outliers(self, df: pd.DataFrame, columnar: bool = False):
         """Z-score və IQR metodları ilə outlier aşkarlama"""
-        outliers = []
+        frames = []
         
         for column in ['avg_score', 'std_score', 'score_variance']:
             if column in df.columns:
@@ -243,45 +462,35 @@ class StatisticalAnomalyDetector:
                 lower_bound = Q1 - 1.5 * IQR
                 upper_bound = Q3 + 1.5 * IQR
                 
-                column_outliers = df[
-                    (df[column] < lower_bound) | (df[column] > upper_bound)
-                ]
+                mask = (df[column] < lower_bound) | (df[column] > upper_bound)
+                if not mask.any():
+                    continue
                 
-                for _, row in column_outliers.iterrows():
-                    outliers.append({
-                        'employee_id': row['employee_id'],
-                        'employee_name': row['employee_name'],
-                        'anomaly_type': f'{column}_outlier',
-                        'value': row[column],
-                        'method': 'IQR',
-                        'bounds': {'lower': lower_bound, 'upper': upper_bound}
-                    })
-        
-        return outliers
+                column_outliers = df.loc[mask, ['employee_id', 'employee_name', column]].rename(
+                    columns={column: 'value'}
+                )
+                column_outliers.insert(2, 'anomaly_type', f'{column}_outlier')
+                column_outliers['method'] = 'IQR'
+                column_outliers['bounds'] = [
+                    {'lower': lower_bound, 'upper': upper_bound}
+                ] * len(column_outliers)
+                frames.append(column_outliers)
+        
+        return self._format_anomalies(frames, columnar)
     
-    def _detect_isolation_forest_anomalies(self, df: pd.DataFrame) -> List[Dict]:
+    def _detect_isolation_forest_anomalies(self, df: pd.DataFrame, cycle_id: int = None,
+                                           n_jobs: int = None) -> List[Dict]:
         """Isolation Forest algoritmi ilə anomaliy aşkarlama"""
-        features = ['avg_score', 'std_score', 'evaluation_count', 'score_variance']
-        available_features = [f for f in features if f in df.columns]
+        available_features = [f for f in self.PERFORMANCE_FEATURES if f in df.columns]
         
         if len(available_features) < 2:
             return []
         
         X = df[available_features].fillna(0)
-        
-        # Standardize edilmiş məlumatlar
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        # Isolation Forest
-        iso_forest = IsolationForest(
-            contamination=self.contamination,
-            random_state=42
+        anomaly_labels, anomaly_scores = self._isolation_forest_scores(
+            'performance', cycle_id, X, available_features, self.contamination, n_jobs=n_jobs
         )
         
-        anomaly_labels = iso_forest.fit_predict(X_scaled)
-        anomaly_scores = iso_forest.decision_function(X_scaled)
-        
         anomalies = []
         for i, (label, score) in enumerate(zip(anomaly_labels, anomaly_scores)):
             if label == -1:  # Anomaliy
@@ -296,29 +505,54 @@ class StatisticalAnomalyDetector:
         
         return anomalies
     
-    def _detect_z_score_anomalies(self, df: pd.DataFrame) -> List[Dict]:
+    def _isolation_forest_scores(self, kind: str, cycle_id: Optional[int], X: pd.DataFrame,
+                                 features: List[str], contamination: float, n_jobs: int = None):
+        """
+        Saxlanılmış model varsa onunla qiymətləndirir, yoxdursa modeli
+        sorğu daxilində öyrədir (əvvəlki davranış).
+        """
+        if self.use_model_store and cycle_id:
+            bundle = self.model_store.load(kind, cycle_id, features, contamination)
+            if bundle is not None:
+                return self.model_store.score(bundle, X.to_numpy(dtype=float))
+        
+        # Standardize edilmiş məlumatlar
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        
+        # Isolation Forest
+        iso_forest = IsolationForest(
+            contamination=contamination,
+            random_state=42,
+            n_jobs=n_jobs or self.n_jobs
+        )
+        
+        anomaly_labels = iso_forest.fit_predict(X_scaled)
+        anomaly_scores = iso_forest.decision_function(X_scaled)
+        return anomaly_labels, anomaly_scores
+    
+    def _detect_z_score_anomalies(self, df: pd.DataFrame, columnar: bool = False):
         """Z-score əsaslı anomaliy aşkarlama"""
-        anomalies = []
+        frames = []
         
         for column in ['avg_score', 'std_score']:
             if column in df.columns:
                 z_scores = np.abs(stats.zscore(df[column].fillna(df[column].mean())))
+                mask = np.asarray(z_scores > self.std_threshold)
+                if not mask.any():
+                    continue
                 
-                for i, z_score in enumerate(z_scores):
-                    if z_score > self.std_threshold:
-                        anomalies.append({
-                            'employee_id': df.iloc[i]['employee_id'],
-                            'employee_name': df.iloc[i]['employee_name'],
-                            'anomaly_type': f'{column}_zscore',
-                            'z_score': float(z_score),
-                            'value': df.iloc[i][column],
-                            'method': 'Z-Score',
-                            'threshold': self.std_threshold
-                        })
-        
-        return anomalies
+                column_anomalies = df.loc[mask, ['employee_id', 'employee_name']].copy()
+                column_anomalies['anomaly_type'] = f'{column}_zscore'
+                column_anomalies['z_score'] = np.asarray(z_scores, dtype=float)[mask]
+                column_anomalies['value'] = df.loc[mask, column]
+                column_anomalies['method'] = 'Z-Score'
+                column_anomalies['threshold'] = self.std_threshold
+                frames.append(column_anomalies)
+        
+        return self._format_anomalies(frames, columnar)
     
-    def _detect_performance_clusters(self, df: pd.DataFrame) -> Dict:
+    def _detect_performance_clusters(self, df: pd.DataFrame, n_jobs: int = None) -> Dict:
         """DBSCAN klaster analizi"""
         features = ['avg_score', 'std_score', 'evaluation_count']
         available_features = [f for f in features if f in df.columns]
@@ -331,7 +565,7 @@ class StatisticalAnomalyDetector:
         X_scaled = scaler.fit_transform(X)
         
         # DBSCAN klaster analizi
-        dbscan = DBSCAN(eps=0.5, min_samples=3)
+        dbscan = DBSCAN(eps=0.5, min_samples=3, n_jobs=n_jobs or self.n_jobs)
         cluster_labels = dbscan.fit_predict(X_scaled)
         
         outliers = []
@@ -351,79 +585,100 @@ class StatisticalAnomalyDetector:
             'noise_points': list(cluster_labels).count(-1)
         }
     
-    def _detect_login_anomalies(self, df: pd.DataFrame) -> List[Dict]:
+    def _detect_login_anomalies(self, df: pd.DataFrame, columnar: bool = False):
         """Login davranışında anomaliyalar"""
-        anomalies = []
+        frames = []
         
         if 'days_since_login' in df.columns:
             mean_days = df['days_since_login'].mean()
             std_days = df['days_since_login'].std()
+            threshold = mean_days + 2 * std_days  # 2 sigma qaydası
             
-            for _, row in df.iterrows():
-                days = row['days_since_login']
-                if days > mean_days + 2 * std_days:  # 2 sigma qaydası
-                    anomalies.append({
-                        'employee_id': row['employee_id'],
-                        'employee_name': row['employee_name'],
-                        'anomaly_type': 'long_absence',
-                        'days_since_login': days,
-                        'method': 'Statistical Threshold',
-                        'threshold': mean_days + 2 * std_days
-                    })
-        
-        return anomalies
+            mask = df['days_since_login'] > threshold
+            absences = df.loc[mask, ['employee_id', 'employee_name', 'days_since_login']]
+            absences.insert(2, 'anomaly_type', 'long_absence')
+            absences['method'] = 'Statistical Threshold'
+            absences['threshold'] = threshold
+            frames.append(absences)
+        
+        return self._format_anomalies(frames, columnar)
     
-    def _detect_feedback_anomalies(self, df: pd.DataFrame) -> List[Dict]:
+    def _detect_feedback_anomalies(self, df: pd.DataFrame, columnar: bool = False):
         """Feedback davranışında anomaliyalar"""
-        anomalies = []
+        frames = []
         
         # Çox az feedback
         if 'feedback_activity_score' in df.columns:
             low_activity_threshold = df['feedback_activity_score'].quantile(0.1)
             
-            low_activity = df[df['feedback_activity_score'] <= low_activity_threshold]
-            for _, row in low_activity.iterrows():
-                anomalies.append({
-                    'employee_id': row['employee_id'],
-                    'employee_name': row['employee_name'],
-                    'anomaly_type': 'low_feedback_activity',
-                    'activity_score': row['feedback_activity_score'],
-                    'method': 'Percentile Analysis',
-                    'threshold': low_activity_threshold
-                })
+            mask = df['feedback_activity_score'] <= low_activity_threshold
+            low_activity = df.loc[mask, ['employee_id', 'employee_name', 'feedback_activity_score']].rename(
+                columns={'feedback_activity_score': 'activity_score'}
+            )
+            low_activity.insert(2, 'anomaly_type', 'low_feedback_activity')
+            low_activity['method'] = 'Percentile Analysis'
+            low_activity['threshold'] = low_activity_threshold
+            frames.append(low_activity)
         
         # Yüksək neqativ feedback
         if 'negative_feedback_ratio' in df.columns:
             high_negative_threshold = 0.6  # 60%-dən çox neqativ
             
-            high_negative = df[df['negative_feedback_ratio'] > high_negative_threshold]
-            for _, row in high_negative.iterrows():
-                anomalies.append({
-                    'employee_id': row['employee_id'],
-                    'employee_name': row['employee_name'],
-                    'anomaly_type': 'high_negative_feedback',
-                    'negative_ratio': row['negative_feedback_ratio'],
-                    'method': 'Threshold Analysis',
-                    'threshold': high_negative_threshold
-                })
+            mask = df['negative_feedback_ratio'] > high_negative_threshold
+            high_negative = df.loc[mask, ['employee_id', 'employee_name', 'negative_feedback_ratio']].rename(
+                columns={'negative_feedback_ratio': 'negative_ratio'}
+            )
+            high_negative.insert(2, 'anomaly_type', 'high_negative_feedback')
+            high_negative['method'] = 'Threshold Analysis'
+            high_negative['threshold'] = high_negative_threshold
+            frames.append(high_negative)
         
+        return self._format_anomalies(frames, columnar)
+    
+    @staticmethod
+    def _format_anomalies(frames: List[pd.DataFrame], columnar: bool = False):
+        """
+        Detektor nəticələrini qaytarır: standart olaraq dict siyahısı,
+        columnar=True olduqda isə sütun adı -> dəyərlər siyahısı şəklində kompakt forma.
+        Sütun dəstləri fərqli olan çərçivələrdə çatışmayan dəyərlər None olur.
+        """
+        frames = [frame for frame in frames if len(frame)]
+        
+        if columnar:
+            if not frames:
+                return {'employee_id': []}
+            combined = pd.concat(frames, ignore_index=True, sort=False)
+            combined = combined.astype(object).where(combined.notna(), None)
+            return {column: combined[column].tolist() for column in combined.columns}
+        
+        records = []
+        for frame in frames:
+            records.extend(frame.to_dict('records'))
+        return records
+    
+    @staticmethod
+    def _as_records(anomalies) -> List[Dict]:
+        """Kompakt sütun formasını dict siyahısına çevirir"""
+        if isinstance(anomalies, dict):
+            columns = list(anomalies.keys())
+            return [
+                {column: value for column, value in zip(columns, values) if value is not None}
+                for values in zip(*anomalies.values())
+            ]
         return anomalies
     
-    def _detect_behavioral_isolation_forest(self, df: pd.DataFrame) -> List[Dict]:
+    def _detect_behavioral_isolation_forest(self, df: pd.DataFrame, cycle_id: int = None,
+                                            n_jobs: int = None) -> List[Dict]:
         """Davranış məlumatları üçün Isolation Forest"""
-        features = ['sent_feedback', 'received_feedback', 'days_since_login', 'negative_feedback_ratio']
-        available_features = [f for f in features if f in df.columns]
+        available_features = [f for f in self.BEHAVIORAL_FEATURES if f in df.columns]
         
         if len(available_features) < 2:
             return []
         
         X = df[available_features].fillna(0)
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X)
-        
-        iso_forest = IsolationForest(contamination=0.15, random_state=42)
-        anomaly_labels = iso_forest.fit_predict(X_scaled)
-        anomaly_scores = iso_forest.decision_function(X_scaled)
+        anomaly_labels, anomaly_scores = self._isolation_forest_scores(
+            'behavioral', cycle_id, X, available_features, self.BEHAVIORAL_CONTAMINATION, n_jobs=n_jobs
+        )
         
         anomalies = []
         for i, (label, score) in enumerate(zip(anomaly_labels, anomaly_scores)):
@@ -521,7 +776,7 @@ class StatisticalAnomalyDetector:
             if method == 'performance_clusters':
                 method_anomalies = method_anomalies.get('outliers', [])
             
-            for anomaly in method_anomalies:
+            for anomaly in self._as_records(method_anomalies):
                 emp_id = anomaly['employee_id']
                 if emp_id not in employee_anomalies:
                     employee_anomalies[emp_id] = {
@@ -555,7 +810,7 @@ class StatisticalAnomalyDetector:
         employee_anomalies = {}
         
         for method, method_anomalies in anomalies.items():
-            for anomaly in method_anomalies:
+            for anomaly in self._as_records(method_anomalies):
                 emp_id = anomaly['employee_id']
                 if emp_id not in employee_anomalies:
                     employee_anomalies[emp_id] = {
@@ -584,6 +839,79 @@ class StatisticalAnomalyDetector:
         
         return list(employee_anomalies.values())
     
+    def _active_cycle_id(self) -> Optional[int]:
+        """Davranış modelinin versiyalanması üçün aktiv dövrün ID-si"""
+        if not self.use_model_store:
+            return None
+        return get_active_cycle_id()
+    
+    def fit_models(self, cycle: QiymetlendirmeDovru = None, days_back: int = 30) -> Dict:
+        """
+        Dövr üçün performans və davranış IsolationForest modellərini öyrədib
+        model anbarına yazır. Celery tapşırığından çağırılır.
+        """
+        if not cycle:
+            cycle = get_active_cycle()
+        
+        if not cycle:
+            return {"error": "Aktiv dövr tapılmadı"}
+        
+        result = {'cycle_id': cycle.id, 'models': {}}
+        
+        performance_df = pd.DataFrame(self._collect_performance_data_bulk(cycle))
+        if len(performance_df) >= self.min_data_points:
+            bundle = self.model_store.fit(
+                'performance', cycle.id,
+                performance_df[self.PERFORMANCE_FEATURES].fillna(0).to_numpy(dtype=float),
+                self.PERFORMANCE_FEATURES, self.contamination, n_jobs=self.n_jobs
+            )
+            result['models']['performance'] = {'n_samples': bundle['n_samples'], 'schema': bundle['schema']}
+        
+        end_date = timezone.now()
+        behavioral_df = pd.DataFrame(
+            self._collect_behavioral_data_bulk(end_date - timedelta(days=days_back), end_date)
+        )
+        if len(behavioral_df) >= self.min_data_points:
+            bundle = self.model_store.fit(
+                'behavioral', cycle.id,
+                behavioral_df[self.BEHAVIORAL_FEATURES].fillna(0).to_numpy(dtype=float),
+                self.BEHAVIORAL_FEATURES, self.BEHAVIORAL_CONTAMINATION, n_jobs=self.n_jobs
+            )
+            result['models']['behavioral'] = {'n_samples': bundle['n_samples'], 'schema': bundle['schema']}
+        
+        return result
+    
+    def score_employee_performance(self, employee: Ishchi, cycle: QiymetlendirmeDovru = None) -> Dict:
+        """Tək işçinin performans xüsusiyyətlərini saxlanılmış modellə qiymətləndirir"""
+        if not cycle:
+            cycle = get_active_cycle()
+        
+        if not cycle:
+            return {"error": "Aktiv dövr tapılmadı"}
+        
+        bundle = self.model_store.load('performance', cycle.id, self.PERFORMANCE_FEATURES, self.contamination)
+        if bundle is None:
+            return {"error": "Bu dövr üçün öyrədilmiş model tapılmadı"}
+        
+        performance_data = self._collect_performance_data_bulk(cycle, employee_ids=[employee.id])
+        if not performance_data:
+            return {"error": "İşçi üçün tamamlanmış qiymətləndirmə tapılmadı"}
+        
+        features = performance_data[0]
+        X = np.array([[features[f] for f in self.PERFORMANCE_FEATURES]], dtype=float)
+        labels, scores = self.model_store.score(bundle, X)
+        
+        return {
+            'employee_id': employee.id,
+            'employee_name': employee.get_full_name(),
+            'cycle': cycle.ad,
+            'features': {f: features[f] for f in self.PERFORMANCE_FEATURES},
+            'anomaly_score': float(scores[0]),
+            'is_anomaly': bool(labels[0] == -1),
+            'model_fitted_at': bundle['fitted_at'],
+            'model_schema': bundle['schema']
+        }
+    
     def generate_anomaly_report(self, cycle: QiymetlendirmeDovru = None) -> Dict:
         """Tam anomaliy hesabatı yaradır"""
         performance_anomalies = self.detect_performance_anomalies(cycle)
@@ -595,7 +923,7 @@ class StatisticalAnomalyDetector:
                 if anomaly['severity'] in ['HIGH', 'CRITICAL']:
                     try:
                         employee = Ishchi.objects.get(id=anomaly['employee_id'])
-                        cycle_obj = cycle or QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+                        cycle_obj = cycle or get_active_cycle()
                         
                         RiskFlag.objects.get_or_create(
                             employee=employee,
@@ -2,17 +2,18 @@
 
 import numpy as np
 import pandas as pd
-from django.db.models import Avg, Count, Q, Sum, StdDev
+from django.db.models import Count, Q, Sum, StdDev
 from django.utils import timezone
 from datetime import timedelta, date
 from typing import Dict, List, Tuple, Optional
 import logging
 
 from .models import (
-    Ishchi, Qiymetlendirme, Cavab, QiymetlendirmeDovru,
+    Ishchi, Qiymetlendirme, QiymetlendirmeDovru, QiymetlendirmeXalXulasesi,
     OrganizationUnit, InkishafPlani, RiskFlag, EmployeeRiskAnalysis,
-    PsychologicalRiskResponse
+    PsychologicalRiskResponse, QuickFeedback
 )
+from .active_cycle import get_active_cycle
 
 logger = logging.getLogger('audit')
 
@@ -42,32 +43,57 @@ class StrategicHRPlanner:
             )
         
         employees = employees_query
-        total_count = employees.count()
         
-        if total_count == 0:
-            return {"error": "İşçi tapılmadı"}
-        
-        # Yaş demografiyası
-        current_year = timezone.now().year
-        age_distribution = {}
+        # Yaş, vəzifə səviyyəsi və təcrübə histoqramları bir şərti aqreqasiya sorğusu ilə
+        now = timezone.now()
+        current_year = now.year
         age_ranges = [
             (20, 30, "20-30"),
             (31, 40, "31-40"),
             (41, 50, "41-50"),
             (51, 65, "51-65")
         ]
+        experience_ranges = [
+            (0, 1, "0-1 il"),
+            (1, 3, "1-3 il"),
+            (3, 5, "3-5 il"),
+            (5, 10, "5-10 il"),
+            (10, 100, "10+ il")
+        ]
+        position_levels = list(Ishchi.VezifeSeviyyesi.values)
         
-        for min_age, max_age, label in age_ranges:
-            count = employees.filter(
+        aggregates = {'total': Count('id')}
+        for i, (min_age, max_age, _) in enumerate(age_ranges):
+            aggregates[f'age_{i}'] = Count('id', filter=Q(
                 dogum_tarixi__year__lte=current_year - min_age,
                 dogum_tarixi__year__gte=current_year - max_age
-            ).count()
-            
-            age_distribution[label] = {
-                'count': count,
-                'percentage': round((count / total_count) * 100, 1)
+            ))
+        for i, level in enumerate(position_levels):
+            aggregates[f'position_{i}'] = Count('id', filter=Q(vezife_seviyyesi=level))
+        for i, (min_exp, max_exp, _) in enumerate(experience_ranges):
+            aggregates[f'experience_{i}'] = Count('id', filter=Q(
+                date_joined__gte=now - timedelta(days=max_exp*365),
+                date_joined__lte=now - timedelta(days=min_exp*365)
+            ))
+        
+        counts = employees.aggregate(**aggregates)
+        total_count = counts['total']
+        
+        if total_count == 0:
+            return {"error": "İşçi tapılmadı"}
+        
+        def distribution(prefix, labels):
+            return {
+                label: {
+                    'count': counts[f'{prefix}_{i}'],
+                    'percentage': round((counts[f'{prefix}_{i}'] / total_count) * 100, 1)
+                }
+                for i, label in enumerate(labels)
             }
         
+        # Yaş demografiyası
+        age_distribution = distribution('age', [label for _, _, label in age_ranges])
+        
         # Təşkilati vahid üzrə paylanma
         unit_distribution = employees.values(
             'organization_unit__name'
@@ -75,51 +101,15 @@ class StrategicHRPlanner:
             count=Count('id')
         ).order_by('-count')
         
-        # Vəzifə səviyyəsi paylanması
-        position_levels = {
-            'senior': ['Senior', 'Baş', 'Rəhbər', 'Direktor'],
-            'middle': ['Mütəxəssis', 'Aparıcı', 'Koordinator'],
-            'junior': ['Kiçik', 'Yardımçı', 'Stajçı']
-        }
-        
-        position_distribution = {}
-        for level, keywords in position_levels.items():
-            count = 0
-            for keyword in keywords:
-                count += employees.filter(vezife__icontains=keyword).count()
-            
-            position_distribution[level] = {
-                'count': count,
-                'percentage': round((count / total_count) * 100, 1)
-            }
+        # Vəzifə səviyyəsi paylanması (Ishchi.vezife_seviyyesi sütunu üzrə)
+        position_distribution = distribution('position', position_levels)
         
         # İş təcrübəsi (işə başlama tarixi əsasında)
-        experience_distribution = {}
-        experience_ranges = [
-            (0, 1, "0-1 il"),
-            (1, 3, "1-3 il"),
-            (3, 5, "3-5 il"),
-            (5, 10, "5-10 il"),
-            (10, 100, "10+ il")
-        ]
-        
-        for min_exp, max_exp, label in experience_ranges:
-            start_date = timezone.now() - timedelta(days=max_exp*365)
-            end_date = timezone.now() - timedelta(days=min_exp*365)
-            
-            count = employees.filter(
-                date_joined__gte=start_date,
-                date_joined__lte=end_date
-            ).count()
-            
-            experience_distribution[label] = {
-                'count': count,
-                'percentage': round((count / total_count) * 100, 1)
-            }
+        experience_distribution = distribution('experience', [label for _, _, label in experience_ranges])
         
         return {
             'total_employees': total_count,
-            'analysis_date': timezone.now(),
+            'analysis_date': now,
             'organization_unit': organization_unit.name if organization_unit else 'Bütün təşkilat',
             'demographics': {
                 'age_distribution': age_distribution,
@@ -137,61 +127,37 @@ class StrategicHRPlanner:
         Yüksək potensial işçiləri müəyyən edir (9-box grid)
         """
         if not cycle:
-            cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+            cycle = get_active_cycle()
         
         if not cycle:
             return {"error": "Aktiv dövr tapılmadı"}
         
         high_potential_employees = []
-        employees = Ishchi.objects.filter(is_active=True, rol='ISHCHI')
-        
-        for employee in employees:
-            # Performans xalı
-            evaluations = Qiymetlendirme.objects.filter(
-                qiymetlendirilen=employee,
-                dovr=cycle,
-                status='COMPLETED'
-            )
-            
-            if not evaluations.exists():
-                continue
-                
-            performance_scores = []
-            for evaluation in evaluations:
-                cavablar = evaluation.cavablar.all()
-                if cavablar:
-                    avg_score = cavablar.aggregate(avg=Avg('xal'))['avg']
-                    if avg_score:
-                        performance_scores.append(avg_score)
-            
-            if not performance_scores:
-                continue
-                
-            avg_performance = np.mean(performance_scores)
-            
-            # Potensial qiymətləndirməsi (inkişaf planları, feedback, risk analizi əsasında)
-            potential_score = self._calculate_potential_score(employee, cycle)
+        features = self._load_talent_features(cycle, Ishchi.objects.filter(is_active=True, rol='ISHCHI'))
+        features = features[features['performance'].notna()]
+        
+        if len(features):
+            # 9-box grid yerləşdirmə və saxlama riski bütün işçilər üçün massivlər üzərində
+            grid_positions = self._determine_9box_positions(
+                features['performance'].to_numpy(), features['potential'].to_numpy()
+            ).tolist()
+            retention_risks = features['retention_risk'].to_numpy()
+            is_high_potential = np.isin(grid_positions, ['high_potential', 'future_leader', 'star'])
+            succession_ready = np.isin(grid_positions, ['future_leader', 'star']) & (retention_risks < 3)
             
-            # 9-box grid yerləşdirmə
-            grid_position = self._determine_9box_position(avg_performance, potential_score)
-            
-            # Risk qiymətləndirməsi
-            retention_risk = self._assess_retention_risk(employee, cycle)
-            
-            employee_data = {
-                'employee_id': employee.id,
-                'employee_name': employee.get_full_name(),
-                'position': employee.vezife,
-                'unit': employee.organization_unit.name if employee.organization_unit else 'N/A',
-                'performance_score': round(avg_performance, 2),
-                'potential_score': round(potential_score, 2),
-                'grid_position': grid_position,
-                'retention_risk': retention_risk,
-                'is_high_potential': grid_position in ['high_potential', 'future_leader', 'star'],
-                'succession_ready': grid_position in ['future_leader', 'star'] and retention_risk < 3
-            }
-            
-            high_potential_employees.append(employee_data)
+            for i, row in enumerate(features.itertuples()):
+                high_potential_employees.append({
+                    'employee_id': int(row.Index),
+                    'employee_name': row.name,
+                    'position': row.position,
+                    'unit': row.unit,
+                    'performance_score': round(row.performance, 2),
+                    'potential_score': round(row.potential, 2),
+                    'grid_position': grid_positions[i],
+                    'retention_risk': float(retention_risks[i]),
+                    'is_high_potential': bool(is_high_potential[i]),
+                    'succession_ready': bool(succession_ready[i])
+                })
         
         # Potensial və performansa görə sırala
         high_potential_employees.sort(
@@ -225,6 +191,11 @@ class StrategicHRPlanner:
         # Açıq və ya kritik vəzifələri müəyyən et
         key_positions = self._identify_key_positions(organization_unit)
         
+        # Namizəd balları sorğu başına bir dəfə hesablanır və vahid üzrə indekslənir
+        candidate_index = self._build_succession_index(
+            get_active_cycle()
+        )
+        
         succession_plans = []
         
         for position_data in key_positions:
@@ -233,7 +204,9 @@ class StrategicHRPlanner:
             current_incumbent = position_data.get('current_incumbent')
             
             # Bu vəzifə üçün uyğun namizədləri tap
-            candidates = self._find_succession_candidates(position, unit)
+            candidates = self._find_succession_candidates(
+                position, position_data.get('unit_id'), candidate_index
+            )
             
             succession_plan = {
                 'position': position,
@@ -264,7 +237,7 @@ class StrategicHRPlanner:
         """
         Talent pipeline analizi
         """
-        cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        cycle = get_active_cycle()
         if not cycle:
             return {"error": "Aktiv dövr tapılmadı"}
         
@@ -278,45 +251,31 @@ class StrategicHRPlanner:
         }
         
         employees = Ishchi.objects.filter(is_active=True, rol='ISHCHI')
+        total_employees = employees.count()
+        features = self._load_talent_features(cycle, employees)
+        features = features[features['performance'].notna()]
         
-        for employee in employees:
-            performance_data = self._get_employee_performance(employee, cycle)
-            if not performance_data:
-                continue
-                
-            performance = performance_data['performance']
-            potential = self._calculate_potential_score(employee, cycle)
+        if len(features):
+            performance = features['performance'].to_numpy()
+            potential = features['potential'].to_numpy()
             
             # Kateqoriya təyin etmə
-            if performance >= 4.5 and potential >= 4.5:
-                talent_categories['stars'].append({
-                    'employee': employee,
-                    'performance': performance,
-                    'potential': potential
-                })
-            elif performance >= 4.0 and potential < 4.5:
-                talent_categories['high_performers'].append({
-                    'employee': employee,
-                    'performance': performance,
-                    'potential': potential
-                })
-            elif performance < 4.0 and potential >= 4.0:
-                talent_categories['high_potentials'].append({
-                    'employee': employee,
-                    'performance': performance,
-                    'potential': potential
-                })
-            elif performance >= 3.0 and potential >= 3.0:
-                talent_categories['solid_performers'].append({
-                    'employee': employee,
-                    'performance': performance,
-                    'potential': potential
-                })
-            else:
-                talent_categories['underperformers'].append({
-                    'employee': employee,
-                    'performance': performance,
-                    'potential': potential
+            categories = np.select(
+                [
+                    (performance >= 4.5) & (potential >= 4.5),
+                    (performance >= 4.0) & (potential < 4.5),
+                    (performance < 4.0) & (potential >= 4.0),
+                    (performance >= 3.0) & (potential >= 3.0),
+                ],
+                ['stars', 'high_performers', 'high_potentials', 'solid_performers'],
+                default='underperformers'
+            )
+            
+            for category, row in zip(categories.tolist(), features.itertuples()):
+                talent_categories[category].append({
+                    'employee': row,
+                    'performance': row.performance,
+                    'potential': row.potential
                 })
         
         # Hər kateqoriya üçün statistika
@@ -324,13 +283,13 @@ class StrategicHRPlanner:
         for category, employees_list in talent_categories.items():
             pipeline_summary[category] = {
                 'count': len(employees_list),
-                'percentage': round((len(employees_list) / employees.count()) * 100, 1),
+                'percentage': round((len(employees_list) / max(total_employees, 1)) * 100, 1),
                 'employees': [
                     {
-                        'id': emp['employee'].id,
-                        'name': emp['employee'].get_full_name(),
-                        'position': emp['employee'].vezife,
-                        'unit': emp['employee'].organization_unit.name if emp['employee'].organization_unit else 'N/A',
+                        'id': int(emp['employee'].Index),
+                        'name': emp['employee'].name,
+                        'position': emp['employee'].position,
+                        'unit': emp['employee'].unit,
                         'performance': round(emp['performance'], 2),
                         'potential': round(emp['potential'], 2)
                     } for emp in employees_list[:10]  # Top 10
@@ -342,7 +301,7 @@ class StrategicHRPlanner:
         
         return {
             'cycle': cycle.ad,
-            'total_employees': employees.count(),
+            'total_employees': total_employees,
             'pipeline_summary': pipeline_summary,
             'talent_flow': talent_flow,
             'recommendations': self._generate_talent_recommendations(pipeline_summary),
@@ -359,7 +318,7 @@ class StrategicHRPlanner:
         high_potential_analysis = self.identify_high_potential_employees()
         
         # Risk analizi
-        active_cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        active_cycle = get_active_cycle()
         risk_summary = self._analyze_organizational_risks(active_cycle)
         
         recommendations = {
@@ -405,7 +364,6 @@ class StrategicHRPlanner:
         potential_factors.append(development_score * 0.25)
         
         # Liderlik potensiali - feedback analizi (30%)
-        from .models import QuickFeedback
         positive_feedback = QuickFeedback.objects.filter(
             to_user=employee,
             rating__gte=4,
@@ -438,24 +396,174 @@ class StrategicHRPlanner:
         """
         9-box grid üzrə mövqe təyin edir
         """
-        if performance >= 4.5 and potential >= 4.5:
-            return 'star'
-        elif performance >= 4.0 and potential >= 4.5:
-            return 'future_leader'
-        elif performance >= 4.5 and potential >= 3.5:
-            return 'current_leader'
-        elif performance >= 4.0 and potential >= 3.5:
-            return 'high_potential'
-        elif performance >= 3.5 and potential >= 4.0:
-            return 'emerging_talent'
-        elif performance >= 3.5 and potential >= 3.0:
-            return 'solid_performer'
-        elif performance >= 3.0 and potential >= 3.5:
-            return 'developing'
-        elif performance >= 3.0 and potential >= 2.5:
-            return 'inconsistent'
-        else:
-            return 'underperformer'
+        return str(self._determine_9box_positions(np.array([performance]), np.array([potential]))[0])
+    
+    def _determine_9box_positions(self, performance: np.ndarray, potential: np.ndarray) -> np.ndarray:
+        """
+        9-box grid mövqelərini performans və potensial massivləri üzrə vektorlaşdırılmış təyin edir
+        """
+        return np.select(
+            [
+                (performance >= 4.5) & (potential >= 4.5),
+                (performance >= 4.0) & (potential >= 4.5),
+                (performance >= 4.5) & (potential >= 3.5),
+                (performance >= 4.0) & (potential >= 3.5),
+                (performance >= 3.5) & (potential >= 4.0),
+                (performance >= 3.5) & (potential >= 3.0),
+                (performance >= 3.0) & (potential >= 3.5),
+                (performance >= 3.0) & (potential >= 2.5),
+            ],
+            [
+                'star', 'future_leader', 'current_leader', 'high_potential',
+                'emerging_talent', 'solid_performer', 'developing', 'inconsistent',
+            ],
+            default='underperformer'
+        )
+    
+    def _load_talent_features(self, cycle: QiymetlendirmeDovru, employees) -> pd.DataFrame:
+        """
+        İşçilər üçün talent xüsusiyyətləri cədvəlini sabit sayda sorğu ilə qurur.
+        Sütunlar _get_employee_performance, _calculate_potential_score, _assess_retention_risk
+        və _calculate_performance_trend metodlarının hesabladığı dəyərlərə uyğundur;
+        qiymətləndirməsi olmayan işçilərdə performance NaN olur.
+        """
+        rows = list(employees.order_by('id').values_list(
+            'id', 'first_name', 'last_name', 'vezife', 'organization_unit__name', 'last_login',
+            'organization_unit', 'organization_unit__parent'
+        ))
+        columns = ['name', 'position', 'unit', 'unit_id', 'unit_parent_id', 'performance', 'consistency',
+                   'evaluation_count', 'trend', 'potential', 'retention_risk']
+        if not rows:
+            return pd.DataFrame(columns=columns)
+        
+        employee_ids = np.array([row[0] for row in rows])
+        employee_subquery = employees.values('id')
+        index = {employee_id: i for i, employee_id in enumerate(employee_ids)}
+        n = len(employee_ids)
+        
+        def grouped_counts(queryset, key):
+            counts = np.zeros(n)
+            for employee_id, count in queryset.values(key).annotate(count=Count('id')).values_list(key, 'count'):
+                counts[index[employee_id]] = count
+            return counts
+        
+        # Son 3 dövr (trend üçün) və cari dövr üzrə qiymətləndirmə ortalamaları - bir sorğu
+        recent_cycle_ids = list(
+            QiymetlendirmeDovru.objects.order_by('-bashlama_tarixi').values_list('id', flat=True)[:3]
+        )
+        evaluation_averages = QiymetlendirmeXalXulasesi.objects.filter(
+            qiymetlendirme__dovr_id__in=set(recent_cycle_ids) | {cycle.id},
+            qiymetlendirme__status=Qiymetlendirme.Status.TAMAMLANDI,
+            qiymetlendirme__qiymetlendirilen__in=employee_subquery,
+            kateqoriya__isnull=True,
+            cavab_sayi__gt=0,
+            xal_cemi__gt=0
+        ).order_by('qiymetlendirme').values_list(
+            'qiymetlendirme__qiymetlendirilen', 'qiymetlendirme__dovr', 'xal_cemi', 'cavab_sayi'
+        )
+        
+        cycle_scores = {}
+        for employee_id, cycle_id, xal_cemi, cavab_sayi in evaluation_averages:
+            cycle_scores.setdefault((index[employee_id], cycle_id), []).append(xal_cemi / cavab_sayi)
+        
+        performance = np.full(n, np.nan)
+        consistency = np.zeros(n)
+        evaluation_count = np.zeros(n, dtype=int)
+        history = np.full((n, len(recent_cycle_ids)), np.nan)
+        for (i, cycle_id), scores in cycle_scores.items():
+            mean = np.mean(scores)
+            if cycle_id == cycle.id:
+                performance[i] = mean
+                consistency[i] = np.std(scores) if len(scores) > 1 else 0
+                evaluation_count[i] = len(scores)
+            if cycle_id in recent_cycle_ids:
+                history[i, recent_cycle_ids.index(cycle_id)] = mean
+        
+        trend = self._performance_trends(history)
+        
+        active_plans = grouped_counts(
+            InkishafPlani.objects.filter(ishchi__in=employee_subquery, status=InkishafPlani.Status.AKTIV),
+            'ishchi'
+        )
+        positive_feedback = grouped_counts(
+            QuickFeedback.objects.filter(
+                to_user__in=employee_subquery,
+                rating__gte=4,
+                created_at__gte=timezone.now() - timedelta(days=90)
+            ),
+            'to_user'
+        )
+        active_flags = grouped_counts(
+            RiskFlag.objects.filter(employee__in=employee_subquery, cycle=cycle, status=RiskFlag.Status.ACTIVE),
+            'employee'
+        )
+        psych_attention = grouped_counts(
+            PsychologicalRiskResponse.objects.filter(employee__in=employee_subquery, requires_attention=True),
+            'employee'
+        ) > 0
+        
+        # Risk səviyyəsi (ters mütənasib); analiz yoxdursa yüksək potensial
+        risk_levels = {'LOW': 5, 'MEDIUM': 4, 'HIGH': 2, 'CRITICAL': 1}
+        risk_score = np.full(n, 5.0)
+        seen = set()
+        for employee_id, risk_level in EmployeeRiskAnalysis.objects.filter(
+            employee__in=employee_subquery, cycle=cycle
+        ).values_list('employee', 'risk_level'):
+            if employee_id not in seen:
+                seen.add(employee_id)
+                risk_score[index[employee_id]] = risk_levels.get(risk_level, 3)
+        
+        potential = (
+            np.minimum(active_plans * 2, 5) * 0.25 +
+            np.minimum(positive_feedback * 0.5, 5) * 0.3 +
+            trend * 0.25 +
+            risk_score * 0.2
+        )
+        
+        today = timezone.now().date()
+        days_since_login = np.array([
+            (today - row[5].date()).days if row[5] else -1 for row in rows
+        ])
+        retention_risk = np.minimum(
+            np.where(performance < 3.5, 2, 0) +
+            np.where(psych_attention, 1.5, 0) +
+            np.where(active_flags > 2, 1, 0) +
+            np.where(days_since_login > 7, 0.5, 0),
+            5
+        )
+        
+        return pd.DataFrame({
+            'name': [f"{row[1]} {row[2]}".strip() for row in rows],
+            'position': [row[3] for row in rows],
+            'unit': [row[4] or 'N/A' for row in rows],
+            'unit_id': [row[6] for row in rows],
+            'unit_parent_id': [row[7] for row in rows],
+            'performance': performance,
+            'consistency': consistency,
+            'evaluation_count': evaluation_count,
+            'trend': trend,
+            'potential': potential,
+            'retention_risk': retention_risk,
+        }, index=pd.Index(employee_ids, name='employee_id'))[columns]
+    
+    def _performance_trends(self, history: np.ndarray) -> np.ndarray:
+        """
+        Dövr performans tarixçəsi matrisindən (NaN = məlumat yoxdur) trend xallarını hesablayır.
+        _calculate_performance_trend kimi mövcud dövrlər ardıcıl indekslənir və xətti meyl 1-5 skalasına çevrilir.
+        """
+        present = ~np.isnan(history)
+        counts = present.sum(axis=1)
+        x = np.where(present, np.cumsum(present, axis=1) - 1, 0).astype(float)
+        y = np.where(present, history, 0.0)
+        
+        with np.errstate(invalid='ignore', divide='ignore'):
+            x_mean = np.where(counts > 0, (counts - 1) / 2, 0)
+            y_mean = y.sum(axis=1) / np.maximum(counts, 1)
+            dx = np.where(present, x - x_mean[:, None], 0)
+            slope = (dx * (y - y_mean[:, None]) * present).sum(axis=1) / (dx ** 2).sum(axis=1)
+        
+        trend = np.clip(3 + slope * 2, 1, 5)
+        return np.where(counts >= 2, trend, 3.0)
     
     def _assess_retention_risk(self, employee: Ishchi, cycle: QiymetlendirmeDovru) -> float:
         """
@@ -502,19 +610,22 @@ class StrategicHRPlanner:
         evaluations = Qiymetlendirme.objects.filter(
             qiymetlendirilen=employee,
             dovr=cycle,
-            status='COMPLETED'
+            status=Qiymetlendirme.Status.TAMAMLANDI
         )
         
         if not evaluations.exists():
             return None
             
-        scores = []
-        for evaluation in evaluations:
-            cavablar = evaluation.cavablar.all()
-            if cavablar:
-                avg_score = cavablar.aggregate(avg=Avg('xal'))['avg']
-                if avg_score:
-                    scores.append(avg_score)
+        # Qiymətləndirmə ortalamaları xal xülasəsinin ümumi sətirlərindən oxunur
+        scores = [
+            xal_cemi / cavab_sayi
+            for xal_cemi, cavab_sayi in QiymetlendirmeXalXulasesi.objects.filter(
+                qiymetlendirme__in=evaluations,
+                kateqoriya__isnull=True,
+                cavab_sayi__gt=0,
+                xal_cemi__gt=0
+            ).order_by('qiymetlendirme').values_list('xal_cemi', 'cavab_sayi')
+        ]
         
         if not scores:
             return None
@@ -560,7 +671,9 @@ class StrategicHRPlanner:
         # Bu sadələşdirilmiş versiyadadır - real həyatda daha mürəkkəb məntiqlər ola bilər
         key_positions = []
         
-        employees_query = Ishchi.objects.filter(is_active=True, rol__in=['REHBER', 'ADMIN'])
+        employees_query = Ishchi.objects.filter(
+            is_active=True, rol__in=['REHBER', 'ADMIN']
+        ).select_related('organization_unit')
         
         if organization_unit:
             employees_query = employees_query.filter(organization_unit=organization_unit)
@@ -570,6 +683,7 @@ class StrategicHRPlanner:
             key_positions.append({
                 'position': employee.vezife,
                 'unit': employee.organization_unit.name if employee.organization_unit else 'N/A',
+                'unit_id': employee.organization_unit_id,
                 'current_incumbent': {
                     'id': employee.id,
                     'name': employee.get_full_name(),
@@ -580,83 +694,95 @@ class StrategicHRPlanner:
         
         return key_positions
     
-    def _find_succession_candidates(self, position: str, unit: str) -> List[Dict]:
+    def _build_succession_index(self, cycle: Optional[QiymetlendirmeDovru]) -> Dict:
         """
-        Varislik namizədlərini tapır
+        Varislik namizədlərini bir dəfə hesablayıb təşkilati vahid üzrə indeksləyir.
+        Açar None bütün namizədləri, vahid ID-si isə həmin vahid və birbaşa alt vahidlərinin
+        namizədlərini saxlayır; siyahılar potensial və hazırlığa görə sıralanıb.
         """
-        # Yüksək potensial işçiləri namizəd kimi götür
-        candidates = []
+        index = {None: []}
+        if not cycle:
+            return index
         
-        employees = Ishchi.objects.filter(
-            is_active=True,
-            rol='ISHCHI'
-        )
+        features = self._load_talent_features(cycle, Ishchi.objects.filter(is_active=True, rol='ISHCHI'))
+        features = features[features['performance'].notna()]
         
-        # Eyni və ya əlaqəli vahiddən namizədlər
-        if unit != 'N/A':
-            try:
-                org_unit = OrganizationUnit.objects.get(name=unit)
-                employees = employees.filter(
-                    Q(organization_unit=org_unit) |
-                    Q(organization_unit__parent=org_unit)
-                )
-            except OrganizationUnit.DoesNotExist:
-                pass
-        
-        cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
-        if not cycle:
-            return []
-        
-        for employee in employees:
-            performance_data = self._get_employee_performance(employee, cycle)
-            if not performance_data:
-                continue
-                
-            potential_score = self._calculate_potential_score(employee, cycle)
-            
-            # Yalnız yüksək potensialı olanları daxil et
-            if potential_score >= 3.5:
-                candidates.append({
-                    'employee_id': employee.id,
-                    'name': employee.get_full_name(),
-                    'current_position': employee.vezife,
-                    'performance': round(performance_data['performance'], 2),
-                    'potential': round(potential_score, 2),
-                    'readiness': self._assess_succession_readiness(employee, position)
-                })
+        # Yalnız yüksək potensialı olanları daxil et
+        features = features[features['potential'] >= 3.5]
+        if not len(features):
+            return index
+        
+        readiness = self._succession_readiness_levels(
+            features['performance'].to_numpy(), features['potential'].to_numpy()
+        ).tolist()
+        
+        candidates = []
+        for row, row_readiness in zip(features.itertuples(), readiness):
+            candidates.append((row, {
+                'employee_id': int(row.Index),
+                'name': row.name,
+                'current_position': row.position,
+                'performance': round(row.performance, 2),
+                'potential': round(row.potential, 2),
+                'readiness': row_readiness
+            }))
         
         # Potensial və hazırlığa görə sırala
-        candidates.sort(key=lambda x: (x['potential'], x['readiness']), reverse=True)
+        candidates.sort(key=lambda item: (item[1]['potential'], item[1]['readiness']), reverse=True)
         
-        return candidates
+        for row, candidate in candidates:
+            index[None].append(candidate)
+            # Eyni və ya əlaqəli (ana) vahid üzrə
+            for unit_id in {row.unit_id, row.unit_parent_id}:
+                if unit_id is not None and not pd.isna(unit_id):
+                    index.setdefault(int(unit_id), []).append(candidate)
+        
+        return index
+    
+    def _find_succession_candidates(self, position: str, unit_id: Optional[int],
+                                    candidate_index: Dict = None) -> List[Dict]:
+        """
+        Varislik namizədlərini tapır
+        """
+        if candidate_index is None:
+            candidate_index = self._build_succession_index(
+                get_active_cycle()
+            )
+        
+        if unit_id is None:
+            return list(candidate_index[None])
+        return list(candidate_index.get(unit_id, []))
     
     def _assess_succession_readiness(self, employee: Ishchi, target_position: str) -> str:
         """
         Varislik hazırlığını qiymətləndirir
         """
         # Bu sadə versiyadadır - real həyatda skills assessment, competency mapping olardı
-        performance_data = self._get_employee_performance(
-            employee, 
-            QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
-        )
+        cycle = get_active_cycle()
+        performance_data = self._get_employee_performance(employee, cycle)
         
         if not performance_data:
             return 'needs_development'
         
-        performance = performance_data['performance']
-        potential = self._calculate_potential_score(
-            employee,
-            QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
-        )
+        potential = self._calculate_potential_score(employee, cycle)
         
-        if performance >= 4.5 and potential >= 4.5:
-            return 'ready_now'
-        elif performance >= 4.0 and potential >= 4.0:
-            return '1_year'
-        elif performance >= 3.5 and potential >= 3.5:
-            return '2_3_years'
-        else:
-            return 'needs_development'
+        return str(self._succession_readiness_levels(
+            np.array([performance_data['performance']]), np.array([potential])
+        )[0])
+    
+    def _succession_readiness_levels(self, performance: np.ndarray, potential: np.ndarray) -> np.ndarray:
+        """
+        Performans və potensial massivlərindən varislik hazırlığı səviyyələri
+        """
+        return np.select(
+            [
+                (performance >= 4.5) & (potential >= 4.5),
+                (performance >= 4.0) & (potential >= 4.0),
+                (performance >= 3.5) & (potential >= 3.5),
+            ],
+            ['ready_now', '1_year', '2_3_years'],
+            default='needs_development'
+        )
     
     def _identify_development_needs(self, candidates: List[Dict]) -> List[str]:
         """
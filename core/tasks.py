@@ -7,9 +7,6 @@ from django.utils.translation import gettext_lazy as _
 import logging
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from io import BytesIO
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
 
 logger = logging.getLogger(__name__)
 
@@ -36,47 +33,47 @@ def send_activation_email_task(self, subject, message, recipient_list, html_mess
             raise self.retry(exc=e, countdown=60 * (self.request.retries + 1))
         return f"Failed to send email to {recipient_list[0]} after {self.max_retries} retries"
 
-@shared_task(bind=True)
-def generate_report_task(self, report_type, user_id, filters=None):
+@shared_task(bind=True, max_retries=3)
+def generate_report_task(self, job_id=None, report_type=None, user_id=None, filters=None, output_format='pdf'):
     """
-    Hesabat generasiya tapşırığı
+    Hesabat generasiya tapşırığı.
+    Faylı yaradıb MEDIA-da saxlayır; job_id verilmədikdə (planlanmış hesabatlar)
+    tapşırıq qeydi burada yaradılır. Verilənlər bazası və fayl anbarı xətalarında
+    tapşırıq yenidən cəhd edilir.
     """
+    from django.db import DatabaseError
+    from .models import Ishchi, ReportJob
+    from .reports import ReportJobManager
+    
+    job = None
     try:
-        from django.contrib.auth.models import User
-        from .models import Ischiler, Qiymetlendirme
-        
-        user = User.objects.get(id=user_id)
-        logger.info(f"Hesabat generasiyası başladı: {report_type} - İstifadəçi: {user.username}")
-        
-        # Sadə PDF hesabat yaradım
-        buffer = BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-        
-        p.drawString(100, height - 100, f"Q360 Hesabatı - {report_type}")
-        p.drawString(100, height - 130, f"Tarix: {filters.get('date', 'Hamısı') if filters else 'Hamısı'}")
-        
-        # Məlumatları əlavə et
-        if report_type == 'ischiler':
-            ischiler = Ischiler.objects.all()
-            y_position = height - 180
-            for ischi in ischiler:
-                p.drawString(100, y_position, f"{ischi.ad} {ischi.soyad} - {ischi.vezife}")
-                y_position -= 20
-                if y_position < 100:
-                    p.showPage()
-                    y_position = height - 100
-        
-        p.save()
-        buffer.seek(0)
-        
-        # Faylı saxla və ya e-poçtla göndər
-        logger.info(f"Hesabat uğurla yaradıldı: {report_type}")
-        return f"Report {report_type} generated successfully"
+        if job_id is None:
+            user = Ishchi.objects.filter(id=user_id).first()
+            job = ReportJobManager.submit(user, report_type, output_format, filters, enqueue=False)[0]
+        else:
+            job = ReportJob.objects.get(id=job_id)
+        
+        logger.info(f"Hesabat generasiyası başladı: {job.report_type} ({job.output_format}) - tapşırıq {job.id}")
+        ReportJobManager.run(job)
+        
+        return f"Report job {job.id} completed: {job.file.name}"
+        
+    except (DatabaseError, OSError) as e:
+        logger.error(f"Hesabat generasiya xətası: {e}")
+        if self.request.retries >= self.max_retries:
+            raise
+        retry_kwargs = None
+        if job is not None:
+            # Növbəti cəhdədək tapşırıq istifadəçi üçün gözləmədə görünür
+            ReportJob.objects.filter(pk=job.pk).update(status=ReportJob.Status.PENDING)
+            retry_kwargs = {'job_id': job.pk}
+        logger.info(f"Yenidən cəhd edilir {self.request.retries + 1}/{self.max_retries}")
+        raise self.retry(exc=e, kwargs=retry_kwargs, countdown=60 * (self.request.retries + 1))
         
     except Exception as e:
+        # Məlumat və ya render xətası: tapşırıq FAILED kimi qeyd olunub, təkrar cəhd mənasızdır
         logger.error(f"Hesabat generasiya xətası: {e}")
-        raise self.retry(exc=e, countdown=60)
+        return f"Report generation failed: {e}"
 
 @shared_task
 def send_notification_email_task(user_email, notification_type, context):
@@ -311,18 +308,20 @@ def cleanup_old_notifications():
 
 
 @shared_task
-def run_ai_risk_detection():
+def run_ai_risk_detection(full=False):
     """
     Avtomatik AI Risk Detection analizi
-    Hər gün işçiləri analiz edir və yüksək riskli işçiləri aşkarlayır
+    Hər gün işçiləri analiz edir və yüksək riskli işçiləri aşkarlayır.
+    Standart olaraq yalnız məlumatı dəyişmiş işçilər yenidən hesablanır; full=True tam analiz aparır.
     """
     try:
         from .ai_risk_detection import AIRiskDetector
         from .statistical_anomaly_detection import StatisticalAnomalyDetector
-        from .models import QiymetlendirmeDovru, Ishchi, Notification
+        from .models import Ishchi, Notification
+        from .active_cycle import get_active_cycle
         
         # Aktiv dövrü al
-        active_cycle = QiymetlendirmeDovru.objects.filter(aktivdir=True).first()
+        active_cycle = get_active_cycle()
         if not active_cycle:
             logger.warning("AI Risk Detection: Aktiv dövr tapılmadı")
             return "No active cycle found"
@@ -330,8 +329,11 @@ def run_ai_risk_detection():
         # AI Risk Detector
         detector = AIRiskDetector()
         
-        # Bütün işçilər üçün risk analizi
-        risk_results = detector.bulk_analyze_all_employees(active_cycle)
+        # Risk analizi (nəticələr snapshot kimi saxlanılır)
+        if full:
+            risk_results = detector.run_risk_snapshot(active_cycle)['results']
+        else:
+            risk_results = detector.run_incremental_risk_snapshot(active_cycle)['results']
         
         # Statistical Anomaly Detection
         anomaly_detector = StatisticalAnomalyDetector()
@@ -360,7 +362,7 @@ Yüksək Riskli İşçilər:
 {f"... və {len(high_risk_employees) - 5} nəfər daha" if len(high_risk_employees) > 5 else ""}
 
 🎯 Təcili diqqət tələb olunan sahələr:
-{chr(10).join([f"• {flag}" for flag in set([flag for emp in high_risk_employees for flag in emp.get('red_flags', [])])[:5]])}
+{chr(10).join([f"• {flag}" for flag in sorted(set([flag for emp in high_risk_employees for flag in emp.get('red_flags', [])]))[:5]])}
             """
             
             for hr_user in hr_users:
@@ -466,4 +468,62 @@ def create_default_psychological_surveys():
         
     except Exception as e:
         logger.error(f"Default Psychological Surveys yaratma xətası: {e}")
-        return f"Failed to create default psychological surveys: {e}"
\ No newline at end of file
+        return f"Failed to create default psychological surveys: {e}"
+
+@shared_task
+def fit_anomaly_models(cycle_id=None):
+    """
+    Statistik anomaliya aşkarlaması üçün IsolationForest modellərini öyrədir
+    və diskə yazır. Sorğular saxlanılmış modeldən istifadə edərək yenidən öyrətmədən qiymətləndirir.
+    """
+    try:
+        from .statistical_anomaly_detection import StatisticalAnomalyDetector
+        from .models import QiymetlendirmeDovru
+        
+        cycle = None
+        if cycle_id:
+            cycle = QiymetlendirmeDovru.objects.filter(id=cycle_id).first()
+        
+        detector = StatisticalAnomalyDetector()
+        result = detector.fit_models(cycle)
+        
+        if 'error' in result:
+            logger.warning(f"Anomaliya modelləri öyrədilmədi: {result['error']}")
+            return f"No models fitted: {result['error']}"
+        
+        # Aktiv olmayan dövrlərin köhnə modellərini təmizlə
+        active_ids = list(QiymetlendirmeDovru.objects.filter(aktivdir=True).values_list('id', flat=True))
+        removed = detector.model_store.purge(active_ids + [result['cycle_id']])
+        
+        logger.info(f"Anomaliya modelləri öyrədildi: dövr {result['cycle_id']}, modellər: {list(result['models'])}, silinən: {removed}")
+        return f"Fitted {len(result['models'])} anomaly models for cycle {result['cycle_id']}"
+        
+    except Exception as e:
+        logger.error(f"Anomaliya modeli öyrətmə xətası: {e}")
+        return f"Failed to fit anomaly models: {e}"
+
+
+@shared_task
+def build_cycle_statistics_snapshot(cycle_id):
+    """
+    Bağlanmış dövr üçün statistika snapshot-unu yazır.
+    Dövrün aktivdir sahəsi False olduqda siqnal vasitəsilə işə salınır.
+    """
+    try:
+        from .models import QiymetlendirmeDovru, DovrStatistikaSnapshotu
+        
+        cycle = QiymetlendirmeDovru.objects.filter(id=cycle_id).first()
+        if cycle is None:
+            return f"Cycle {cycle_id} not found"
+        if cycle.aktivdir:
+            # Tapşırıq növbədə olarkən dövr yenidən açılıb
+            return f"Cycle {cycle_id} is active, snapshot skipped"
+        
+        rows = DovrStatistikaSnapshotu.yenile(cycle)
+        
+        logger.info(f"Dövr statistika snapshot-u yazıldı: {cycle.ad} ({rows} sətir)")
+        return f"Built statistics snapshot for cycle {cycle_id}: {rows} rows"
+        
+    except Exception as e:
+        logger.error(f"Dövr statistika snapshot xətası: {e}")
+        return f"Failed to build statistics snapshot: {e}"
@@ -3,12 +3,15 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from datetime import date, timedelta
+from unittest import mock
 
 from core.models import (
     OrganizationUnit, Ishchi, SualKateqoriyasi, Sual,
     QiymetlendirmeDovru, Qiymetlendirme, InkishafPlani,
-    Feedback, Notification, CalendarEvent
+    Feedback, Notification, CalendarEvent, Cavab, QiymetlendirmeXalXulasesi,
+    QuickFeedback, RiskReanalysisQueue, DovrStatistikaSnapshotu, ReportJob, KeshVersiyasi
 )
 
 User = get_user_model()
@@ -41,6 +44,59 @@ class OrganizationUnitModelTest(TestCase):
         self.assertEqual(self.parent_unit.get_children_count(), 1)
         self.assertEqual(self.child_unit.get_children_count(), 0)
 
+    def test_descendants_and_ancestors(self):
+        """İerarxiya yolu ilə alt və üst vahidlərin tapılmasını test et"""
+        sector = OrganizationUnit.objects.create(
+            name="Sektor",
+            type=OrganizationUnit.UnitType.SEKTOR,
+            parent=self.child_unit
+        )
+
+        self.assertEqual(sector.depth, 2)
+        self.assertEqual(
+            set(self.parent_unit.get_descendants()), {self.child_unit, sector}
+        )
+        self.assertEqual(
+            list(sector.get_ancestors()), [self.parent_unit, self.child_unit]
+        )
+
+    def test_move_updates_subtree(self):
+        """Vahid köçürüldükdə alt ağacın yolunun yenilənməsini test et"""
+        sector = OrganizationUnit.objects.create(
+            name="Sektor",
+            type=OrganizationUnit.UnitType.SEKTOR,
+            parent=self.child_unit
+        )
+        new_root = OrganizationUnit.objects.create(
+            name="Yeni Nazirlik",
+            type=OrganizationUnit.UnitType.NAZIRLIK
+        )
+
+        self.child_unit.parent = new_root
+        self.child_unit.save()
+        sector.refresh_from_db()
+
+        self.assertEqual(sector.get_full_path(), "Yeni Nazirlik → İT Departamenti → Sektor")
+        self.assertFalse(self.parent_unit.get_descendants().exists())
+
+        self.child_unit.parent = sector
+        with self.assertRaises(ValidationError):
+            self.child_unit.full_clean()
+
+    def test_save_rejects_parent_cycle(self):
+        """Vahidin öz alt vahidinə tabe edilməsinin save() zamanı da qadağan olduğunu test et"""
+        self.parent_unit.parent = self.child_unit
+        with self.assertRaises(ValidationError):
+            self.parent_unit.save()
+
+    def test_rebuild_paths_backfills_stale_units(self):
+        """Köhnə path sahələrinin yenidən qurulmasını test et"""
+        OrganizationUnit.objects.filter(pk=self.child_unit.pk).update(path='/', depth=0)
+
+        self.assertEqual(OrganizationUnit.rebuild_paths(), 1)
+        self.child_unit.refresh_from_db()
+        self.assertEqual((self.child_unit.path, self.child_unit.depth), (f"/{self.parent_unit.pk}/", 1))
+
 
 class IshchiModelTest(TestCase):
     def setUp(self):
@@ -175,4 +231,264 @@ class InkishafPlaniModelTest(TestCase):
             InkishafPlani.objects.create(
                 ishchi=self.user,
                 dovr=self.dovr
-            )
\ No newline at end of file
+            )
+
+
+class QiymetlendirmeXalXulasesiModelTest(TestCase):
+    def setUp(self):
+        self.qiymetlendiren = Ishchi.objects.create_user(
+            username="qiymetlendiren",
+            email="qiymetlendiren@example.com",
+            password="testpass123"
+        )
+        self.qiymetlendirilen = Ishchi.objects.create_user(
+            username="qiymetlendirilen",
+            email="qiymetlendirilen@example.com",
+            password="testpass123"
+        )
+        self.dovr = QiymetlendirmeDovru.objects.create(
+            ad="Test Dövrü",
+            bashlama_tarixi=date.today(),
+            bitme_tarixi=date.today() + timedelta(days=30)
+        )
+        self.kateqoriya = SualKateqoriyasi.objects.create(ad="Liderlik")
+        self.qiymetlendirme = Qiymetlendirme.objects.create(
+            dovr=self.dovr,
+            qiymetlendirilen=self.qiymetlendirilen,
+            qiymetlendiren=self.qiymetlendiren
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for metn, kateqoriya, xal in [("S1", self.kateqoriya, 4), ("S2", self.kateqoriya, 8), ("S3", None, 9)]:
+                sual = Sual.objects.create(metn=metn, kateqoriya=kateqoriya)
+                Cavab.objects.create(qiymetlendirme=self.qiymetlendirme, sual=sual, xal=xal)
+
+    def test_summary_rebuild(self):
+        """Xal xülasəsinin cavablardan qurulmasını test et"""
+        umumi = QiymetlendirmeXalXulasesi.yenile(self.qiymetlendirme)
+
+        self.assertEqual(umumi.cavab_sayi, 3)
+        self.assertEqual(umumi.xal_cemi, 21)
+        self.assertEqual(umumi.xal_kvadrat_cemi, 161)
+        self.assertEqual((umumi.min_xal, umumi.max_xal), (4, 9))
+
+        kateqoriya_xulasesi = QiymetlendirmeXalXulasesi.objects.get(
+            qiymetlendirme=self.qiymetlendirme, kateqoriya=self.kateqoriya
+        )
+        self.assertEqual(kateqoriya_xulasesi.ortalama, 6.0)
+        self.assertEqual(self.qiymetlendirme.calculate_average_score(), 7.0)
+
+    def test_summary_rebuild_is_idempotent(self):
+        """Təkrar yeniləmənin sətirləri dublikat etmədiyini test et"""
+        QiymetlendirmeXalXulasesi.yenile(self.qiymetlendirme)
+        QiymetlendirmeXalXulasesi.yenile(self.qiymetlendirme)
+
+        self.assertEqual(
+            QiymetlendirmeXalXulasesi.objects.filter(qiymetlendirme=self.qiymetlendirme).count(), 2
+        )
+
+    def test_summary_follows_answer_changes(self):
+        """Cavab yazıldıqda və silindikdə xülasənin siqnalla yeniləndiyini test et"""
+        sual = Sual.objects.create(metn="S4", kateqoriya=self.kateqoriya)
+        with self.captureOnCommitCallbacks(execute=True):
+            cavab = Cavab.objects.create(qiymetlendirme=self.qiymetlendirme, sual=sual, xal=10)
+        umumi = QiymetlendirmeXalXulasesi.objects.get(qiymetlendirme=self.qiymetlendirme, kateqoriya=None)
+        self.assertEqual((umumi.cavab_sayi, umumi.xal_cemi), (4, 31))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            cavab.delete()
+        umumi = QiymetlendirmeXalXulasesi.objects.get(qiymetlendirme=self.qiymetlendirme, kateqoriya=None)
+        self.assertEqual((umumi.cavab_sayi, umumi.xal_cemi), (3, 21))
+
+    def test_summary_rebuilt_once_per_transaction(self):
+        """Bir tranzaksiyada bir neçə cavab yazıldıqda xülasənin bir dəfə yeniləndiyini test et"""
+        suallar = [Sual.objects.create(metn=f"Yeni {i}") for i in range(3)]
+        with mock.patch.object(QiymetlendirmeXalXulasesi, 'yenile') as yenile:
+            with self.captureOnCommitCallbacks(execute=True):
+                for sual in suallar:
+                    Cavab.objects.create(qiymetlendirme=self.qiymetlendirme, sual=sual, xal=5)
+        yenile.assert_called_once_with(self.qiymetlendirme.pk)
+
+
+class DovrStatistikaSnapshotuModelTest(TestCase):
+    def setUp(self):
+        self.vahid = OrganizationUnit.objects.create(name="Şöbə", type=OrganizationUnit.UnitType.SHOBE)
+        self.qiymetlendiren = Ishchi.objects.create_user(
+            username="snapshot_qiymetlendiren",
+            email="snapshot_qiymetlendiren@example.com",
+            password="testpass123"
+        )
+        self.qiymetlendirilen = Ishchi.objects.create_user(
+            username="snapshot_qiymetlendirilen",
+            email="snapshot_qiymetlendirilen@example.com",
+            password="testpass123",
+            organization_unit=self.vahid
+        )
+        self.dovr = QiymetlendirmeDovru.objects.create(
+            ad="Bağlı Dövr",
+            bashlama_tarixi=date.today() - timedelta(days=60),
+            bitme_tarixi=date.today() - timedelta(days=30)
+        )
+        self.kateqoriya = SualKateqoriyasi.objects.create(ad="Komanda işi")
+        sual = Sual.objects.create(metn="S1", kateqoriya=self.kateqoriya)
+        for novu, status, xal in [
+            (Qiymetlendirme.QiymetlendirmeNovu.PEER_REVIEW, Qiymetlendirme.Status.TAMAMLANDI, 6),
+            (Qiymetlendirme.QiymetlendirmeNovu.MANAGER_REVIEW, Qiymetlendirme.Status.TAMAMLANDI, 8),
+            (Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW, Qiymetlendirme.Status.GOZLEMEDE, 10),
+        ]:
+            qiymetlendirme = Qiymetlendirme.objects.create(
+                dovr=self.dovr,
+                qiymetlendirilen=self.qiymetlendirilen,
+                qiymetlendiren=self.qiymetlendiren,
+                qiymetlendirme_novu=novu,
+                status=status
+            )
+            Cavab.objects.create(qiymetlendirme=qiymetlendirme, sual=sual, xal=xal)
+
+    def test_snapshot_rebuild(self):
+        """Snapshot-un yalnız tamamlanmış qiymətləndirmələrdən qurulmasını test et"""
+        self.dovr.aktivdir = False
+        self.dovr.save()
+
+        self.assertEqual(DovrStatistikaSnapshotu.yenile(self.dovr), 2)
+        self.assertEqual(DovrStatistikaSnapshotu.yenile(self.dovr), 2)
+
+        peer = DovrStatistikaSnapshotu.objects.get(
+            dovr=self.dovr, qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.PEER_REVIEW
+        )
+        self.assertEqual((peer.organization_unit, peer.kateqoriya), (self.vahid, self.kateqoriya))
+        self.assertEqual((peer.cavab_sayi, peer.xal_cemi, peer.xal_kvadrat_cemi), (1, 6, 36))
+
+        self.dovr.refresh_from_db()
+        self.assertTrue(self.dovr.statistika_snapshot_hazirdir)
+
+    def test_reopening_cycle_invalidates_snapshot(self):
+        """Dövr yenidən açıldıqda snapshot-un istifadədən çıxmasını test et"""
+        self.dovr.aktivdir = False
+        self.dovr.save()
+        DovrStatistikaSnapshotu.yenile(self.dovr)
+
+        self.dovr.refresh_from_db()
+        self.dovr.aktivdir = True
+        self.dovr.save()
+
+        self.dovr.refresh_from_db()
+        self.assertIsNone(self.dovr.statistika_snapshot_tarixi)
+        self.assertFalse(self.dovr.statistika_snapshot_hazirdir)
+
+    def test_employee_move_invalidates_only_live_benchmarks(self):
+        """İşçi köçürüldükdə yalnız snapshot-u olmayan dövrlərin benchmark versiyasının artdığını test et"""
+        self.dovr.aktivdir = False
+        self.dovr.save()
+        DovrStatistikaSnapshotu.yenile(self.dovr)
+        aciq_dovr = QiymetlendirmeDovru.objects.create(
+            ad="Açıq Dövr",
+            bashlama_tarixi=date.today(),
+            bitme_tarixi=date.today() + timedelta(days=30)
+        )
+        versiya = lambda dovr: QiymetlendirmeDovru.objects.get(pk=dovr.pk).benchmark_versiyasi
+        bagli_versiya, aciq_versiya = versiya(self.dovr), versiya(aciq_dovr)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.qiymetlendirilen.first_name = "Yeni"
+            self.qiymetlendirilen.save()
+        self.assertEqual(versiya(aciq_dovr), aciq_versiya)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.qiymetlendirilen.organization_unit = None
+            self.qiymetlendirilen.save()
+        self.assertEqual(versiya(aciq_dovr), aciq_versiya + 1)
+        self.assertEqual(versiya(self.dovr), bagli_versiya)
+
+
+class RiskReanalysisQueueModelTest(TestCase):
+    def setUp(self):
+        self.ishchi = User.objects.create_user(
+            username="riskli",
+            email="riskli@example.com",
+            password="testpass123"
+        )
+        self.hemkar = User.objects.create_user(
+            username="hemkar",
+            email="hemkar@example.com",
+            password="testpass123"
+        )
+
+    def test_mark_is_idempotent(self):
+        """Eyni işçinin təkrar işarələnməsinin dublikat yaratmadığını test et"""
+        RiskReanalysisQueue.mark(self.ishchi.id, self.ishchi.id, None)
+        RiskReanalysisQueue.mark(self.ishchi.id)
+
+        self.assertEqual(RiskReanalysisQueue.objects.count(), 1)
+
+    def test_quick_feedback_marks_recipient(self):
+        """Sürətli rəyin alan işçini növbəyə əlavə etdiyini test et"""
+        with self.captureOnCommitCallbacks(execute=True):
+            QuickFeedback.objects.create(
+                from_user=self.hemkar,
+                to_user=self.ishchi,
+                title="Rəy",
+                message="Təşəkkürlər"
+            )
+
+        self.assertTrue(RiskReanalysisQueue.objects.filter(employee=self.ishchi).exists())
+        self.assertFalse(RiskReanalysisQueue.objects.filter(employee=self.hemkar).exists())
+
+    def test_quick_feedback_delete_marks_recipient(self):
+        """Sürətli rəy silindikdə alan işçinin növbəyə əlavə edildiyini test et"""
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback = QuickFeedback.objects.create(
+                from_user=self.hemkar,
+                to_user=self.ishchi,
+                title="Rəy",
+                message="Təşəkkürlər"
+            )
+        RiskReanalysisQueue.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            feedback.delete()
+
+        self.assertTrue(RiskReanalysisQueue.objects.filter(employee=self.ishchi).exists())
+
+
+class KeshVersiyasiModelTest(TestCase):
+    def test_artir_creates_and_increments(self):
+        """Versiya sayğacının yoxdursa yaradıldığını və artırıldığını test et"""
+        self.assertEqual(KeshVersiyasi.cari("test"), 0)
+
+        KeshVersiyasi.artir("test")
+        KeshVersiyasi.artir("test")
+
+        self.assertEqual(KeshVersiyasi.cari("test"), 2)
+        self.assertEqual(KeshVersiyasi.cari("diger"), 0)
+
+
+class ReportJobModelTest(TestCase):
+    """ReportJob modeli üçün testlər"""
+
+    def test_params_hash_depends_on_viewer_role(self):
+        """Hash-in filtrlərin sırasından asılı olmadığını, roldan isə asılı olduğunu test et"""
+        first = ReportJob.build_params_hash('employee_performance', 'csv', {'a': 1, 'b': 2}, 'ADMIN')
+        second = ReportJob.build_params_hash('employee_performance', 'csv', {'b': 2, 'a': 1}, 'ADMIN')
+        other_role = ReportJob.build_params_hash('employee_performance', 'csv', {'a': 1, 'b': 2}, 'ISHCHI')
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other_role)
+
+    def test_find_reusable_skips_expired_jobs(self):
+        """Vaxtı keçmiş tamamlanmış tapşırığın təkrar istifadə edilmədiyini test et"""
+        params_hash = ReportJob.build_params_hash('employee_performance', 'pdf', {})
+        ReportJob.objects.create(
+            report_type='employee_performance',
+            output_format='pdf',
+            params_hash=params_hash,
+            status=ReportJob.Status.COMPLETED,
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        self.assertIsNone(ReportJob.find_reusable(params_hash))
+
+        job = ReportJob.objects.create(
+            report_type='employee_performance',
+            output_format='pdf',
+            params_hash=params_hash
+        )
+        self.assertEqual(ReportJob.find_reusable(params_hash), job)
@@ -73,6 +73,8 @@ urlpatterns = [
          include([
              path("", report_views.report_center, name="report_center"),
              path("generate/<str:report_type>/", report_views.generate_report, name="generate_report"),
+             path("jobs/<int:job_id>/", report_views.report_job_status, name="report_job_status"),
+             path("jobs/<int:job_id>/download/", report_views.report_job_download, name="report_job_download"),
              path("preview/<str:report_type>/", report_views.report_preview, name="report_preview"),
              path("schedule/", report_views.schedule_report, name="schedule_report"),
              path("analytics/", report_views.report_analytics, name="report_analytics"),
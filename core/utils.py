@@ -4,7 +4,8 @@ import json
 
 from django.db.models import Avg
 
-from .models import Cavab, QiymetlendirmeDovru, SualKateqoriyasi, Qiymetlendirme
+from .models import Cavab, QiymetlendirmeDovru, Qiymetlendirme
+from .cycle_statistics import category_aggregates, merge_category_stats
 
 
 def generate_recommendations(yazili_reyler):
@@ -73,32 +74,36 @@ def get_detailed_report_context(ishchi, dovr):
     if not qiymetlendirmeler.exists():
         return {'error': f"'{dovr.ad}' dövrü üçün {ishchi.get_full_name()} haqqında heç bir tamamlanmış qiymətləndirmə tapılmadı."}
 
-    # Bütün kateqoriyaları əvvəlcədən alırıq
-    kateqoriyalar = SualKateqoriyasi.objects.all()
-    gap_analysis_data = []
-    
-    for cat in kateqoriyalar:
-        # Həmin kateqoriyadakı cavabları tapırıq
-        cavablar = Cavab.objects.filter(
-            qiymetlendirme__in=qiymetlendirmeler,
-            sual__kateqoriya=cat
-        )
+    # Bütün kateqoriyalar üzrə cavablar qiymətləndirən üzrə bir sorğu ilə toplanır
+    stats = category_aggregates(
+        {
+            'qiymetlendirme__qiymetlendirilen_id': ishchi.id,
+            'qiymetlendirme__dovr_id': dovr.id,
+            'qiymetlendirme__status': Qiymetlendirme.Status.TAMAMLANDI,
+        },
+        cycle=dovr,
+        group_by='qiymetlendirme__qiymetlendiren'
+    )
 
-        if not cavablar.exists():
+    by_category = {}
+    for (category_id, qiymetlendiren_id), category_stats in stats.items():
+        if category_id is None:
             continue
+        side = 'self' if qiymetlendiren_id == ishchi.id else 'others'
+        by_category.setdefault(category_id, {'self': [], 'others': []})[side].append(category_stats)
 
-        # Özünüqiymətləndirmə balı
-        self_avg = cavablar.filter(
-            qiymetlendirme__qiymetlendiren=ishchi
-        ).aggregate(ortalama=Avg('xal'))['ortalama'] or 0
+    gap_analysis_data = []
+
+    for category_id in sorted(by_category):
+        self_stats = merge_category_stats(by_category[category_id]['self'])
+        others_stats = merge_category_stats(by_category[category_id]['others'])
+
+        # Özünüqiymətləndirmə balı və başqalarının verdiyi ortalama bal
+        self_avg = self_stats['avg'] if self_stats else 0
+        others_avg = others_stats['avg'] if others_stats else 0
 
-        # Başqalarının verdiyi ortalama bal
-        others_avg = cavablar.exclude(
-            qiymetlendirme__qiymetlendiren=ishchi
-        ).aggregate(ortalama=Avg('xal'))['ortalama'] or 0
-        
         gap_analysis_data.append({
-            'kateqoriya': cat.ad,
+            'kateqoriya': (self_stats or others_stats)['name'],
             'oz_qiymeti': round(self_avg, 2),
             'bashqalarinin_qiymeti': round(others_avg, 2),
             'ferq': round(self_avg - others_avg, 2)
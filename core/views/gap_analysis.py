@@ -4,7 +4,7 @@ Gap Analysis (Fərq Təhlili) Views
 """
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg, Count, Q
+from django.db.models import Avg, BooleanField, Case, Count, F, Q, Value, When
 from django.http import JsonResponse
 from django.core.cache import cache
 from django.utils import timezone
@@ -12,10 +12,11 @@ from datetime import timedelta
 import json
 
 from ..models import (
-    Ishchi, Qiymetlendirme, Cavab, QiymetlendirmeDovru, 
+    Ishchi, Qiymetlendirme, QiymetlendirmeDovru, 
     SualKateqoriyasi, Sual
 )
 from ..permissions import require_role
+from ..cycle_statistics import category_aggregates, snapshot_totals
 
 
 @login_required
@@ -244,14 +245,17 @@ def team_gap_analysis(request):
     cycle = get_object_or_404(QiymetlendirmeDovru, id=cycle_id)
     
     # Şöbədəki işçilərin siyahısı
-    team_members = Ishchi.objects.filter(
+    team_members = list(Ishchi.objects.filter(
         organization_unit_id=department_id
-    )
+    ))
+    
+    # Bütün komanda üçün fərqlər bir sorğu ilə hesablanır
+    team_analysis = get_team_gap_analysis(team_members, cycle)
     
     team_gap_data = []
     
     for member in team_members:
-        member_data = get_user_gap_analysis(member, cycle)
+        member_data = team_analysis['members'][member.id]
         
         if member_data['has_self_review']:
             team_gap_data.append({
@@ -268,7 +272,8 @@ def team_gap_analysis(request):
     context = {
         'cycle': cycle,
         'team_gap_data': team_gap_data,
-        'team_members_count': team_members.count(),
+        'team_gap_matrix': json.dumps(team_analysis['matrix']),
+        'team_members_count': len(team_members),
         'page_title': f'Komanda Fərq Təhlili - {cycle.ad}'
     }
     
@@ -279,71 +284,101 @@ def get_user_gap_analysis(user, cycle):
     """
     İstifadəçinin gap analysis məlumatlarını hesablayır
     """
-    # Self-review qiymətləndirməsi
-    self_review = Qiymetlendirme.objects.filter(
-        qiymetlendirilen=user,
-        qiymetlendiren=user,
-        dovr=cycle,
-        qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW,
-        status=Qiymetlendirme.Status.TAMAMLANDI
-    ).first()
-    
-    if not self_review:
-        return {
-            'has_self_review': False,
-            'categories': [],
-            'overall_gap': 0
-        }
+    return get_team_gap_analysis([user], cycle)['members'][user.id]
+
+
+def get_team_gap_analysis(members, cycle):
+    """
+    Komanda üzvləri üçün özünüqiymətləndirmə ilə başqalarının qiymətləndirmələri
+    arasındakı fərqi hesablayır. Bütün üzvlərin kateqoriya ortalamaları bir sorğu ilə
+    (qiymətləndirilən, self-review olub-olmaması, kateqoriya) üzrə qruplaşdırılır.
+    'members' hər üzv üçün get_user_gap_analysis formatında nəticəni, 'matrix' isə
+    self-review-u olan üzvlər üzrə kateqoriyalara uyğunlaşdırılmış massivləri saxlayır.
+    """
+    member_ids = [member.id for member in members]
     
-    # Başqalarının qiymətləndirmələri
-    others_reviews = Qiymetlendirme.objects.filter(
-        qiymetlendirilen=user,
+    rows = Qiymetlendirme.objects.filter(
+        qiymetlendirilen__in=member_ids,
         dovr=cycle,
         status=Qiymetlendirme.Status.TAMAMLANDI
-    ).exclude(
-        qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-    )
+    ).filter(
+        # Self-review yalnız işçinin özü tərəfindən doldurulubsa nəzərə alınır
+        ~Q(qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW) |
+        Q(qiymetlendiren=F('qiymetlendirilen'))
+    ).annotate(
+        is_self=Case(
+            When(qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField()
+        )
+    ).values(
+        'qiymetlendirilen', 'is_self', 'cavablar__sual__kateqoriya', 'cavablar__sual__kateqoriya__ad'
+    ).annotate(
+        avg_score=Avg('cavablar__xal')
+    ).order_by()
+    
+    has_self_review = set()
+    self_averages = {}
+    others_averages = {}
+    category_names = {}
+    for row in rows:
+        member_id = row['qiymetlendirilen']
+        if row['is_self']:
+            # Cavabsız self-review da mövcud sayılır (avg_score boş olur)
+            has_self_review.add(member_id)
+        if row['avg_score'] is None:
+            continue
+        category_id = row['cavablar__sual__kateqoriya']
+        category_names[category_id] = row['cavablar__sual__kateqoriya__ad']
+        target = self_averages if row['is_self'] else others_averages
+        target.setdefault(member_id, {})[category_id] = row['avg_score']
+    
+    category_order = sorted(category_names, key=lambda category_id: (category_id is None, category_id or 0))
+    
+    result = {
+        'members': {},
+        'matrix': {
+            'member_ids': [],
+            'category_ids': category_order,
+            'categories': [category_names[category_id] for category_id in category_order],
+            'self_scores': [],
+            'others_scores': [],
+            'gaps': [],
+            'overall_gaps': []
+        }
+    }
     
-    # Kateqoriyalar üzrə analiz - Optimized to avoid N+1 queries
-    categories_data = []
-    total_gap = 0
-    
-    # Get all category averages in one query for self-review
-    self_category_averages = Cavab.objects.filter(
-        qiymetlendirme=self_review
-    ).values('sual__kateqoriya__id', 'sual__kateqoriya__ad').annotate(
-        avg_score=Avg('xal')
-    ).order_by('sual__kateqoriya__id')
-    
-    # Get all category averages in one query for others' reviews
-    others_category_averages = Cavab.objects.filter(
-        qiymetlendirme__in=others_reviews
-    ).values('sual__kateqoriya__id', 'sual__kateqoriya__ad').annotate(
-        avg_score=Avg('xal')
-    ).order_by('sual__kateqoriya__id')
-    
-    # Create dictionaries for quick lookup
-    self_averages_dict = {item['sual__kateqoriya__id']: item['avg_score'] for item in self_category_averages}
-    others_averages_dict = {item['sual__kateqoriya__id']: item['avg_score'] for item in others_category_averages}
-    
-    # Process categories that have data in both self and others reviews
-    processed_categories = set()
-    for item in self_category_averages:
-        category_id = item['sual__kateqoriya__id']
-        if category_id in others_averages_dict:
-            self_avg = self_averages_dict[category_id]
-            others_avg = others_averages_dict[category_id]
+    for member_id in member_ids:
+        if member_id not in has_self_review:
+            result['members'][member_id] = {
+                'has_self_review': False,
+                'categories': [],
+                'overall_gap': 0
+            }
+            continue
+        
+        member_self = self_averages.get(member_id, {})
+        member_others = others_averages.get(member_id, {})
+        
+        categories_data = []
+        total_gap = 0
+        self_row, others_row, gap_row = [], [], []
+        
+        for category_id in category_order:
+            if category_id not in member_self or category_id not in member_others:
+                self_row.append(None)
+                others_row.append(None)
+                gap_row.append(None)
+                continue
+            
+            self_avg = member_self[category_id]
+            others_avg = member_others[category_id]
             
             # Gap hesabla
             gap = self_avg - others_avg
             gap_percentage = (gap / 10) * 100  # 10 maksimum bal
             
-            # Create category object for backward compatibility
-            from ..models import SualKateqoriyasi
-            category = SualKateqoriyasi(id=category_id, ad=item['sual__kateqoriya__ad'])
-            
-            # Tövsiyələr
-            recommendations = generate_gap_recommendations(category, gap)
+            category = SualKateqoriyasi(id=category_id, ad=category_names[category_id])
             
             categories_data.append({
                 'category': category,
@@ -351,86 +386,91 @@ def get_user_gap_analysis(user, cycle):
                 'others_score': round(others_avg, 2),
                 'gap': round(gap, 2),
                 'gap_percentage': round(gap_percentage, 1),
-                'recommendations': recommendations
+                'recommendations': generate_gap_recommendations(category, gap)
             })
-            
             total_gap += abs(gap)
-            processed_categories.add(category_id)
-    
-    overall_gap = total_gap / len(categories_data) if categories_data else 0
-    
-    return {
-        'has_self_review': True,
-        'categories': categories_data,
-        'overall_gap': round(overall_gap, 2)
-    }
+            
+            self_row.append(round(self_avg, 2))
+            others_row.append(round(others_avg, 2))
+            gap_row.append(round(gap, 2))
+        
+        overall_gap = round(total_gap / len(categories_data), 2) if categories_data else 0
+        
+        result['members'][member_id] = {
+            'has_self_review': True,
+            'categories': categories_data,
+            'overall_gap': overall_gap
+        }
+        
+        matrix = result['matrix']
+        matrix['member_ids'].append(member_id)
+        matrix['self_scores'].append(self_row)
+        matrix['others_scores'].append(others_row)
+        matrix['gaps'].append(gap_row)
+        matrix['overall_gaps'].append(overall_gap)
+    
+    return result
 
 
 def get_department_average(department, cycle):
     """Şöbənin ortalama performansını hesablayır"""
     
-    # Şöbədəki bütün tamamlanmış qiymətləndirmələr
-    dept_evaluations = Qiymetlendirme.objects.filter(
-        qiymetlendirilen__organization_unit=department,
-        dovr=cycle,
-        status=Qiymetlendirme.Status.TAMAMLANDI
-    ).exclude(
-        qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-    )
-    
-    if not dept_evaluations.exists():
-        return None
-    
-    # Kateqoriyalar üzrə ortalama
-    dept_categories = []
+    # Bağlı dövrlər üçün snapshot cədvəlindən oxu
+    if cycle.statistika_snapshot_hazirdir:
+        return _snapshot_category_averages(cycle, unit=department)
     
-    for category in SualKateqoriyası.objects.all():
-        answers = Cavab.objects.filter(
-            qiymetlendirme__in=dept_evaluations,
-            sual__kateqoriya=category
-        )
-        
-        if answers.exists():
-            avg_score = answers.aggregate(Avg('xal'))['xal__avg']
-            dept_categories.append({
-                'category': category,
-                'average_score': round(avg_score, 2)
-            })
-    
-    return dept_categories
+    return _category_averages(cycle, qiymetlendirme__qiymetlendirilen__organization_unit_id=department.id)
 
 
 def get_company_average(cycle):
     """Şirkətin ümumi ortalamasını hesablayır"""
     
-    # Bütün tamamlanmış qiymətləndirmələr
-    all_evaluations = Qiymetlendirme.objects.filter(
-        dovr=cycle,
-        status=Qiymetlendirme.Status.TAMAMLANDI
-    ).exclude(
-        qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-    )
+    if cycle.statistika_snapshot_hazirdir:
+        return _snapshot_category_averages(cycle)
     
-    if not all_evaluations.exists():
+    return _category_averages(cycle)
+
+
+def _category_averages(cycle, **filters):
+    """Dövrün tamamlanmış qiymətləndirmələri üzrə kateqoriya ortalamaları (self-review xaric)"""
+    stats = category_aggregates(
+        {
+            'qiymetlendirme__dovr_id': cycle.id,
+            'qiymetlendirme__status': Qiymetlendirme.Status.TAMAMLANDI,
+            **filters
+        },
+        exclude={'qiymetlendirme__qiymetlendirme_novu': Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW},
+        cycle=cycle
+    )
+    if not stats:
         return None
     
-    # Kateqoriyalar üzrə ortalama
-    company_categories = []
+    return [
+        {
+            'category': SualKateqoriyasi(id=category_id, ad=stats[category_id]['name']),
+            'average_score': round(stats[category_id]['avg'], 2)
+        }
+        for category_id in sorted(category_id for category_id in stats if category_id is not None)
+    ]
+
+
+def _snapshot_category_averages(cycle, unit=None):
+    """Bağlı dövrün kateqoriya ortalamaları snapshot cədvəlindən (self-review xaric)"""
+    totals = snapshot_totals([cycle.id], unit=unit, by_category=True)
+    if not totals:
+        return None
     
-    for category in SualKateqoriyası.objects.all():
-        answers = Cavab.objects.filter(
-            qiymetlendirme__in=all_evaluations,
-            sual__kateqoriya=category
-        )
-        
-        if answers.exists():
-            avg_score = answers.aggregate(Avg('xal'))['xal__avg']
-            company_categories.append({
-                'category': category,
-                'average_score': round(avg_score, 2)
-            })
+    categories = SualKateqoriyasi.objects.filter(
+        id__in=[category_id for _, category_id in totals if category_id is not None]
+    ).order_by('id')
     
-    return company_categories
+    return [
+        {
+            'category': category,
+            'average_score': round(totals[(cycle.id, category.id)]['avg'], 2)
+        }
+        for category in categories
+    ]
 
 
 def generate_gap_recommendations(category, gap):
@@ -13,7 +13,7 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.views import LoginView
 from django.core.exceptions import PermissionDenied
 from django.core.mail import EmailMessage
-from django.db.models import Avg, Q
+from django.db.models import Avg
 from django.http import HttpResponse
 # --- Django core və HTTP modulları ---
 from django.shortcuts import get_object_or_404, redirect, render
@@ -37,6 +37,7 @@ from ..forms import (HedefFormSet, IshchiCreationForm, IshchiPasswordChangeForm,
 from ..models import (Cavab, Hedef, InkishafPlani, Ishchi, OrganizationUnit,
                      Qiymetlendirme, QiymetlendirmeDovru, Sual,
                      SualKateqoriyasi)
+from ..score_rollup import get_unit_score_rollup
 from ..tokens import account_activation_token
 from ..utils import get_detailed_report_context, get_performance_trend
 
@@ -241,6 +242,23 @@ def hesabat_gorunumu(request, ishchi_id=None):
 
 
 # --- SUPERADMIN GÖRÜNÜŞLƏRİ ---
+# Departament statistikası superadmin paneli və ixraclar üçün ortaq mənbədən (dövr üzrə keşlənmiş
+# ierarxik xal toplamaları) hazırlanır.
+
+def _departament_statistikasi(dovr):
+    """Ali idarə səviyyəsindəki vahidlər üçün alt vahidlər daxil olmaqla ortalama ballar."""
+    departament_stat = []
+    for vahid in get_unit_score_rollup(dovr).values():
+        if vahid["type"] != OrganizationUnit.UnitType.ALI_IDARE:
+            continue
+        departament_stat.append(
+            {
+                "ad": vahid["name"],
+                "ortalama_bal": round(vahid["avg"], 2) if vahid["avg"] else 0,
+            }
+        )
+    return departament_stat
+
 
 @login_required
 @superadmin_required
@@ -387,24 +405,8 @@ def superadmin_paneli(request):
             }
         )
 
-        # Departament səviyyəsindəki təşkilati vahidləri alırıq
-        departamentler = OrganizationUnit.objects.filter(type=OrganizationUnit.UnitType.ALI_IDARE)
-        departament_stat = []
-        for dep in departamentler:
-            # Bu departamenta bağlı bütün alt vahidləri tapırıq
-            alt_vahidler = OrganizationUnit.objects.filter(
-                Q(id=dep.id) | Q(parent=dep) | Q(parent__parent=dep) | Q(parent__parent__parent=dep)
-            )
-            ortalama_bal = Cavab.objects.filter(
-                qiymetlendirme__dovr=dovr,
-                qiymetlendirme__qiymetlendirilen__organization_unit__in=alt_vahidler,
-            ).aggregate(ortalama=Avg("xal"))["ortalama"]
-            departament_stat.append(
-                {
-                    "ad": dep.name,
-                    "ortalama_bal": round(ortalama_bal, 2) if ortalama_bal else 0,
-                }
-            )
+        # Departament səviyyəsindəki təşkilati vahidlər üzrə ortalama ballar
+        departament_stat = _departament_statistikasi(dovr)
 
         context["departament_stat"] = departament_stat
         context["chart_labels"] = json.dumps([item["ad"] for item in departament_stat])
@@ -475,24 +477,8 @@ def export_departments_excel(request):
         )
         return redirect("superadmin_paneli")
 
-    # Məlumatları yenidən hesablayırıq (superadmin_paneli view-undakı məntiqin təkrarı)
-    departamentler = OrganizationUnit.objects.filter(type=OrganizationUnit.UnitType.ALI_IDARE)
-    departament_stat = []
-    for dep in departamentler:
-        # Bu departamenta bağlı bütün alt vahidləri tapırıq
-        alt_vahidler = OrganizationUnit.objects.filter(
-            Q(id=dep.id) | Q(parent=dep) | Q(parent__parent=dep) | Q(parent__parent__parent=dep)
-        )
-        ortalama_bal = Cavab.objects.filter(
-            qiymetlendirme__dovr=dovr,
-            qiymetlendirme__qiymetlendirilen__organization_unit__in=alt_vahidler,
-        ).aggregate(ortalama=Avg("xal"))["ortalama"]
-        departament_stat.append(
-            {
-                "ad": dep.name,
-                "ortalama_bal": round(ortalama_bal, 2) if ortalama_bal else 0,
-            }
-        )
+    # Məlumatları superadmin_paneli ilə eyni mənbədən alırıq
+    departament_stat = _departament_statistikasi(dovr)
 
     # --- Excel Faylının Yaradılması ---
 
@@ -547,23 +533,7 @@ def export_departments_pdf(request):
         return redirect("superadmin_paneli")
 
     # Məlumatları alırıq (bu kod Excel ixracı ilə eynidir)
-    departamentler = OrganizationUnit.objects.filter(type=OrganizationUnit.UnitType.ALI_IDARE)
-    departament_stat = []
-    for dep in departamentler:
-        # Bu departamenta bağlı bütün alt vahidləri tapırıq
-        alt_vahidler = OrganizationUnit.objects.filter(
-            Q(id=dep.id) | Q(parent=dep) | Q(parent__parent=dep) | Q(parent__parent__parent=dep)
-        )
-        ortalama_bal = Cavab.objects.filter(
-            qiymetlendirme__dovr=dovr,
-            qiymetlendirme__qiymetlendirilen__organization_unit__in=alt_vahidler,
-        ).aggregate(ortalama=Avg("xal"))["ortalama"]
-        departament_stat.append(
-            {
-                "ad": dep.name,
-                "ortalama_bal": round(ortalama_bal, 2) if ortalama_bal else 0,
-            }
-        )
+    departament_stat = _departament_statistikasi(dovr)
 
     # --- PDF Faylının Yaradılması ---
     context = {
@@ -4,11 +4,13 @@ Performance Trends (İnkişaf Trendi) Views
 """
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Avg, Count, Q
+from django.db.models import Avg, Count, Q, Sum
 from django.http import JsonResponse
 from django.core.cache import cache
 from django.utils import timezone
+from django.conf import settings
 from datetime import timedelta, datetime
+import hashlib
 import json
 
 from ..models import (
@@ -16,6 +18,8 @@ from ..models import (
     SualKateqoriyasi
 )
 from ..permissions import require_role
+from ..cycle_statistics import get_cycle_benchmarks
+from ..score_rollup import get_rollup_generation
 
 
 @login_required
@@ -284,14 +288,12 @@ def department_trends_comparison(request):
         bashlama_tarixi__gte=start_date
     ).order_by('bashlama_tarixi')
     
-    departments_data = []
-    
-    for dept_id in department_ids:
-        dept_trend = get_department_performance_trend(dept_id, cycles)
-        departments_data.append(dept_trend)
+    # Bütün şöbələrin seriyaları bir qruplaşdırılmış sorğu ilə hesablanır
+    comparison = get_departments_performance_trends(department_ids, cycles)
     
     context = {
-        'departments_data': departments_data,
+        'departments_data': comparison['departments'],
+        'chart_data': comparison['chart'],
         'cycles': cycles,
         'period': period,
         'page_title': 'Şöbələr Arası Trend Müqayisəsi'
@@ -337,56 +339,76 @@ def individual_category_trend(request, category_id):
 
 def get_user_performance_trend(user, cycles):
     """
-    İstifadəçinin performans trendini hesablayır
+    İstifadəçinin performans trendini hesablayır.
+    Bütün dövrlər üçün cavablar bir sorğu ilə (dövr, kateqoriya) üzrə qruplaşdırılır;
+    ümumi və kateqoriya seriyaları yaddaşda yığılır. evaluations_count cavabı olmayanlar
+    da daxil olmaqla dövrdəki bütün tamamlanmış qiymətləndirmələri sayır.
     """
+    cycles = list(cycles)
+    
+    evaluations = Qiymetlendirme.objects.filter(
+        qiymetlendirilen=user,
+        dovr__in=[cycle.id for cycle in cycles],
+        status=Qiymetlendirme.Status.TAMAMLANDI
+    ).exclude(
+        qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
+    )
+    evaluation_counts = dict(
+        evaluations.values('dovr').annotate(count=Count('id')).values_list('dovr', 'count').order_by()
+    )
+    
+    rows = Cavab.objects.filter(
+        qiymetlendirme__in=evaluations
+    ).values(
+        'qiymetlendirme__dovr', 'sual__kateqoriya', 'sual__kateqoriya__ad'
+    ).annotate(
+        total=Sum('xal'),
+        answers_count=Count('id')
+    ).order_by()
+    
+    # dövr -> ümumi cəmlər və kateqoriya cəmləri
+    per_cycle = {}
+    for row in rows:
+        cycle_totals = per_cycle.setdefault(row['qiymetlendirme__dovr'], {
+            'sum': 0, 'count': 0, 'categories': {}
+        })
+        cycle_totals['sum'] += row['total']
+        cycle_totals['count'] += row['answers_count']
+        
+        if row['sual__kateqoriya'] is None:
+            continue
+        category_totals = cycle_totals['categories'].setdefault(row['sual__kateqoriya'], {
+            'name': row['sual__kateqoriya__ad'], 'sum': 0, 'count': 0
+        })
+        category_totals['sum'] += row['total']
+        category_totals['count'] += row['answers_count']
+    
     overall_trend = []
     categories_trend = {}
     
     for cycle in cycles:
-        # Bu dövrdəki qiymətləndirmələr (self-review xaric)
-        evaluations = Qiymetlendirme.objects.filter(
-            qiymetlendirilen=user,
-            dovr=cycle,
-            status=Qiymetlendirme.Status.TAMAMLANDI
-        ).exclude(
-            qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-        )
-        
-        if not evaluations.exists():
+        cycle_totals = per_cycle.get(cycle.id)
+        if not cycle_totals:
             continue
         
-        # Ümumi ortalama
-        all_answers = Cavab.objects.filter(qiymetlendirme__in=evaluations)
-        if all_answers.exists():
-            overall_avg = all_answers.aggregate(Avg('xal'))['xal__avg']
-            overall_trend.append({
+        overall_trend.append({
+            'cycle_name': cycle.ad,
+            'cycle_date': cycle.bashlama_tarixi,
+            'average_score': round(cycle_totals['sum'] / cycle_totals['count'], 2),
+            'evaluations_count': evaluation_counts.get(cycle.id, 0)
+        })
+        
+        for category_id in sorted(cycle_totals['categories']):
+            category_totals = cycle_totals['categories'][category_id]
+            if not category_totals['name']:
+                continue
+            
+            categories_trend.setdefault(category_totals['name'], []).append({
                 'cycle_name': cycle.ad,
                 'cycle_date': cycle.bashlama_tarixi,
-                'average_score': round(overall_avg, 2),
-                'evaluations_count': evaluations.count()
+                'average_score': round(category_totals['sum'] / category_totals['count'], 2),
+                'answers_count': category_totals['count']
             })
-        
-        # Kateqoriyalar üzrə ortalama - Optimized to avoid N+1 queries
-        category_averages = Cavab.objects.filter(
-            qiymetlendirme__in=evaluations
-        ).values('sual__kateqoriya__id', 'sual__kateqoriya__ad').annotate(
-            avg_score=Avg('xal')
-        ).order_by('sual__kateqoriya__id')
-        
-        for category_data in category_averages:
-            category_name = category_data['sual__kateqoriya__ad']
-            category_avg = category_data['avg_score']
-            
-            if category_name and category_avg is not None:
-                if category_name not in categories_trend:
-                    categories_trend[category_name] = []
-                
-                categories_trend[category_name].append({
-                    'cycle_name': cycle.ad,
-                    'cycle_date': cycle.bashlama_tarixi,
-                    'average_score': round(category_avg, 2),
-                    'answers_count': category_answers.count()
-                })
     
     return {
         'overall': overall_trend,
@@ -398,43 +420,101 @@ def get_department_performance_trend(department_id, cycles):
     """
     Şöbənin performans trendini hesablayır
     """
+    departments = get_departments_performance_trends([department_id], cycles)['departments']
+    return departments[0] if departments else None
+
+
+def get_departments_performance_trends(department_ids, cycles):
+    """
+    Bir neçə şöbənin performans trendlərini bir qruplaşdırılmış sorğu ilə
+    (vahid, dövr) üzrə hesablayır. Ədədi nəticələr dövr və şöbə dəstləri üzrə keşlənir.
+    'departments' hər şöbə üçün trend_data siyahısını, 'chart' isə Chart.js üçün
+    dövr etiketlərinə uyğunlaşdırılmış massivləri (məlumat olmayan dövr üçün None) saxlayır.
+    """
     from ..models import OrganizationUnit
     
-    try:
-        department = OrganizationUnit.objects.get(id=department_id)
-    except OrganizationUnit.DoesNotExist:
-        return None
+    unit_ids = []
+    for department_id in department_ids:
+        try:
+            department_id = int(department_id)
+        except (TypeError, ValueError):
+            continue
+        if department_id not in unit_ids:
+            unit_ids.append(department_id)
+    
+    cycles = list(cycles)
+    cycle_ids = [cycle.id for cycle in cycles]
+    
+    departments = OrganizationUnit.objects.in_bulk(unit_ids)
+    unit_ids = [unit_id for unit_id in unit_ids if unit_id in departments]
+    
+    # Keşdə yalnız ədədi nəticələr saxlanılır; vahid və dövr adları tərcümə olunduğu
+    # üçün hər sorğuda cari dildə əlavə edilir
+    digest = hashlib.md5(
+        f"{','.join(map(str, cycle_ids))}|{','.join(map(str, unit_ids))}".encode()
+    ).hexdigest()
+    cache_key = f"department_trends:{digest}:{get_rollup_generation()}"
+    by_unit_cycle = cache.get(cache_key)
+    if by_unit_cycle is None:
+        trend_rows = Cavab.objects.filter(
+            qiymetlendirme__qiymetlendirilen__organization_unit__in=unit_ids,
+            qiymetlendirme__dovr__in=cycle_ids,
+            qiymetlendirme__status=Qiymetlendirme.Status.TAMAMLANDI
+        ).exclude(
+            qiymetlendirme__qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
+        ).values(
+            'qiymetlendirme__qiymetlendirilen__organization_unit',
+            'qiymetlendirme__dovr'
+        ).annotate(
+            avg_score=Avg('xal'),
+            employees_count=Count('qiymetlendirme__qiymetlendirilen', distinct=True)
+        ).order_by()
+        
+        by_unit_cycle = {
+            (row['qiymetlendirme__qiymetlendirilen__organization_unit'], row['qiymetlendirme__dovr']):
+                (row['avg_score'], row['employees_count'])
+            for row in trend_rows
+            if row['avg_score'] is not None
+        }
+        cache.set(cache_key, by_unit_cycle, getattr(settings, 'UNIT_SCORE_ROLLUP_CACHE_TIMEOUT', 600))
     
-    # Optimized query to avoid N+1 - get all department trend data in one query
-    department_trend_data = Cavab.objects.filter(
-        qiymetlendirme__qiymetlendirilen__organization_unit=department,
-        qiymetlendirme__dovr__in=cycles,
-        qiymetlendirme__status=Qiymetlendirme.Status.TAMAMLANDI
-    ).exclude(
-        qiymetlendirme__qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-    ).values(
-        'qiymetlendirme__dovr__id',
-        'qiymetlendirme__dovr__ad',
-        'qiymetlendirme__dovr__bashlama_tarixi'
-    ).annotate(
-        avg_score=Avg('xal'),
-        employees_count=Count('qiymetlendirme__qiymetlendirilen', distinct=True)
-    ).order_by('qiymetlendirme__dovr__bashlama_tarixi')
+    result = {
+        'departments': [],
+        'chart': {
+            'labels': [cycle.ad for cycle in cycles],
+            'datasets': []
+        }
+    }
     
-    department_trend = []
-    for data in department_trend_data:
-        if data['avg_score'] is not None:
+    for unit_id in unit_ids:
+        department_trend = []
+        aligned_scores = []
+        for cycle in cycles:
+            row = by_unit_cycle.get((unit_id, cycle.id))
+            if row is None:
+                aligned_scores.append(None)
+                continue
+            avg_score, employees_count = row
+            average_score = round(avg_score, 2)
+            aligned_scores.append(average_score)
             department_trend.append({
-                'cycle_name': data['qiymetlendirme__dovr__ad'],
-                'cycle_date': data['qiymetlendirme__dovr__bashlama_tarixi'],
-                'average_score': round(data['avg_score'], 2),
-                'employees_count': data['employees_count']
+                'cycle_name': cycle.ad,
+                'cycle_date': cycle.bashlama_tarixi,
+                'average_score': average_score,
+                'employees_count': employees_count
             })
-    
-    return {
-        'department_name': department.name,
-        'trend_data': department_trend
-    }
+        
+        result['departments'].append({
+            'department_name': departments[unit_id].name,
+            'trend_data': department_trend
+        })
+        result['chart']['datasets'].append({
+            'department_id': unit_id,
+            'label': departments[unit_id].name,
+            'data': aligned_scores
+        })
+    
+    return result
 
 
 def get_category_detailed_trend(user, category, cycles):
@@ -503,49 +583,34 @@ def get_category_detailed_trend(user, category, cycles):
 
 def get_benchmark_data(user, cycles):
     """
-    İstifadəçi üçün benchmark məlumatları
+    İstifadəçi üçün benchmark məlumatları.
+    Şirkət və şöbə ortalamaları dövr üzrə ortaq keşdən oxunur.
     """
     benchmark = {
         'department_average': [],
         'company_average': []
     }
     
+    cycles = list(cycles)
+    cycle_benchmarks = get_cycle_benchmarks(cycles)
+    
     for cycle in cycles:
+        cycle_data = cycle_benchmarks[cycle.id]
+        
         # Şöbə ortalaması
-        if user.organization_unit:
-            dept_evaluations = Qiymetlendirme.objects.filter(
-                qiymetlendirilen__organization_unit=user.organization_unit,
-                dovr=cycle,
-                status=Qiymetlendirme.Status.TAMAMLANDI
-            ).exclude(
-                qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-            )
-            
-            if dept_evaluations.exists():
-                dept_answers = Cavab.objects.filter(qiymetlendirme__in=dept_evaluations)
-                if dept_answers.exists():
-                    dept_avg = dept_answers.aggregate(Avg('xal'))['xal__avg']
-                    benchmark['department_average'].append({
-                        'cycle_name': cycle.ad,
-                        'average_score': round(dept_avg, 2)
-                    })
+        dept_avg = cycle_data['unit_averages'].get(user.organization_unit_id)
+        if dept_avg is not None:
+            benchmark['department_average'].append({
+                'cycle_name': cycle.ad,
+                'average_score': round(dept_avg, 2)
+            })
         
         # Şirkət ortalaması
-        company_evaluations = Qiymetlendirme.objects.filter(
-            dovr=cycle,
-            status=Qiymetlendirme.Status.TAMAMLANDI
-        ).exclude(
-            qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW
-        )
-        
-        if company_evaluations.exists():
-            company_answers = Cavab.objects.filter(qiymetlendirme__in=company_evaluations)
-            if company_answers.exists():
-                company_avg = company_answers.aggregate(Avg('xal'))['xal__avg']
-                benchmark['company_average'].append({
-                    'cycle_name': cycle.ad,
-                    'average_score': round(company_avg, 2)
-                })
+        if cycle_data['company_average'] is not None:
+            benchmark['company_average'].append({
+                'cycle_name': cycle.ad,
+                'average_score': round(cycle_data['company_average'], 2)
+            })
     
     return benchmark
 
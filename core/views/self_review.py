@@ -15,6 +15,7 @@ from core.models import (
     SualKateqoriyasi, Notification
 )
 from core.permissions import require_role
+from core.cycle_statistics import category_aggregates
 
 SELF_REVIEW_EDIT = 'self_review:edit'
 
@@ -349,8 +350,8 @@ def self_review_analytics(request):
     completed_reviews = Qiymetlendirme.objects.filter(
         qiymetlendirilen=request.user,
         qiymetlendiren=request.user,
-        qiymetlendirme_novu=Qiymetlendime.QiymetlendirmeNovu.SELF_REVIEW,
-        status=Qiymetlendime.Status.TAMAMLANDI
+        qiymetlendirme_novu=Qiymetlendirme.QiymetlendirmeNovu.SELF_REVIEW,
+        status=Qiymetlendirme.Status.TAMAMLANDI
     ).select_related('dovr').order_by('dovr__bashlama_tarixi')
     
     # Zaman üzrə trend
@@ -364,18 +365,15 @@ def self_review_analytics(request):
     
     # Kategoriya üzrə analiz (son review)
     category_analysis = {}
-    if completed_reviews.exists():
-        latest_review = completed_reviews.last()
+    if completed_reviews:
+        latest_review = completed_reviews[len(completed_reviews) - 1]
+        stats = category_aggregates(
+            {'qiymetlendirme_id': latest_review.id},
+            cycle=latest_review.dovr
+        )
         
-        for category in SualKateqoriyasi.objects.all():
-            answers = Cavab.objects.filter(
-                qiymetlendirme=latest_review,
-                sual__kateqoriya=category
-            )
-            
-            if answers.exists():
-                avg_score = sum(answer.xal for answer in answers) / answers.count()
-                category_analysis[category.ad] = round(avg_score, 2)
+        for category_id in sorted(category_id for category_id in stats if category_id is not None):
+            category_analysis[stats[category_id]['name']] = round(stats[category_id]['avg'], 2)
     
     context = {
         'completed_reviews': completed_reviews,